@@ -1,13 +1,69 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Expense, Bill, Budget
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db.models import Q, Sum
+from django.utils.functional import cached_property
+
+from .models import Expense, Bill, Budget, PlatformDailyRollup
+from .services import expense_search
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Changelist paginator that never runs an exact COUNT(*) over the whole
+    table. The unfiltered count comes from the platform rollups; filtered
+    counts stop at EXPENSE_ADMIN_COUNT_LIMIT rows, so pages past the limit
+    are not linked.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = PlatformDailyRollup.objects.filter(kind='expense').aggregate(rows=Sum('count'))['rows']
+            if estimate is not None:
+                return estimate
+        return queryset.order_by().values('pk')[:settings.EXPENSE_ADMIN_COUNT_LIMIT].count()
+
+
+class UserAutocompleteFilter(admin.SimpleListFilter):
+    """User filter that searches accounts through the admin autocomplete view instead of listing them all."""
+    title = 'user'
+    parameter_name = 'user'
+    template = 'admin/expenses/user_autocomplete_filter.html'
+
+    def lookups(self, request, model_admin):
+        # Only the selected user is listed; others are found by searching
+        value = self.value()
+        if value and value.isdigit():
+            return list(User.objects.filter(pk=value).values_list('pk', 'username'))
+        return []
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        if not value.isdigit():
+            return queryset.none()
+        return queryset.filter(user_id=value)
 
 
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
     list_display = ('date', 'user', 'category', 'amount', 'description')
-    list_filter = ('category', 'date', 'user')
-    search_fields = ('user__username', 'description')
+    list_filter = ('category', UserAutocompleteFilter)
+    list_select_related = ('user',)
+    date_hierarchy = 'date'
+    autocomplete_fields = ('user',)
+    search_fields = ('=user__username', 'description')
+    search_help_text = 'Exact username, or words from the description.'
     readonly_fields = ('date',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         """Allow users to see only their own expenses in admin."""
@@ -16,6 +72,14 @@ class ExpenseAdmin(admin.ModelAdmin):
             return qs
         return qs.filter(user=request.user)
 
+    def get_search_results(self, request, queryset, search_term):
+        """Match descriptions through the full-text index when it is installed."""
+        if not search_term.strip() or not expense_search.available():
+            return super().get_search_results(request, queryset, search_term)
+        users = User.objects.filter(username__iexact=search_term.strip()).values('id')
+        matches = Q(id__in=expense_search.matching_ids(search_term)) | Q(user_id__in=users)
+        return queryset.filter(matches), False
+
 
 @admin.register(Bill)
 class BillAdmin(admin.ModelAdmin):
@@ -1,175 +1,201 @@
 from django.db.models import Sum, Count
 from django.db.models.functions import TruncMonth
-from django.contrib.auth.models import User
-from .models import Income, Expense
+from .models import UserCohort, Expense
+from .services import metrics, analytics_snapshot, active_users
 from datetime import datetime
+from decimal import Decimal
+from bisect import bisect_right
+from statistics import median, quantiles
 import calendar
 
+
+def _as_date(start_date):
+    return start_date.date() if isinstance(start_date, datetime) else start_date
+
+
 def get_monthly_revenue(user=None, start_date=None):
-    qs = Income.objects.all()
-    if start_date:
-        qs = qs.filter(date__gte=start_date)
-    if user:
-        qs = qs.filter(user=user)
-        
-    revenue_data = qs.annotate(
-        month=TruncMonth('date')
-    ).values('month').annotate(
-        total=Sum('amount')
-    ).order_by('month')
-    
-    result = []
-    for entry in revenue_data:
-        if entry['month']:
-            result.append({
-                "month": entry['month'].strftime("%b %Y"),
-                "total": float(entry['total'] or 0)
-            })
-    return result
+    points = metrics.series('income', granularity='month', user=user, start_date=start_date)
+    return [{"month": p['label'], "total": p['value']} for p in points]
 
 def get_monthly_expense(user=None, start_date=None):
-    qs = Expense.objects.all()
-    if start_date:
-        qs = qs.filter(date__gte=start_date)
-    if user:
-        qs = qs.filter(user=user)
-        
-    expense_data = qs.annotate(
-        month=TruncMonth('date')
-    ).values('month').annotate(
-        total=Sum('amount')
-    ).order_by('month')
-    
-    result = []
-    for entry in expense_data:
-        if entry['month']:
-            result.append({
-                "month": entry['month'].strftime("%b %Y"),
-                "total": float(entry['total'] or 0)
-            })
-    return result
+    points = metrics.series('expense', granularity='month', user=user, start_date=start_date)
+    return [{"month": p['label'], "total": p['value']} for p in points]
 
 def get_expense_growth(start_date=None):
-    qs = Expense.objects.all()
-    if start_date:
-        qs = qs.filter(date__gte=start_date)
-    qs = qs.annotate(
-        month=TruncMonth('date')
-    ).values('month').annotate(
-        total=Sum('amount')
-    ).order_by('month')
-    
-    monthly_totals = []
-    for entry in qs:
-        if entry['month']:
-            monthly_totals.append({
-                "month": entry['month'].strftime("%b %Y"),
-                "total": float(entry['total'] or 0)
-            })
-            
-    result = []
-    previous_total = None
-    for item in monthly_totals:
-        current_total = item['total']
-        if previous_total is None or previous_total == 0:
-            growth = 0
-        else:
-            growth = ((current_total - previous_total) / previous_total) * 100
-        
-        result.append({
-            "month": item['month'],
-            "growth": round(growth, 2)
-        })
-        previous_total = current_total
-        
-    return result
+    points = metrics.series('expense', granularity='month', start_date=start_date, derived=('growth',))
+    return [{"month": p['label'], "growth": p['growth']} for p in points]
 
 def get_user_stats(start_date=None):
-    new_users_qs = User.objects.all()
-    if start_date:
-        new_users_qs = new_users_qs.filter(date_joined__gte=start_date)
-    new_users_qs = new_users_qs.annotate(
-        month=TruncMonth('date_joined')
-    ).values('month').annotate(
-        count=Count('id')
-    ).order_by('month')
-    
-    new_users_dict = {}
-    for entry in new_users_qs:
-        if entry['month']:
-            new_users_dict[entry['month'].strftime("%b %Y")] = entry['count']
-
-    active_users_qs = User.objects.filter(last_login__isnull=False)
-    if start_date:
-        active_users_qs = active_users_qs.filter(last_login__gte=start_date)
-    active_users_qs = active_users_qs.annotate(
-        month=TruncMonth('last_login')
-    ).values('month').annotate(
-        count=Count('id')
-    ).order_by('month')
-    
-    active_users_dict = {}
-    for entry in active_users_qs:
-        if entry['month']:
-            active_users_dict[entry['month'].strftime("%b %Y")] = entry['count']
-            
-    all_months = sorted(list(set(new_users_dict.keys()) | set(active_users_dict.keys())), key=lambda x: datetime.strptime(x, "%b %Y"))
-    result = []
-    for m in all_months:
-        result.append({
-            "month": m,
-            "new_users": new_users_dict.get(m, 0),
-            "active_users": active_users_dict.get(m, 0)
-        })
-    return result
+    """
+    New users per join month (UserCohort) and distinct active users per month,
+    merged from the daily HyperLogLog sketches (approximate, ~1.6% error).
+    """
+    month_start = _as_date(start_date).replace(day=1) if start_date else None
+    rows = metrics.combine('month', {
+        'new_users': metrics.series('signups', start_date=start_date),
+        'active_users': active_users.series('month', start_date=month_start),
+    })
+    return [
+        {"month": row['label'], "new_users": int(row['new_users']), "active_users": int(row['active_users'])}
+        for row in rows
+    ]
+
+def get_active_user_summary():
+    """Approximate DAU / WAU / MAU as of today, from the daily sketches."""
+    return active_users.summary()
 
 def get_retention_rate(start_date=None):
-    qs = User.objects.all()
+    """
+    Monthly retention: of the users who joined before a month, the share whose
+    last login falls in that month or later.
+
+    Reads the UserCohort table (join month x last-login month -> users) in one
+    grouped query, so the work is bounded by the number of months, not users.
+    """
+    qs = UserCohort.objects.all()
     # While start_date logically limits the users we look at, retention rate spans history.
     # To keep it bounded by timeframe as requested:
     if start_date:
-        qs = qs.filter(date_joined__gte=start_date)
-        
-    users = qs
-    # Collect months
+        qs = qs.filter(join_date__gte=_as_date(start_date))
+
+    # Month keys as (year, month) so sorting needs no string parsing
+    cohorts = {}
+    rows = qs.values('join_month', 'active_month').annotate(total=Sum('users')).values_list(
+        'join_month', 'active_month', 'total'
+    ).order_by()
+    for join_month, active_month, users in rows:
+        if not users:
+            continue
+        joined = (join_month.year, join_month.month)
+        active = (active_month.year, active_month.month) if active_month else None
+        cohorts[(joined, active)] = users
+
     months = set()
-    for user in users:
-        if user.date_joined:
-            months.add(user.date_joined.strftime("%b %Y"))
-        if user.last_login:
-            months.add(user.last_login.strftime("%b %Y"))
-    
-    sorted_months = sorted(list(months), key=lambda x: datetime.strptime(x, "%b %Y"))
-    
+    for joined, active in cohorts:
+        months.add(joined)
+        if active:
+            months.add(active)
+    sorted_months = sorted(months)
+
+    # Difference arrays over month positions: a cohort counts towards every month
+    # after it joined, and as retained up to (and including) its last-login month.
+    prev_delta = [0] * (len(sorted_months) + 1)
+    retained_delta = [0] * (len(sorted_months) + 1)
+    for (joined, active), users in cohorts.items():
+        first = bisect_right(sorted_months, joined)
+        prev_delta[first] += users
+        if active is not None and active > joined:
+            retained_delta[first] += users
+            retained_delta[bisect_right(sorted_months, active)] -= users
+
     result = []
-    for i, month_str in enumerate(sorted_months):
-        target_date = datetime.strptime(month_str, "%b %Y")
-        
-        # previous month users: users who joined before target_date month/year
-        prev_users_count = 0
-        retained_count = 0
-        
-        for user in users:
-            if not user.date_joined:
-                continue
-            
-            # Simple check, if user joined before current month
-            if user.date_joined.year < target_date.year or (user.date_joined.year == target_date.year and user.date_joined.month < target_date.month):
-                prev_users_count += 1
-                
-                # Check if they have activity now or later (proxy for retained this month)
-                if user.last_login:
-                    if user.last_login.year >= target_date.year and user.last_login.month >= target_date.month:
-                        retained_count += 1
-                        
+    prev_users_count = 0
+    retained_count = 0
+    for i, month in enumerate(sorted_months):
+        prev_users_count += prev_delta[i]
+        retained_count += retained_delta[i]
+
         if prev_users_count > 0:
             rate = (retained_count / prev_users_count) * 100
         else:
             rate = 0
-            
+
         result.append({
-            "month": month_str,
+            "month": datetime(month[0], month[1], 1).strftime("%b %Y"),
             "retention": round(rate, 2)
         })
-        
+
+    return result
+
+
+def get_top_spenders(start_date=None, limit=10):
+    """
+    Users with the highest expense totals since start_date. Read from the
+    analytics snapshot when one exists, otherwise grouped on the live table.
+    """
+    start = _as_date(start_date)
+    if analytics_snapshot.available():
+        rows = analytics_snapshot.query(
+            """
+            SELECT username, SUM(amount_minor) AS total_minor, COUNT(*) AS count
+            FROM expenses
+            WHERE date >= ?
+            GROUP BY username
+            ORDER BY total_minor DESC
+            LIMIT ?
+            """,
+            [start or datetime.min.date(), limit],
+        )
+        return [
+            {"username": row['username'], "total": float(row['total_minor']) / 100, "count": row['count']}
+            for row in rows
+        ]
+
+    qs = Expense.objects.all()
+    if start:
+        qs = qs.filter(date__gte=start)
+    rows = qs.values('user__username').annotate(total=Sum('amount'), count=Count('id')).order_by('-total')[:limit]
+    return [
+        {"username": row['user__username'], "total": float(row['total']), "count": row['count']}
+        for row in rows
+    ]
+
+def get_spend_distribution(start_date=None):
+    """
+    Per month, the median and 90th percentile of what each spending user spent.
+    Needs a per-user-per-month GROUP BY over all expenses, so it prefers the
+    analytics snapshot and only falls back to the live table without one.
+    """
+    start = _as_date(start_date).replace(day=1) if start_date else None
+    if analytics_snapshot.available():
+        rows = analytics_snapshot.query(
+            """
+            SELECT month,
+                   quantile_cont(total_minor, 0.5) AS median_minor,
+                   quantile_cont(total_minor, 0.9) AS p90_minor,
+                   COUNT(*) AS users
+            FROM (
+                SELECT date_trunc('month', date) AS month, user_id, SUM(amount_minor) AS total_minor
+                FROM expenses
+                WHERE date >= ?
+                GROUP BY 1, 2
+            )
+            GROUP BY month
+            ORDER BY month
+            """,
+            [start or datetime.min.date()],
+        )
+        return [
+            {
+                "month": row['month'].strftime("%b %Y"),
+                "median": round(row['median_minor'] / 100, 2),
+                "p90": round(row['p90_minor'] / 100, 2),
+                "users": row['users'],
+            }
+            for row in rows
+        ]
+
+    qs = Expense.objects.all()
+    if start:
+        qs = qs.filter(date__gte=start)
+    per_user = (
+        qs.annotate(month=TruncMonth('date'))
+        .values('month', 'user_id')
+        .annotate(total=Sum('amount'))
+        .values_list('month', 'total')
+        .order_by('month')
+    )
+    by_month = {}
+    for month, total in per_user:
+        by_month.setdefault(month, []).append(total or Decimal('0'))
+
+    result = []
+    for month, totals in by_month.items():
+        p90 = quantiles(totals, n=10, method='inclusive')[-1] if len(totals) > 1 else totals[0]
+        result.append({
+            "month": month.strftime("%b %Y"),
+            "median": round(float(median(totals)), 2),
+            "p90": round(float(p90), 2),
+            "users": len(totals),
+        })
     return result
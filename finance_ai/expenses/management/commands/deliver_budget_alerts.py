@@ -0,0 +1,51 @@
+"""
+Send pending budget threshold alerts by e-mail.
+
+Polls the BudgetAlert outbox, claims one pending alert at a time and
+e-mails it to the user (see expenses/services/budget_alerts.py). Failed
+sends are retried after a delay, up to BUDGET_ALERT_MAX_ATTEMPTS; alerts
+for users without an e-mail address are marked skipped. Start as many
+workers as needed; claims are atomic.
+
+Usage:
+    python manage.py deliver_budget_alerts
+    python manage.py deliver_budget_alerts --once
+    python manage.py deliver_budget_alerts --poll-interval 30
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from expenses.services import budget_alerts
+
+
+class Command(BaseCommand):
+    help = "Run a worker that delivers queued budget alerts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Deliver the alerts currently queued, then exit.")
+        parser.add_argument('--poll-interval', type=float, default=10.0,
+                            help="Seconds to sleep when the outbox is empty (default: 10).")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Budget alert worker started.")
+        try:
+            while True:
+                close_old_connections()
+                budget_alerts.requeue_stale()
+
+                alert = budget_alerts.claim_next()
+                if alert is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                status = budget_alerts.deliver(alert)
+                line = f"Alert #{alert.pk} ({alert.category} {alert.threshold}%) for {alert.user.username}: {status}"
+                self.stdout.write(self.style.SUCCESS(line) if status in ('sent', 'skipped') else self.style.ERROR(line))
+        except KeyboardInterrupt:
+            self.stdout.write("Budget alert worker stopped.")
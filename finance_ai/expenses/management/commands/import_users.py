@@ -0,0 +1,61 @@
+"""
+Create users in bulk from a CSV file.
+
+Columns: username, email (required), password, first_name, last_name,
+currency (optional). Passwords are hashed in a process pool and users and
+profiles are inserted in batches (see expenses/services/user_import.py).
+Rejected rows are listed with their line number and reason; the rest of
+the file is still imported.
+
+Usage:
+    python manage.py import_users partners.csv
+    python manage.py import_users partners.csv --batch-size 1000 --workers 4 --report rejected.csv
+"""
+
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.services import user_import
+
+
+class Command(BaseCommand):
+    help = "Create users in bulk from a CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with a header row.")
+        parser.add_argument('--batch-size', type=int, help="Users inserted per transaction.")
+        parser.add_argument('--workers', type=int, help="Password hashing processes.")
+        parser.add_argument('--report', help="Also write every rejected row to this CSV file.")
+
+    def handle(self, *args, **options):
+        rejected = []
+
+        def report(line, username, status, detail):
+            if status == 'error':
+                rejected.append([line, username, status, detail])
+
+        def progress(done, total):
+            self.stdout.write(f"  {done}/{total} rows processed")
+
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as csv_file:
+                summary = user_import.import_users(
+                    csv_file, report, progress, batch_size=options['batch_size'], workers=options['workers'],
+                )
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc}")
+        except user_import.ImportFileError as exc:
+            raise CommandError(str(exc))
+
+        for line, username, _status, detail in rejected:
+            self.stderr.write(f"Line {line} ({username or 'no username'}): {detail}")
+        if options['report'] and rejected:
+            with open(options['report'], 'w', newline='') as fh:
+                writer = csv.writer(fh)
+                writer.writerow(user_import.REPORT_HEADER)
+                writer.writerows(rejected)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['created']} of {summary['rows']} users ({summary['invalid']} rejected)."
+        ))
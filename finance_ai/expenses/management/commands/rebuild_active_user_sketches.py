@@ -0,0 +1,41 @@
+"""
+Recompute the daily active-user HyperLogLog sketches.
+
+Rebuilds ActiveUserSketch rows from expense/income dates and last logins
+(see expenses/services/active_users.py). Use it after bulk imports that
+bypass signals. Days recorded live also include logins that this rebuild
+cannot see, so limit it to the affected range when possible.
+
+Usage:
+    python manage.py rebuild_active_user_sketches
+    python manage.py rebuild_active_user_sketches --start 2026-01-01 --end 2026-01-31
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.services import active_users
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily active-user sketches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First date to rebuild (YYYY-MM-DD). Defaults to all history.")
+        parser.add_argument('--end', help="Last date to rebuild (YYYY-MM-DD). Defaults to all history.")
+
+    def handle(self, *args, **options):
+        start_date = _parse_date(options['start'])
+        end_date = _parse_date(options['end'])
+        days = active_users.rebuild(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt active-user sketches for {days} days."))
@@ -0,0 +1,24 @@
+"""
+Reinstall and repopulate the admin's full-text index of expense descriptions.
+
+Creates the SQLite FTS5 table and its sync triggers if they are missing
+and reindexes every description (see expenses/services/expense_search.py).
+`migrate` already does this when a table rebuild dropped the triggers; use
+the command after raw SQL changes or to recover a damaged index.
+
+Usage:
+    python manage.py rebuild_expense_search
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.services import expense_search
+
+
+class Command(BaseCommand):
+    help = "Reinstall and repopulate the expense description search index."
+
+    def handle(self, *args, **options):
+        if not expense_search.install():
+            raise CommandError("The expense search index needs SQLite with FTS5.")
+        self.stdout.write(self.style.SUCCESS("Rebuilt the expense search index."))
@@ -0,0 +1,39 @@
+"""
+Recompute PlatformDailyRollup rows from the Expense and Income tables.
+
+Needed after writes that bypass model signals (bulk_create, bulk_update,
+queryset.update, raw SQL) or to repair drift.
+
+Usage:
+    python manage.py rebuild_platform_rollups
+    python manage.py rebuild_platform_rollups --start 2026-01-01 --end 2026-03-31
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.services import platform_rollups
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Rebuild platform-wide daily expense/income rollups used by admin analytics."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First date to rebuild (YYYY-MM-DD). Defaults to all history.")
+        parser.add_argument('--end', help="Last date to rebuild (YYYY-MM-DD). Defaults to all history.")
+
+    def handle(self, *args, **options):
+        start_date = _parse_date(options['start'])
+        end_date = _parse_date(options['end'])
+        rows = platform_rollups.rebuild(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup rows."))
@@ -0,0 +1,26 @@
+"""
+Recompute the per-user monthly spend per category used by budgets.
+
+Needed after writes that bypass model signals (bulk_create, bulk_update,
+queryset.update, raw SQL) or to repair drift.
+
+Usage:
+    python manage.py rebuild_spend_counters
+    python manage.py rebuild_spend_counters --user 42 --user 43
+"""
+
+from django.core.management.base import BaseCommand
+
+from expenses.services import spend_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user monthly category spend counters used by budgets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Only rebuild this user id (repeatable). Defaults to all users.")
+
+    def handle(self, *args, **options):
+        rows = spend_counters.rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} monthly spend counters."))
@@ -0,0 +1,21 @@
+"""
+Recompute the UserCohort table behind retention analytics from scratch.
+
+Needed after writes that bypass model signals (bulk_create, queryset.update,
+raw SQL) or to repair drift.
+
+Usage:
+    python manage.py rebuild_user_cohorts
+"""
+
+from django.core.management.base import BaseCommand
+
+from expenses.services import user_cohorts
+
+
+class Command(BaseCommand):
+    help = "Rebuild signup/last-login cohort counts used by retention analytics."
+
+    def handle(self, *args, **options):
+        rows = user_cohorts.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} cohort rows."))
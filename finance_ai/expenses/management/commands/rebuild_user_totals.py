@@ -0,0 +1,27 @@
+"""
+Recompute the per-user expense count, total spend and last expense date
+stored on Profile.
+
+Needed after writes that bypass model signals (bulk_create, bulk_update,
+queryset.update, raw SQL) or to repair drift.
+
+Usage:
+    python manage.py rebuild_user_totals
+    python manage.py rebuild_user_totals --user 42 --user 43
+"""
+
+from django.core.management.base import BaseCommand
+
+from expenses.services import user_totals
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user expense totals used by the admin user list."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Only rebuild this user id (repeatable). Defaults to all users.")
+
+    def handle(self, *args, **options):
+        profiles = user_totals.rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt totals for {profiles} profiles."))
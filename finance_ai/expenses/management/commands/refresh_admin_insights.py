@@ -0,0 +1,24 @@
+"""
+Recompute and store the admin dashboard insights.
+
+Every rule registered in expenses/utils/admin_insights.py is evaluated over
+the platform rollups and saved to AdminInsight with a timestamp. Schedule it
+more often than ADMIN_INSIGHTS_MAX_AGE so dashboard loads never compute them.
+
+Usage:
+    python manage.py refresh_admin_insights
+"""
+
+from django.core.management.base import BaseCommand
+
+from expenses.utils.admin_insights import refresh_admin_insights
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored admin dashboard insights."
+
+    def handle(self, *args, **options):
+        rows = refresh_admin_insights()
+        for row in rows:
+            self.stdout.write(f"  {row.rule}: [{row.type}] {row.message}")
+        self.stdout.write(self.style.SUCCESS(f"Stored {len(rows)} insights."))
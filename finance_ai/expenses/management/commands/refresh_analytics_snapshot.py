@@ -0,0 +1,29 @@
+"""
+Rebuild the Parquet snapshot that heavy admin analytics query through DuckDB.
+
+Writes the Expense and Income tables under ANALYTICS_SNAPSHOT_DIR and swaps
+the new build in atomically (see expenses/services/analytics_snapshot.py).
+Schedule it more often than ANALYTICS_SNAPSHOT_MAX_AGE; the admin dashboard
+shows how old the snapshot its figures came from is.
+
+Usage:
+    python manage.py refresh_analytics_snapshot
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.services import analytics_snapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuild the columnar analytics snapshot used by the admin dashboard."
+
+    def handle(self, *args, **options):
+        try:
+            manifest = analytics_snapshot.refresh()
+        except analytics_snapshot.SnapshotUnavailable as exc:
+            raise CommandError(str(exc))
+        rows = ', '.join(f"{count} {dataset}" for dataset, count in manifest['rows'].items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot {manifest['version']} written ({rows}) in {manifest['build_seconds']}s."
+        ))
@@ -0,0 +1,275 @@
+"""
+Re-run category prediction and anomaly flags over existing expenses.
+
+Walks the Expense table in (user_id, id) keyset order, scores each chunk in
+one batch and writes only the rows that changed with bulk_update. Progress
+is checkpointed to a JSON file after every chunk so an interrupted run can
+pick up where it stopped. bulk_update sends no signals, so each chunk moves
+the platform rollups and spend counters of its recategorized rows in the
+same transaction; a chunk and its derived tables commit together.
+--dry-run writes nothing and always starts from the beginning.
+
+--stale-only instead makes one keyset pass per staleness predicate (each
+outdated model version, missing confidence, low confidence), so every
+chunk is a range read on the expense_ml_* indexes rather than a scan.
+
+Usage:
+    python manage.py rescore_expenses --dry-run
+    python manage.py rescore_expenses --chunk-size 2000
+    python manage.py rescore_expenses --reset
+    python manage.py rescore_expenses --stale-only --min-confidence 0.75
+"""
+
+import json
+import os
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Avg, Q
+
+from expenses.models import Expense
+from expenses.services import platform_rollups, spend_counters
+from expenses.ml.model_loader import ml_engine
+from expenses.ml.predictors.category_predictor import predict_categories
+from expenses.utils.smart_features import categorize_expense
+
+DEFAULT_CHECKPOINT = os.path.join(settings.BASE_DIR, 'rescore_checkpoint.json')
+
+RESCORED_FIELDS = [
+    'category', 'is_auto_categorized', 'is_ml_predicted', 'is_anomaly',
+    'model_version', 'prediction_confidence', 'keyword_rule',
+]
+
+
+def stale_passes(min_confidence):
+    """
+    (name, filter, keyset fields) for each kind of stale ML prediction:
+    rows scored by another model version, rows without a confidence and
+    rows below min_confidence. Every filter is an equality or range on the
+    (is_ml_predicted, model_version/prediction_confidence) indexes, and the
+    keyset fields follow that index's order, so no pass sorts or scans.
+    """
+    current = ml_engine.category_model_version
+    # `is_ml_predicted=True` renders as a bare boolean column, which SQLite cannot
+    # match to the index prefix; IN (1) is planned as an equality
+    ml_rows = Q(is_ml_predicted__in=[True], keyword_rule='')
+    # One read of the version index; the table holds a handful of distinct versions
+    versions = (
+        Expense.objects.filter(is_ml_predicted__in=[True]).exclude(model_version=current)
+        .order_by('model_version').values_list('model_version', flat=True).distinct()
+    )
+    passes = [(f"version:{version}", ml_rows & Q(model_version=version), ('id',)) for version in versions]
+    passes.append(('unscored', ml_rows & Q(model_version=current, prediction_confidence__isnull=True), ('id',)))
+    passes.append(('low_confidence', ml_rows & Q(model_version=current, prediction_confidence__lt=min_confidence),
+                   ('prediction_confidence', 'id')))
+    return passes
+
+
+def _after(fields, cursor):
+    """
+    Keyset condition for rows strictly after `cursor` in `fields` order,
+    written as `a >= x AND (a > x OR ...)` so the leading field stays an index range.
+    """
+    if cursor is None:
+        return Q()
+    (field, *rest), (value, *rest_values) = fields, cursor
+    if not rest:
+        return Q(**{f'{field}__gt': value})
+    return Q(**{f'{field}__gte': value}) & (Q(**{f'{field}__gt': value}) | _after(rest, rest_values))
+
+
+class Command(BaseCommand):
+    help = "Recompute auto-assigned categories and anomaly flags for existing expenses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help="Expenses scored per batch (default: 1000).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report how many rows would change without writing anything.")
+        parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT,
+                            help="Path of the resume checkpoint file.")
+        parser.add_argument('--reset', action='store_true',
+                            help="Ignore any saved checkpoint and start from the first expense.")
+        parser.add_argument('--skip-categories', action='store_true',
+                            help="Only recompute anomaly flags.")
+        parser.add_argument('--skip-anomalies', action='store_true',
+                            help="Only recompute auto-assigned categories.")
+        parser.add_argument('--stale-only', action='store_true',
+                            help="Only walk ML-categorized rows from another model version or below --min-confidence.")
+        parser.add_argument('--min-confidence', type=float, default=0.75,
+                            help="Confidence below which --stale-only rescoring kicks in (default: 0.75).")
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options['chunk_size'])
+        dry_run = options['dry_run']
+        checkpoint_path = options['checkpoint']
+
+        state = {'user_id': 0, 'id': 0, 'scanned': 0, 'changed': 0}
+        # A dry run never writes a checkpoint, so it must not resume from a real run's either
+        if not options['reset'] and not dry_run and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as fh:
+                state.update(json.load(fh))
+            if options['stale_only'] and state.get('pass'):
+                self.stdout.write(f"Resuming {state['pass']} predictions after {state['cursor']}.")
+            else:
+                self.stdout.write(f"Resuming after expense #{state['id']} (user #{state['user_id']}).")
+
+        if options['stale_only']:
+            chunks = self._stale_chunks(state, chunk_size, options['min_confidence'])
+        else:
+            chunks = self._chunks(state, chunk_size)
+
+        user_avg = {}
+        changed_by_field = dict.fromkeys(RESCORED_FIELDS, 0)
+
+        for chunk in chunks:
+            before = [{f: getattr(e, f) for f in RESCORED_FIELDS} for e in chunk]
+
+            if not options['skip_categories']:
+                self._rescore_categories(chunk)
+            if not options['skip_anomalies']:
+                self._rescore_anomalies(chunk, user_avg)
+
+            changed = []
+            moves = []
+            counter_deltas = {}
+            for expense, old in zip(chunk, before):
+                diff = [f for f in RESCORED_FIELDS if getattr(expense, f) != old[f]]
+                if diff:
+                    changed.append(expense)
+                    for f in diff:
+                        changed_by_field[f] += 1
+                    if 'category' in diff:
+                        moves.append((expense.user_id, expense.date, old['category'], expense.category, expense.amount))
+                        month = spend_counters.month_of(expense.date)
+                        for category, sign in ((old['category'], -1), (expense.category, 1)):
+                            amount, count = counter_deltas.get((expense.user_id, month, category), (0, 0))
+                            counter_deltas[(expense.user_id, month, category)] = (amount + sign * expense.amount, count + sign)
+
+            if changed and not dry_run:
+                with transaction.atomic():
+                    Expense.objects.bulk_update(changed, RESCORED_FIELDS)
+                    # bulk_update sends no signals; move the rollups and budget spend between
+                    # categories here. Like a normal save, a category this pushes past a budget
+                    # threshold gets its alert
+                    platform_rollups.apply_moves('expense', moves)
+                    spend_counters.apply_deltas(counter_deltas)
+
+            state['scanned'] += len(chunk)
+            state['changed'] += len(changed)
+            if not dry_run:
+                with open(checkpoint_path, 'w') as fh:
+                    json.dump(state, fh)
+
+            if options['stale_only']:
+                # Passes are not in user order; keep only the averages of this chunk's users
+                user_avg.clear()
+            else:
+                # Per-user averages are only needed while that user's rows are being walked
+                for uid in [u for u in user_avg if u < chunk[-1].user_id]:
+                    del user_avg[uid]
+
+            self.stdout.write(f"Scanned {state['scanned']} expenses, {state['changed']} changed...")
+
+        verb = "would change" if dry_run else "changed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {state['scanned']} expenses scanned, {state['changed']} {verb}."
+        ))
+        for field, count in changed_by_field.items():
+            self.stdout.write(f"  {field}: {count}")
+
+        if not dry_run and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def _chunks(self, state, chunk_size):
+        """Every expense in (user_id, id) keyset order; the cursor is kept in `state`."""
+        while True:
+            chunk = list(
+                Expense.objects
+                .filter(Q(user_id__gt=state['user_id']) | Q(user_id=state['user_id'], id__gt=state['id']))
+                .order_by('user_id', 'id')
+                .only('id', 'user_id', 'date', 'amount', 'description', *RESCORED_FIELDS)[:chunk_size]
+            )
+            if not chunk:
+                return
+            # Advanced before the chunk is scored, so the rescored values never move the cursor
+            state.update(user_id=chunk[-1].user_id, id=chunk[-1].id)
+            yield chunk
+
+    def _stale_chunks(self, state, chunk_size, min_confidence):
+        """Stale ML rows, one indexed keyset pass per predicate; state holds the pass and its cursor."""
+        passes = stale_passes(min_confidence)
+        names = [name for name, _filter, _fields in passes]
+        if state.get('pass') in names:
+            passes = passes[names.index(state['pass']):]
+        else:
+            state.update({'pass': names[0], 'cursor': None})
+
+        for name, condition, fields in passes:
+            if name != state['pass']:
+                state.update({'pass': name, 'cursor': None})
+                self.stdout.write(f"Rescoring {name} predictions...")
+            while True:
+                chunk = list(
+                    Expense.objects.filter(condition & _after(fields, state['cursor']))
+                    .order_by(*fields)
+                    .only('id', 'user_id', 'date', 'amount', 'description', *RESCORED_FIELDS)[:chunk_size]
+                )
+                if not chunk:
+                    break
+                state['cursor'] = [getattr(chunk[-1], field) for field in fields]
+                yield chunk
+
+    def _rescore_categories(self, chunk):
+        """Re-predict rows whose category was assigned automatically, mirroring add_expense()."""
+        targets = [e for e in chunk if e.is_auto_categorized or e.is_ml_predicted]
+        if not targets:
+            return
+
+        predictions = predict_categories([e.description for e in targets])
+        for expense, detected in zip(targets, predictions):
+            if detected:
+                expense.category = detected['category']
+                expense.is_auto_categorized = True
+                expense.is_ml_predicted = True
+                expense.model_version = detected['model_version']
+                expense.prediction_confidence = detected['confidence']
+                expense.keyword_rule = detected['keyword_rule']
+                continue
+
+            expense.model_version = ''
+            expense.prediction_confidence = None
+            expense.keyword_rule = ''
+
+            detected_rule = categorize_expense(expense.description)
+            if detected_rule:
+                expense.category = detected_rule
+                expense.is_auto_categorized = True
+                expense.is_ml_predicted = False
+            else:
+                expense.category = 'Others'
+                expense.is_auto_categorized = False
+                expense.is_ml_predicted = False
+
+    def _rescore_anomalies(self, chunk, user_avg):
+        """
+        Apply the history rule from smart_features.detect_anomaly against each
+        user's current average: amount > 2 x average expense.
+        """
+        missing = {e.user_id for e in chunk} - user_avg.keys()
+        if missing:
+            rows = (
+                Expense.objects.filter(user_id__in=missing)
+                .values('user_id')
+                .annotate(avg=Avg('amount'))
+            )
+            user_avg.update({row['user_id']: float(row['avg'] or 0) for row in rows})
+
+        amounts = np.array([float(e.amount) for e in chunk])
+        averages = np.array([user_avg.get(e.user_id, 0.0) for e in chunk])
+        flags = (averages > 0) & (amounts > averages * 2)
+
+        for expense, flag in zip(chunk, flags):
+            expense.is_anomaly = bool(flag)
@@ -0,0 +1,63 @@
+"""
+Process queued background jobs: large exports, user imports and deletions.
+
+Polls the BackgroundJob table, claims one pending job at a time and builds its
+file in private storage (settings.PRIVATE_MEDIA_ROOT). Start as many
+workers as needed; claims are atomic. Each loop also deletes expired result
+files and re-queues jobs whose worker stopped reporting progress.
+
+Usage:
+    python manage.py run_export_worker
+    python manage.py run_export_worker --once
+    python manage.py run_export_worker --poll-interval 5
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from expenses.services import jobs
+
+
+class Command(BaseCommand):
+    help = "Run a background worker for queued exports, imports and user deletions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Process the jobs currently queued, then exit.")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to sleep when the queue is empty (default: 2).")
+        parser.add_argument('--worker-id', default=None,
+                            help="Name recorded on claimed jobs (default: host:pid).")
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or jobs.default_worker_id()
+        self.stdout.write(f"Export worker {worker_id} started.")
+
+        try:
+            while True:
+                close_old_connections()
+                jobs.requeue_stale()
+                expired = jobs.expire_results()
+                if expired:
+                    self.stdout.write(f"Expired {expired} export files.")
+
+                job = jobs.claim_next(worker_id)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f"Running job #{job.pk} ({job.kind}) for {job.user.username}...")
+                started = time.perf_counter()
+                jobs.run_job(job)
+                job.refresh_from_db(fields=['status', 'error'])
+                elapsed = time.perf_counter() - started
+                if job.status == 'done':
+                    self.stdout.write(self.style.SUCCESS(f"Job #{job.pk} done in {elapsed:.1f}s."))
+                else:
+                    self.stdout.write(self.style.ERROR(f"Job #{job.pk} failed: {job.error}"))
+        except KeyboardInterrupt:
+            self.stdout.write("Export worker stopped.")
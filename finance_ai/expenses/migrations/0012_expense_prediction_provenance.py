@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0011_profile_created_at_alter_profile_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='keyword_rule',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='model_version',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='prediction_confidence',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['is_ml_predicted', 'model_version'], name='expense_ml_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['is_ml_predicted', 'prediction_confidence'], name='expense_ml_confidence_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:26
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate, TruncMonth
+
+
+def backfill_user_cohorts(apps, schema_editor):
+    # One row per (join date, last-login month), as services/user_cohorts.rebuild() computed it here
+    app_label, model_name = settings.AUTH_USER_MODEL.split('.')
+    User = apps.get_model(app_label, model_name)
+    UserCohort = apps.get_model('expenses', 'UserCohort')
+
+    rows = (
+        User.objects.annotate(join_date=TruncDate('date_joined'), active_month=TruncMonth('last_login'))
+        .values('join_date', 'active_month').annotate(users=Count('id')).order_by()
+    )
+    cohorts = []
+    for row in rows:
+        active_month = row['active_month']
+        if active_month is not None and hasattr(active_month, 'date'):
+            active_month = active_month.date()
+        cohorts.append(UserCohort(
+            join_date=row['join_date'], join_month=row['join_date'].replace(day=1),
+            active_month=active_month, users=row['users'],
+        ))
+    UserCohort.objects.bulk_create(cohorts, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0012_expense_prediction_provenance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCohort',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('join_date', models.DateField()),
+                ('join_month', models.DateField()),
+                ('active_month', models.DateField(blank=True, null=True)),
+                ('users', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['join_date', 'active_month'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('active_month__isnull', True)), fields=('join_date',), name='usercohort_never_active_uniq')],
+                'unique_together': {('join_date', 'active_month')},
+            },
+        ),
+        migrations.RunPython(backfill_user_cohorts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:28
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_platform_rollups(apps, schema_editor):
+    Rollup = apps.get_model('expenses', 'PlatformDailyRollup')
+    rows = []
+    for kind, model_name, field in (('expense', 'Expense', 'category'), ('income', 'Income', 'source')):
+        grouped = apps.get_model('expenses', model_name).objects.values('date', field).annotate(
+            total=Sum('amount'), count=Count('id'), users=Count('user', distinct=True)
+        ).order_by()
+        rows.extend(
+            Rollup(kind=kind, date=g['date'], key=g[field], total=g['total'], count=g['count'], users=g['users'])
+            for g in grouped
+        )
+    Rollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0013_usercohort'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('kind', models.CharField(choices=[('expense', 'Expense'), ('income', 'Income')], max_length=10)),
+                ('key', models.CharField(max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('count', models.IntegerField(default=0)),
+                ('users', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['date', 'kind', 'key'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['user', 'date'], name='expense_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['user', 'date'], name='income_user_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='platformdailyrollup',
+            unique_together={('kind', 'date', 'key')},
+        ),
+        migrations.RunPython(backfill_platform_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0015_expense_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdminInsight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rule', models.CharField(max_length=64, unique=True)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('type', models.CharField(choices=[('info', 'Info'), ('success', 'Success'), ('warning', 'Warning'), ('danger', 'Danger')], default='info', max_length=10)),
+                ('icon', models.CharField(blank=True, max_length=8)),
+                ('message', models.CharField(max_length=255)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:35
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill_profile_totals(apps, schema_editor):
+    Expense = apps.get_model('expenses', 'Expense')
+    Profile = apps.get_model('expenses', 'Profile')
+    totals = {
+        row['user_id']: row
+        for row in Expense.objects.values('user_id').annotate(
+            count=Count('id'), total=Sum('amount'), last=Max('date')
+        ).order_by()
+    }
+    profiles = list(Profile.objects.filter(user_id__in=totals.keys()))
+    for profile in profiles:
+        row = totals[profile.user_id]
+        profile.expense_count = row['count']
+        profile.total_spent = row['total'] or Decimal('0.00')
+        profile.last_expense_date = row['last']
+    Profile.objects.bulk_update(profiles, ['expense_count', 'total_spent', 'last_expense_date'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0016_admininsight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='expense_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='last_expense_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='total_spent',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['total_spent'], name='profile_total_spent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['expense_count'], name='profile_expense_count_idx'),
+        ),
+        migrations.RunPython(backfill_profile_totals, migrations.RunPython.noop),
+    ]
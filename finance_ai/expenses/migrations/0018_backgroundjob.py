@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:04
+
+import django.db.models.deletion
+import expenses.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0017_profile_expense_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('user_csv', 'My expenses (CSV)'), ('user_pdf', 'My expenses (PDF)'), ('admin_csv', 'All expenses (CSV)'), ('admin_pdf', 'All expenses (PDF)'), ('user_parquet', 'My data (Parquet)'), ('admin_parquet', 'All data (Parquet)'), ('user_import', 'User import report'), ('user_delete', 'User deletion'), ('user_deactivate', 'User deactivation'), ('user_statements', 'Statements of all users (zip)')], max_length=20)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('expired', 'Expired')], default='pending', max_length=10)),
+                ('progress', models.IntegerField(default=0)),
+                ('total', models.IntegerField(blank=True, null=True)),
+                ('partitions', models.JSONField(blank=True, default=list)),
+                ('filename', models.CharField(blank=True, max_length=150)),
+                ('result_file', models.FileField(blank=True, storage=expenses.models.private_storage, upload_to=expenses.models.job_result_path)),
+                ('error', models.TextField(blank=True)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='background_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='backgroundjob_status_idx'), models.Index(fields=['expires_at'], name='backgroundjob_expires_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:10
+
+import hashlib
+import zlib
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# The services/hll.py format at the time: 2**12 one-byte registers, 64-bit BLAKE2b, zlib
+HLL_PRECISION = 12
+RANK_BITS = 64 - HLL_PRECISION
+# services/active_users.SKETCH_SHARDS at the time
+SKETCH_SHARDS = 16
+
+
+def add_to_sketch(registers, user_id):
+    value = int.from_bytes(hashlib.blake2b(str(user_id).encode(), digest_size=8).digest(), 'big')
+    index = value >> RANK_BITS
+    rank = RANK_BITS - (value & ((1 << RANK_BITS) - 1)).bit_length() + 1
+    registers[index] = max(registers[index], rank)
+
+
+def backfill_active_user_sketches(apps, schema_editor):
+    # Same sources as services/active_users.rebuild(): transaction dates and last logins
+    Expense = apps.get_model('expenses', 'Expense')
+    Income = apps.get_model('expenses', 'Income')
+    User = apps.get_model('auth', 'User')
+    ActiveUserSketch = apps.get_model('expenses', 'ActiveUserSketch')
+
+    sketches = {}
+    for model in (Expense, Income):
+        for day, user_id in model.objects.values_list('date', 'user_id').distinct().order_by().iterator():
+            key = (day, user_id % SKETCH_SHARDS)
+            add_to_sketch(sketches.setdefault(key, bytearray(1 << HLL_PRECISION)), user_id)
+    for last_login, user_id in User.objects.filter(last_login__isnull=False).values_list('last_login', 'id'):
+        key = (timezone.localdate(last_login), user_id % SKETCH_SHARDS)
+        add_to_sketch(sketches.setdefault(key, bytearray(1 << HLL_PRECISION)), user_id)
+
+    ActiveUserSketch.objects.bulk_create(
+        [ActiveUserSketch(date=day, shard=shard, sketch=zlib.compress(bytes(registers)))
+         for (day, shard), registers in sketches.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0018_backgroundjob'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveUserSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('sketch', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['date', 'shard'],
+                'unique_together': {('date', 'shard')},
+            },
+        ),
+        migrations.RunPython(backfill_active_user_sketches, migrations.RunPython.noop),
+    ]
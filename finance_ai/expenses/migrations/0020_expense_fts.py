@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:20
+
+from django.db import migrations
+
+# Kept in step with services/expense_search.py, which reinstalls these after migrate
+INSTALL_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS expenses_expense_fts USING fts5("
+    "description, content='expenses_expense', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS expenses_expense_fts_ai AFTER INSERT ON expenses_expense BEGIN "
+    "INSERT INTO expenses_expense_fts(rowid, description) VALUES (new.id, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_expense_fts_ad AFTER DELETE ON expenses_expense BEGIN "
+    "INSERT INTO expenses_expense_fts(expenses_expense_fts, rowid, description) "
+    "VALUES ('delete', old.id, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_expense_fts_au AFTER UPDATE OF description ON expenses_expense BEGIN "
+    "INSERT INTO expenses_expense_fts(expenses_expense_fts, rowid, description) "
+    "VALUES ('delete', old.id, old.description); "
+    "INSERT INTO expenses_expense_fts(rowid, description) VALUES (new.id, new.description); END",
+    "INSERT INTO expenses_expense_fts(expenses_expense_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS expenses_expense_fts_ai",
+    "DROP TRIGGER IF EXISTS expenses_expense_fts_ad",
+    "DROP TRIGGER IF EXISTS expenses_expense_fts_au",
+    "DROP TABLE IF EXISTS expenses_expense_fts",
+]
+
+
+def install_expense_search(apps, schema_editor):
+    # FTS5 index + sync triggers on SQLite; other backends keep the plain admin search
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in INSTALL_SQL:
+            schema_editor.execute(statement)
+
+
+def uninstall_expense_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in DROP_SQL:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0019_activeusersketch'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_expense_search, uninstall_expense_search),
+    ]
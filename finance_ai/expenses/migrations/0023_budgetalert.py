@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+THRESHOLDS = (50, 80, 100)
+
+
+def backfill_current_month(apps, schema_editor):
+    # Thresholds already passed this month show on the dashboard right away, but
+    # are marked skipped so deploying does not e-mail every user at once
+    Budget = apps.get_model('expenses', 'Budget')
+    BudgetAlert = apps.get_model('expenses', 'BudgetAlert')
+    MonthlyCategorySpend = apps.get_model('expenses', 'MonthlyCategorySpend')
+
+    month = timezone.localdate().replace(day=1)
+    spent = {
+        (row.user_id, row.category): row.total
+        for row in MonthlyCategorySpend.objects.filter(month=month, count__gt=0)
+    }
+    alerts = []
+    for budget in Budget.objects.all():
+        total = spent.get((budget.user_id, budget.category))
+        if total:
+            alerts.extend(
+                BudgetAlert(user_id=budget.user_id, category=budget.category, month=month, threshold=threshold,
+                            spent=total, limit=budget.monthly_budget, status='skipped')
+                for threshold in THRESHOLDS
+                if budget.monthly_budget > 0 and budget.monthly_budget * threshold <= total * 100
+            )
+    BudgetAlert.objects.bulk_create(alerts, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0022_monthlycategoryspend'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BudgetAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=20)),
+                ('month', models.DateField()),
+                ('threshold', models.PositiveSmallIntegerField(choices=[(50, '50%'), (80, '80%'), (100, '100%')])),
+                ('spent', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('limit', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('dismissed_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budget_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='budgetalert_status_idx')],
+                'unique_together': {('user', 'category', 'month', 'threshold')},
+            },
+        ),
+        migrations.RunPython(backfill_current_month, migrations.RunPython.noop),
+    ]
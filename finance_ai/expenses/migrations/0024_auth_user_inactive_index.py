@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:10
+
+from django.db import migrations
+
+INDEX_NAME = 'auth_user_inactive_idx'
+
+# Raw SQL on django.contrib.auth's table with no model state, for the reasons
+# given in 0025_auth_user_sort_indexes. This stays a RunPython rather than
+# a RunSQL because partial indexes are not portable. SQLite and PostgreSQL
+# get the index; other backends skip it and count with a scan. The reverse
+# function drops it.
+
+
+def create_inactive_index(apps, schema_editor):
+    # Partial index over the few disabled accounts, so admin insights can count
+    # them without scanning auth_user; backends without partial indexes skip it
+    if schema_editor.connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    table = schema_editor.quote_name(apps.get_model('auth', 'User')._meta.db_table)
+    schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON {table} (id) WHERE NOT is_active")
+
+
+def drop_inactive_index(apps, schema_editor):
+    if schema_editor.connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0023_budgetalert'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_inactive_index, drop_inactive_index),
+    ]
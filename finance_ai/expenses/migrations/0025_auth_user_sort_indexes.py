@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:46
+
+from django.db import migrations
+
+# auth_user belongs to django.contrib.auth, so the admin user list's sort
+# indexes are added here; each ends with id, the list's tie-breaker.
+#
+# They are plain SQL with no state_operations on purpose: an expenses
+# migration cannot add an index to auth.User's model state. That is safe
+# because makemigrations only compares model states, never the database, so
+# it neither drops nor re-adds them. The one thing that would lose them is a
+# future auth migration remaking auth_user on SQLite; a migration after it
+# would have to run these statements again. reverse_sql drops them when
+# this migration is unapplied.
+SORT_INDEXES = [
+    ('auth_user_date_joined_idx', ('date_joined', 'id')),
+    ('auth_user_last_login_idx', ('last_login', 'id')),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0024_auth_user_inactive_index'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f"CREATE INDEX {name} ON auth_user ({', '.join(columns)})",
+            reverse_sql=f"DROP INDEX {name}",
+        )
+        for name, columns in SORT_INDEXES
+    ]
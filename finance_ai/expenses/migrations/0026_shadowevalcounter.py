@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0025_auth_user_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShadowEvalCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('candidate_version', models.CharField(max_length=12)),
+                ('name', models.CharField(max_length=32)),
+                ('count', models.BigIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['candidate_version', 'name'],
+                'unique_together': {('candidate_version', 'name')},
+            },
+        ),
+    ]
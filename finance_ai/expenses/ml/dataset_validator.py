@@ -1,48 +1,65 @@
 import os
+import numpy as np
 import pandas as pd
-import random
-import re
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_PATH = os.path.join(BASE_DIR, 'dummy_data.csv')
 
-from expenses.ml.keyword_engine import clean_text
+from expenses.ml.keyword_engine import clean_text_series
 
-def validate_and_generate():
+# Rows per chunk when streaming large CSVs through the cleaner
+CSV_CHUNK_SIZE = 100000
+SYNTHETIC_SEED = 42
+
+def load_clean_dataset(path=DATA_PATH, chunksize=CSV_CHUNK_SIZE) -> tuple[pd.DataFrame, int]:
+    """
+    Streams the CSV in chunks, cleaning descriptions with vectorized string ops
+    and dropping empty / duplicate rows so only the cleaned frame is kept in memory.
+    """
+    cleaned_chunks = []
+    initial_len = 0
+    for chunk in pd.read_csv(path, usecols=['description', 'category'], chunksize=chunksize):
+        initial_len += len(chunk)
+        chunk['description'] = clean_text_series(chunk['description'])
+        chunk = chunk[chunk['description'] != ""]
+        cleaned_chunks.append(chunk.drop_duplicates(subset=['description', 'category']))
+
+    if cleaned_chunks:
+        df = pd.concat(cleaned_chunks, ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=['description', 'category'])
+    # Duplicates may still span chunk boundaries
+    df = df.drop_duplicates(subset=['description', 'category'], ignore_index=True)
+    return df, initial_len
+
+def validate_and_generate(seed: int = SYNTHETIC_SEED):
     """
     Validates dataset quality and generates synthetic data if needed.
+    The same seed always produces the same output file.
     """
     print("Validating dataset...")
     if not os.path.exists(DATA_PATH):
         print(f"Error: Dataset not found at {DATA_PATH}")
         return
 
-    df = pd.read_csv(DATA_PATH)
-    initial_len = len(df)
+    # Clean, drop empty and duplicates while streaming
+    df, initial_len = load_clean_dataset(DATA_PATH)
     
     print(f"Initial row count: {initial_len}")
     
-    # Check balance
-    print("\nInitial Category Balance:")
-    print(df['category'].value_counts())
-    
-    # Check for noise and clean it
-    df['description'] = df['description'].apply(clean_text)
-    
-    # Drop empty and duplicates
-    df = df[df['description'] != ""]
-    df = df.drop_duplicates(subset=['description', 'category'])
     cleaned_len = len(df)
     print(f"\nAfter cleaning and deduplication: {cleaned_len} rows")
+    print("\nCategory Balance:")
+    print(df['category'].value_counts())
     
     if cleaned_len < 1000:
         print("\nDataset has < 1000 rows. Generating synthetic data...")
-        df_synthetic = generate_synthetic_data(df)
+        df_synthetic = generate_synthetic_data(df, seed=seed)
+        df_synthetic['description'] = clean_text_series(df_synthetic['description'])
         
         # Combine original and synthetic
         df_combined = pd.concat([df, df_synthetic], ignore_index=True)
         # Final cleanup
-        df_combined['description'] = df_combined['description'].apply(clean_text)
         df_combined = df_combined.drop_duplicates(subset=['description', 'category'])
         
         print(f"\nSynthetic data generated. Final count: {len(df_combined)} rows.")
@@ -56,12 +73,12 @@ def validate_and_generate():
         print("Dataset has sufficient rows. Saving cleaned version.")
         df.to_csv(DATA_PATH, index=False)
 
-def generate_synthetic_data(original_df: pd.DataFrame) -> pd.DataFrame:
+def generate_synthetic_data(original_df: pd.DataFrame, seed: int = SYNTHETIC_SEED,
+                            target_per_category: int = 300) -> pd.DataFrame:
     """
     Generates synthetic data to reach > 500 rows with class balance.
+    Uses a seeded NumPy generator and builds each category's rows in one vectorized pass.
     """
-    categories = original_df['category'].unique()
-    
     # Expanded keywords mapped to categories
     # The current categories in dummy_data.csv are: Food, Travel, Transport, Shopping, Bills
     keywords = {
@@ -93,34 +110,27 @@ def generate_synthetic_data(original_df: pd.DataFrame) -> pd.DataFrame:
         ]
     }
     
-    prefixes = ['monthly', 'weekly', 'paid for', 'ordered', 'online', 'store', 'bill for', 'recharge', 'ticket for', 'trip to']
-    suffixes = ['payment', 'charge', 'order', 'purchase', 'bill', 'expense', 'subscription']
+    prefixes = np.array(['monthly', 'weekly', 'paid for', 'ordered', 'online', 'store', 'bill for', 'recharge', 'ticket for', 'trip to'], dtype=object)
+    suffixes = np.array(['payment', 'charge', 'order', 'purchase', 'bill', 'expense', 'subscription'], dtype=object)
     
-    synthetic_rows = []
+    rng = np.random.default_rng(seed)
+    frames = []
     
     # Target 300 rows per category to easily cross 1000 and ensure balance
-    target_per_category = 300
-    
-    for category in keywords.keys():
-        category_keywords = keywords[category]
-        count = 0
-        while count < target_per_category:
-            kw = random.choice(category_keywords)
-            # Create variations
-            variation_type = random.randint(1, 4)
-            if variation_type == 1:
-                desc = kw
-            elif variation_type == 2:
-                desc = f"{random.choice(prefixes)} {kw}"
-            elif variation_type == 3:
-                desc = f"{kw} {random.choice(suffixes)}"
-            else:
-                desc = f"{random.choice(prefixes)} {kw} {random.choice(suffixes)}"
-            
-            synthetic_rows.append({'description': desc, 'category': category})
-            count += 1
+    for category, category_keywords in keywords.items():
+        kw = np.array(category_keywords, dtype=object)[rng.integers(len(category_keywords), size=target_per_category)]
+        pre = prefixes[rng.integers(len(prefixes), size=target_per_category)]
+        suf = suffixes[rng.integers(len(suffixes), size=target_per_category)]
+        # Create variations: 1 = kw, 2 = prefix kw, 3 = kw suffix, 4 = prefix kw suffix
+        variation_type = rng.integers(1, 5, size=target_per_category)
+        
+        with_prefix = np.isin(variation_type, (2, 4))
+        with_suffix = np.isin(variation_type, (3, 4))
+        desc = np.where(with_prefix, pre + ' ', '') + kw + np.where(with_suffix, ' ' + suf, '')
+        
+        frames.append(pd.DataFrame({'description': desc, 'category': category}))
             
-    return pd.DataFrame(synthetic_rows)
+    return pd.concat(frames, ignore_index=True)
 
 if __name__ == "__main__":
     validate_and_generate()
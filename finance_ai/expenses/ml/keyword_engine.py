@@ -34,6 +34,10 @@ CATEGORY_MAPPING = {
     "Transport": TRANSPORT_WORDS
 }
 
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+DIGITS_RE = re.compile(r'\d+')
+WHITESPACE_RE = re.compile(r'\s+')
+
 def clean_text(text: str) -> str:
     """
     Cleans text by lowercasing, removing punctuation, 
@@ -42,15 +46,33 @@ def clean_text(text: str) -> str:
     if not isinstance(text, str):
         return ""
     text = text.lower()
-    text = re.sub(r'[^\w\s]', '', text)  # Remove punctuation
-    text = re.sub(r'\d+', '', text)     # Remove numbers
+    text = PUNCTUATION_RE.sub('', text)  # Remove punctuation
+    text = DIGITS_RE.sub('', text)       # Remove numbers
     text = text.strip()
     return " ".join(text.split())       # Remove extra spaces and normalize
 
-def apply_keyword_rules(text: str) -> str | None:
+def clean_text_series(texts):
     """
-    Checks if any word in the cleaned text matches the keyword dictionaries.
-    Returns the category string if found, otherwise None.
+    Vectorized clean_text() for a pandas Series of descriptions.
+    Produces exactly the same strings as applying clean_text() row by row.
+    """
+    if texts.empty:
+        return texts.astype(object)
+    # Non-string cells (NaN, numbers) come back as NaN from .str and map to ""
+    cleaned = (
+        texts.astype(object)
+        .str.lower()
+        .str.replace(PUNCTUATION_RE, '', regex=True)
+        .str.replace(DIGITS_RE, '', regex=True)
+        .str.replace(WHITESPACE_RE, ' ', regex=True)
+        .str.strip()
+    )
+    return cleaned.fillna("")
+
+def match_keyword_rule(text: str) -> tuple[str, str] | None:
+    """
+    Like apply_keyword_rules() but also returns the id of the rule that fired,
+    formatted as "<category>:<keyword>" (e.g. "food:pizza").
     """
     cleaned = clean_text(text)
     words = cleaned.split()
@@ -58,6 +80,14 @@ def apply_keyword_rules(text: str) -> str | None:
     for word in words:
         for category, keywords in CATEGORY_MAPPING.items():
             if word in keywords:
-                return category
+                return category, f"{category.lower()}:{word}"
                 
     return None
+
+def apply_keyword_rules(text: str) -> str | None:
+    """
+    Checks if any word in the cleaned text matches the keyword dictionaries.
+    Returns the category string if found, otherwise None.
+    """
+    match = match_keyword_rule(text)
+    return match[0] if match else None
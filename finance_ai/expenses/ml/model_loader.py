@@ -1,4 +1,5 @@
 import os
+import hashlib
 import joblib
 
 # Paths
@@ -9,6 +10,15 @@ CATEGORY_MODEL_PATH = os.path.join(MODEL_DIR, 'category_model.pkl')
 VECTORIZER_PATH = os.path.join(MODEL_DIR, 'vectorizer.pkl')
 ANOMALY_MODEL_PATH = os.path.join(MODEL_DIR, 'anomaly_model.pkl')
 
+def model_version(*paths) -> str:
+    """Short content hash identifying a trained model (and its vectorizer) on disk."""
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
 class MLLoader:
     """
     Singleton pattern to ensure Machine Learning models are 
@@ -27,12 +37,15 @@ class MLLoader:
         self.category_model = None
         self.vectorizer = None
         self.anomaly_model = None
+        self.category_model_version = ''
         
         try:
             if os.path.exists(CATEGORY_MODEL_PATH):
                 self.category_model = joblib.load(CATEGORY_MODEL_PATH)
             if os.path.exists(VECTORIZER_PATH):
                 self.vectorizer = joblib.load(VECTORIZER_PATH)
+            if self.category_model and self.vectorizer:
+                self.category_model_version = model_version(CATEGORY_MODEL_PATH, VECTORIZER_PATH)
             if os.path.exists(ANOMALY_MODEL_PATH):
                 self.anomaly_model = joblib.load(ANOMALY_MODEL_PATH)
                 
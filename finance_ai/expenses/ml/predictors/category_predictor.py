@@ -1,53 +1,126 @@
+import time
 import numpy as np
 from expenses.ml.model_loader import ml_engine
-from expenses.ml.keyword_engine import apply_keyword_rules, clean_text
+from expenses.ml.keyword_engine import match_keyword_rule, clean_text
+from expenses.ml.shadow_evaluator import shadow_evaluator
 
-def predict_category(text: str, debug: bool = False) -> str | None:
+# Minimum ML probability required before a prediction is trusted
+CONFIDENCE_THRESHOLD = 0.60
+
+def _rule_prediction(category: str, rule_id: str) -> dict:
+    return {
+        'category': category,
+        'confidence': 1.0,
+        'model_version': '',
+        'keyword_rule': rule_id,
+    }
+
+def _ml_prediction(category, confidence: float) -> dict:
+    return {
+        'category': str(category),
+        'confidence': round(float(confidence), 4),
+        'model_version': ml_engine.category_model_version,
+        'keyword_rule': '',
+    }
+
+def predict_category_details(text: str, debug: bool = False) -> dict | None:
     """
     Predict expense category using a hybrid approach:
     1. Keyword engine (Rule-based exact matching)
     2. ML model (TF-IDF + Logistic Regression)
     3. Confidence checker (Fallback if uncertainty is high)
+
+    Returns a dict with category, confidence, model_version and keyword_rule
+    (the id of the rule that matched, or ""), or None when nothing is confident.
     """
     if not text:
         return None
-        
+
     try:
         # Step 1: Clean text
         cleaned = clean_text(text)
-        
+
         # Step 2: Keyword Engine
-        rule_match = apply_keyword_rules(cleaned)
-        
+        rule_match = match_keyword_rule(cleaned)
+
         if rule_match:
             if debug:
                 print("INPUT:", text)
-                print("RULE MATCH:", rule_match)
+                print("RULE MATCH:", rule_match[0], f"({rule_match[1]})")
                 print("ML PRED: N/A")
                 print("CONF: 1.0 (Exact Match)")
-            return rule_match
-            
+            return _rule_prediction(*rule_match)
+
         # Step 3: ML Model Prediction
         if not ml_engine.category_model or not ml_engine.vectorizer:
             return None
-            
+
+        started = time.perf_counter()
         vectorized_text = ml_engine.vectorizer.transform([cleaned])
         probabilities = ml_engine.category_model.predict_proba(vectorized_text)[0]
         max_prob = np.max(probabilities)
         ml_pred = ml_engine.category_model.classes_[np.argmax(probabilities)]
-        
+        production_ms = (time.perf_counter() - started) * 1000
+
+        # Step 3b: Shadow-compare a candidate model off the request path (sampled)
+        if shadow_evaluator.should_sample():
+            shadow_evaluator.submit(cleaned, str(ml_pred) if max_prob >= CONFIDENCE_THRESHOLD else None, production_ms)
+
         if debug:
             print("INPUT:", text)
             print("RULE MATCH: None")
             print("ML PRED:", ml_pred)
             print("CONF:", round(max_prob, 4))
-        
+
         # Step 4: Confidence Check
-        if max_prob < 0.60:
+        if max_prob < CONFIDENCE_THRESHOLD:
             return None
-            
-        return ml_pred
-        
+
+        return _ml_prediction(ml_pred, max_prob)
+
     except Exception as e:
         print(f"[ML Predictor Warning] Categorization prediction failed: {e}")
         return None
+
+
+def predict_category(text: str, debug: bool = False) -> str | None:
+    """Category-only shortcut for predict_category_details()."""
+    details = predict_category_details(text, debug=debug)
+    return details['category'] if details else None
+
+
+def predict_categories(texts: list) -> list:
+    """
+    Batched predict_category_details() for offline rescoring.
+    Keyword rules are applied per text; everything they miss goes through
+    the vectorizer and classifier in a single call.
+    """
+    results = [None] * len(texts)
+    pending_idx, pending_text = [], []
+
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        cleaned = clean_text(text)
+        rule_match = match_keyword_rule(cleaned)
+        if rule_match:
+            results[i] = _rule_prediction(*rule_match)
+        else:
+            pending_idx.append(i)
+            pending_text.append(cleaned)
+
+    if not pending_text or not ml_engine.category_model or not ml_engine.vectorizer:
+        return results
+
+    try:
+        probabilities = ml_engine.category_model.predict_proba(ml_engine.vectorizer.transform(pending_text))
+        best = np.argmax(probabilities, axis=1)
+        confidences = probabilities[np.arange(len(best)), best]
+        labels = ml_engine.category_model.classes_[best]
+        for i, label, confidence in zip(pending_idx, labels, confidences):
+            if confidence >= CONFIDENCE_THRESHOLD:
+                results[i] = _ml_prediction(label, confidence)
+    except Exception as e:
+        print(f"[ML Predictor Warning] Batch categorization failed: {e}")
+
+    return results
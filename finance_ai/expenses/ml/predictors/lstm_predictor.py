@@ -1,4 +1,5 @@
 import os
+import json
 import joblib
 import numpy as np
 from django.db.models import Sum
@@ -16,6 +17,7 @@ ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MODEL_DIR = os.path.join(ML_DIR, 'saved_models')
 MODEL_PATH = os.path.join(MODEL_DIR, 'expense_lstm.h5')
 SCALER_PATH = os.path.join(MODEL_DIR, 'scaler.pkl')
+META_PATH = os.path.join(MODEL_DIR, 'expense_lstm_meta.json')
 
 WINDOW_SIZE = 3
 
@@ -32,11 +34,16 @@ class LSTMPredictorEngine:
     def _load_assets(self):
         self.model = None
         self.scaler = None
+        # Legacy models were trained on raw platform totals; global models on per-user window ratios
+        self.normalization = None
         
         try:
             if load_model and os.path.exists(MODEL_PATH) and os.path.exists(SCALER_PATH):
                 self.model = load_model(MODEL_PATH, compile=False)
                 self.scaler = joblib.load(SCALER_PATH)
+                if os.path.exists(META_PATH):
+                    with open(META_PATH) as fh:
+                        self.normalization = json.load(fh).get('normalization')
                 print("[LSTM Engine] Successfully loaded model and scaler globally.")
             else:
                 print(f"[LSTM Engine] Assets missing. Required at: {MODEL_PATH} and {SCALER_PATH}")
@@ -70,8 +77,12 @@ def predict_next_month(user) -> float | None:
         if not monthly_totals:
             return None
             
-        # 3. Extract purely floats natively avoiding any anomalies
-        values = [float(m['total']) for m in monthly_totals if m['total'] is not None]
+        # 3. Extract floats, with 0 for months without expenses (the model is trained on consecutive months)
+        rows = list(monthly_totals)
+        first, last = rows[0]['month'], rows[-1]['month']
+        values = [0.0] * ((last.year - first.year) * 12 + last.month - first.month + 1)
+        for m in rows:
+            values[(m['month'].year - first.year) * 12 + m['month'].month - first.month] = float(m['total'] or 0)
         print("3. Extracted values list:", values)
         
         # Prepare deterministic SMA fallback
@@ -92,6 +103,14 @@ def predict_next_month(user) -> float | None:
         # Slice only exact sequence count chronologically
         sequence = values[-WINDOW_SIZE:]
         
+        # Global model: express the window relative to this user's own scale
+        user_scale = 1.0
+        if lstm_engine.normalization == 'window_mean':
+            user_scale = float(np.mean(sequence))
+            if user_scale <= 0:
+                return fallback_avg
+            sequence = [v / user_scale for v in sequence]
+        
         # Reshape to 2D column array for scaler safely
         data_array = np.array(sequence).reshape(-1, 1)
         
@@ -113,7 +132,7 @@ def predict_next_month(user) -> float | None:
             return fallback_avg
             
         # Inverse transform result back implicitly to monetary figures
-        predicted_value = lstm_engine.scaler.inverse_transform(prediction_scaled)[0][0]
+        predicted_value = lstm_engine.scaler.inverse_transform(prediction_scaled)[0][0] * user_scale
         predicted_value = min(1000000.00, max(0.0, float(predicted_value)))
         predicted_value = round(predicted_value, 2)
         
@@ -0,0 +1,139 @@
+"""
+sequences.py — training windows for the expense LSTM.
+
+Monthly totals are streamed from one grouped query in chunks of numpy arrays
+(user_ids, months, totals) sorted by user and month. Windows are built over a
+whole chunk at once: each user's months are gap-filled into one dense series
+and windows that would straddle two users are masked out, so no Python code
+runs per user or per month.
+"""
+from itertools import islice
+
+import numpy as np
+
+
+def fetch_monthly_chunks(chunk_size):
+    """
+    Runs a single grouped query (user x month -> total) ordered by user and
+    month and yields it as (user_ids, months, totals) arrays of up to
+    `chunk_size` rows. `months` counts calendar months since 1970-01.
+    """
+    from django.db.models import Sum
+    from django.db.models.functions import TruncMonth
+    from expenses.models import Expense
+
+    rows = (
+        Expense.objects.annotate(month=TruncMonth('date', tzinfo=None))
+        .values('user_id', 'month')
+        .annotate(total=Sum('amount'))
+        .order_by('user_id', 'month')
+        .values_list('user_id', 'month', 'total')
+        .iterator(chunk_size=chunk_size)
+    )
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        user_ids, months, totals = zip(*chunk)
+        yield (
+            np.array(user_ids, dtype=np.int64),
+            np.array(months, dtype='datetime64[M]').astype(np.int64),
+            np.array([total or 0 for total in totals], dtype=np.float32),
+        )
+
+
+def build_windows(user_ids, months, totals, window_size):
+    """
+    Builds normalized sliding windows over every user in one sorted chunk.
+
+    Each user's months are gap-filled with 0 so consecutive entries are
+    always consecutive calendar months, then each window is divided by its
+    own mean so users with very different spending scales share one input
+    distribution; windows with no spending at all are dropped.
+    Example: one user with totals = [100, 200, 300, 400], window_size=3
+    X = [[0.5, 1.0, 1.5]], y = [2.0]
+    """
+    empty = np.empty((0, window_size), dtype=np.float32), np.empty(0, dtype=np.float32)
+    if not len(user_ids):
+        return empty
+
+    starts = np.r_[0, np.flatnonzero(np.diff(user_ids)) + 1]
+    ends = np.r_[starts[1:], len(user_ids)] - 1
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(user_ids)]))
+    lengths = months[ends] - months[starts] + 1
+    offsets = np.r_[0, np.cumsum(lengths)[:-1]]
+
+    dense = np.zeros(lengths.sum(), dtype=np.float32)
+    dense[offsets[group] + months - months[starts][group]] = totals
+    if len(dense) <= window_size:
+        return empty
+    owner = np.repeat(np.arange(len(starts)), lengths)
+
+    windows = np.lib.stride_tricks.sliding_window_view(dense, window_size + 1)
+    # A window belongs to one user only if its first and last month do
+    within_user = owner[:-window_size] == owner[window_size:]
+    X, y = windows[within_user, :window_size], windows[within_user, window_size]
+    scale = X.mean(axis=1)
+    usable = scale > 0
+    X = X[usable] / scale[usable, None]
+    y = y[usable] / scale[usable]
+    return X.astype(np.float32), y.astype(np.float32)
+
+
+def iter_windows(chunks, window_size):
+    """
+    Yields (X, y) per chunk of (user_ids, months, totals). The last user of a
+    chunk may continue in the next one, so their rows are held back and
+    prepended to the next chunk before windows are built.
+    """
+    carry = None
+    for user_ids, months, totals in chunks:
+        if carry is not None:
+            user_ids, months, totals = (np.concatenate(pair) for pair in zip(carry, (user_ids, months, totals)))
+        if not len(user_ids):
+            continue
+        tail = np.searchsorted(user_ids, user_ids[-1])
+        carry = user_ids[tail:], months[tail:], totals[tail:]
+        yield build_windows(user_ids[:tail], months[:tail], totals[:tail], window_size)
+    if carry is not None:
+        yield build_windows(*carry, window_size)
+
+
+def sample_sequences(batches, window_size, max_sequences, rng):
+    """
+    Reservoir-samples (Algorithm R) up to `max_sequences` windows from the
+    (X, y) `batches` as they are generated, so memory stays bounded by the
+    sample rather than by the platform's history. Returns (X, y, seen).
+    """
+    X_sample = np.empty((max_sequences, window_size), dtype=np.float32)
+    y_sample = np.empty(max_sequences, dtype=np.float32)
+    seen = 0
+    for X, y in batches:
+        if not len(X):
+            continue
+        positions = seen + np.arange(len(X))
+        # Fill the reservoir first, then replace a random slot with probability max/position
+        fill = positions < max_sequences
+        X_sample[positions[fill]], y_sample[positions[fill]] = X[fill], y[fill]
+        slots = rng.integers(0, positions[~fill] + 1)
+        keep = slots < max_sequences
+        X_sample[slots[keep]], y_sample[slots[keep]] = X[~fill][keep], y[~fill][keep]
+        seen += len(X)
+    kept = min(seen, max_sequences)
+    return X_sample[:kept], y_sample[:kept], seen
+
+
+def generate_synthetic_chunks(rng, n_users=50, n_months=36):
+    """
+    Generates trending, noisy monthly histories for users on different
+    spending scales, yielded like fetch_monthly_chunks() output.
+    """
+    base = rng.uniform(2000, 50000, size=(n_users, 1))
+    trend = rng.uniform(-0.01, 0.03, size=(n_users, 1)) * np.arange(n_months)
+    noise = rng.normal(0, 0.08, size=(n_users, n_months))
+    totals = np.maximum(base * (1 + trend + noise), 100.0).astype(np.float32)
+    yield (
+        np.repeat(np.arange(n_users, dtype=np.int64), n_months),
+        np.tile(np.arange(n_months, dtype=np.int64), n_users),
+        totals.ravel(),
+    )
@@ -0,0 +1,226 @@
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import joblib
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from expenses.ml.model_loader import MODEL_DIR, model_version
+
+logger = logging.getLogger(__name__)
+
+# Drop a retrained category_model.pkl + vectorizer.pkl here to shadow-test it
+CANDIDATE_DIR = os.path.join(MODEL_DIR, 'candidate')
+CANDIDATE_MODEL_PATH = os.path.join(CANDIDATE_DIR, 'category_model.pkl')
+CANDIDATE_VECTORIZER_PATH = os.path.join(CANDIDATE_DIR, 'vectorizer.pkl')
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+# Pending comparisons beyond this are dropped rather than queued
+MAX_PENDING = 1000
+
+# The worker saves its counters once the queue drains, or after this many comparisons under load
+FLUSH_EVERY = 100
+
+COUNTERS = ('compared', 'agreed', 'dropped', 'errors')
+
+
+def latency_bucket(ms: float) -> str:
+    """Label of the histogram bucket holding a latency of `ms`."""
+    for bound in LATENCY_BUCKETS_MS:
+        if ms <= bound:
+            return f"<={bound}ms"
+    return f">{LATENCY_BUCKETS_MS[-1]}ms"
+
+
+def latency_snapshot(counters: dict, model: str) -> dict:
+    """Histogram of `model` ('production' or 'candidate') from {name: (count, total_ms)} counters."""
+    labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+    buckets = {label: counters.get(f"{model}:{label}", (0, 0.0)) for label in labels}
+    samples = sum(count for count, _ms in buckets.values())
+    total_ms = sum(ms for _count, ms in buckets.values())
+    return {
+        'buckets': {label: count for label, (count, _ms) in buckets.items()},
+        'samples': samples,
+        'avg_ms': round(total_ms / samples, 3) if samples else None,
+    }
+
+
+class ShadowEvaluator:
+    """
+    Singleton that compares a candidate category model against production on a
+    sampled fraction of live ML predictions.
+
+    submit() never blocks: it only enqueues the request text and the production
+    result. A daemon worker thread loads the candidate lazily, scores it and
+    adds agreement and per-model latency counts to ShadowEvalCounter rows in
+    batches, so the report covers every process and survives restarts.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ShadowEvaluator, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self.sample_rate = float(getattr(settings, 'ML_SHADOW_SAMPLE_RATE', 0.0))
+        self.enabled = self.sample_rate > 0 and os.path.exists(CANDIDATE_MODEL_PATH) and os.path.exists(CANDIDATE_VECTORIZER_PATH)
+        self.candidate_model = None
+        self.candidate_vectorizer = None
+        self.candidate_version = ''
+        self._queue = queue.Queue(maxsize=MAX_PENDING)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pending = {}
+
+    def _count(self, name, ms=0.0):
+        # Caller holds self._lock
+        count, total_ms = self._pending.get(name, (0, 0.0))
+        self._pending[name] = (count + 1, total_ms + ms)
+
+    def flush(self):
+        """Add the counts gathered since the last flush to the shared counter rows."""
+        from expenses.models import ShadowEvalCounter
+        from expenses.services import counter_rows
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        version = self.version()
+        close_old_connections()
+        try:
+            with transaction.atomic():
+                for name, (count, total_ms) in sorted(pending.items()):
+                    counter_rows.increment(
+                        ShadowEvalCounter, {'candidate_version': version, 'name': name},
+                        {'count': count, 'total_ms': total_ms},
+                    )
+        except Exception:
+            logger.exception('Could not save shadow evaluation counters; keeping them for the next flush')
+            with self._lock:
+                for name, (count, total_ms) in pending.items():
+                    kept_count, kept_ms = self._pending.get(name, (0, 0.0))
+                    self._pending[name] = (kept_count + count, kept_ms + total_ms)
+
+    def reset_stats(self):
+        """Forget every count recorded for the current candidate."""
+        from expenses.models import ShadowEvalCounter
+
+        with self._lock:
+            self._pending = {}
+        ShadowEvalCounter.objects.filter(candidate_version=self.version()).delete()
+
+    def version(self) -> str:
+        """Content hash of the candidate on disk ('' without one), loaded or not."""
+        paths = (CANDIDATE_MODEL_PATH, CANDIDATE_VECTORIZER_PATH)
+        if not self.candidate_version and all(os.path.exists(path) for path in paths):
+            self.candidate_version = model_version(*paths)
+        return self.candidate_version
+
+    def should_sample(self) -> bool:
+        return self.enabled and random.random() < self.sample_rate
+
+    def submit(self, cleaned_text: str, production_label, production_ms: float):
+        """Queue one comparison; returns immediately, dropping it when the queue is full."""
+        if not self.enabled:
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((cleaned_text, production_label, production_ms))
+        except queue.Full:
+            with self._lock:
+                self._count('dropped')
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name='ml-shadow-evaluator', daemon=True)
+                    self._worker.start()
+
+    def _load_candidate(self):
+        try:
+            self.candidate_model = joblib.load(CANDIDATE_MODEL_PATH)
+            self.candidate_vectorizer = joblib.load(CANDIDATE_VECTORIZER_PATH)
+            self.candidate_version = model_version(CANDIDATE_MODEL_PATH, CANDIDATE_VECTORIZER_PATH)
+            logger.info('Loaded candidate category model %s for shadow evaluation', self.candidate_version)
+        except Exception:
+            logger.exception('Could not load the candidate category model; disabling shadow evaluation')
+            self.enabled = False
+
+    def _run(self):
+        if self.candidate_model is None:
+            self._load_candidate()
+
+        since_flush = 0
+        while self.enabled:
+            cleaned_text, production_label, production_ms = self._queue.get()
+            try:
+                self.evaluate(cleaned_text, production_label, production_ms)
+            finally:
+                self._queue.task_done()
+            since_flush += 1
+            if since_flush >= FLUSH_EVERY or self._queue.empty():
+                self.flush()
+                since_flush = 0
+
+    def evaluate(self, cleaned_text: str, production_label, production_ms: float):
+        """Score one queued request with the candidate and count the outcome."""
+        from expenses.ml.predictors.category_predictor import CONFIDENCE_THRESHOLD
+
+        try:
+            started = time.perf_counter()
+            probabilities = self.candidate_model.predict_proba(self.candidate_vectorizer.transform([cleaned_text]))[0]
+            candidate_ms = (time.perf_counter() - started) * 1000
+            best = int(np.argmax(probabilities))
+            candidate_label = str(self.candidate_model.classes_[best]) if probabilities[best] >= CONFIDENCE_THRESHOLD else None
+        except Exception:
+            with self._lock:
+                self._count('errors')
+            logger.warning('Candidate category prediction failed', exc_info=True)
+            return
+
+        with self._lock:
+            self._count('compared')
+            if candidate_label == production_label:
+                self._count('agreed')
+            self._count(f'production:{latency_bucket(production_ms)}', production_ms)
+            self._count(f'candidate:{latency_bucket(candidate_ms)}', candidate_ms)
+
+    def snapshot(self) -> dict:
+        """Counts saved by every process for the current candidate; `pending` is this process's queue."""
+        from expenses.models import ShadowEvalCounter
+
+        version = self.version()
+        counters = {
+            name: (count, total_ms)
+            for name, count, total_ms in ShadowEvalCounter.objects.filter(candidate_version=version)
+            .values_list('name', 'count', 'total_ms')
+        }
+        compared, agreed, dropped, errors = (counters.get(name, (0, 0.0))[0] for name in COUNTERS)
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'candidate_version': version,
+            'compared': compared,
+            'agreement_rate': round(agreed / compared * 100, 2) if compared else None,
+            'dropped': dropped,
+            'errors': errors,
+            'pending': self._queue.qsize(),
+            'latency': {
+                'production': latency_snapshot(counters, 'production'),
+                'candidate': latency_snapshot(counters, 'candidate'),
+            },
+        }
+
+
+# Expose a global initialized singleton instance
+shadow_evaluator = ShadowEvaluator()
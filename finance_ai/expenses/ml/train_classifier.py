@@ -25,8 +25,8 @@ def train_model():
     
     # 1. Prepare Features (X) and Labels (y)
     # Apply preprocessing from our new text cleaner
-    from expenses.ml.keyword_engine import clean_text
-    X = df['description'].apply(clean_text)
+    from expenses.ml.keyword_engine import clean_text_series
+    X = clean_text_series(df['description'])
 
     y = df['category']
     
@@ -1,9 +1,12 @@
-from django.db import models
+from django.core.files.storage import storages
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 from datetime import date as dt_date
+import os
+import secrets
 
 
 class Expense(models.Model):
@@ -33,12 +36,28 @@ class Expense(models.Model):
 	is_auto_categorized = models.BooleanField(default=False)
 	is_ml_predicted = models.BooleanField(default=False)
 
+	# Prediction provenance, so rescoring can target stale or uncertain rows
+	model_version = models.CharField(max_length=40, blank=True, default='')
+	prediction_confidence = models.FloatField(null=True, blank=True)
+	keyword_rule = models.CharField(max_length=64, blank=True, default='')
+
 	class Meta:
 		ordering = ['-date', '-id']
+		indexes = [
+			models.Index(fields=['user', 'date'], name='expense_user_date_idx'),
+			models.Index(fields=['date', 'id'], name='expense_date_id_idx'),
+			models.Index(fields=['is_ml_predicted', 'model_version'], name='expense_ml_version_idx'),
+			models.Index(fields=['is_ml_predicted', 'prediction_confidence'], name='expense_ml_confidence_idx'),
+		]
 
 	def __str__(self):
 		return f"{self.user.username} | {self.category}: {self.amount} on {self.date}"
 
+	def save(self, *args, **kwargs):
+		# The derived tables maintained in signals.py commit together with the row
+		with transaction.atomic():
+			super().save(*args, **kwargs)
+
 # Create your models here.
 
 class Income(models.Model):
@@ -66,10 +85,18 @@ class Income(models.Model):
     
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['user', 'date'], name='income_user_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} | {self.source}: {self.amount} on {self.date}"
 
+    def save(self, *args, **kwargs):
+        # The derived tables maintained in signals.py commit together with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 class SavingGoal(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saving_goals')
     title = models.CharField(max_length=100)
@@ -183,6 +210,275 @@ class Profile(models.Model):
     profile_image = models.ImageField(upload_to='profiles/', blank=True, null=True)
     currency = models.CharField(max_length=10, default='INR')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Per-user expense totals kept current by signals (see services/user_totals.py)
+    expense_count = models.IntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    last_expense_date = models.DateField(null=True, blank=True)
+    # Set when an admin queues the account for deletion (see services/user_deletion.py)
+    deletion_requested_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['total_spent'], name='profile_total_spent_idx'),
+            models.Index(fields=['expense_count'], name='profile_expense_count_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
+
+
+class UserCohort(models.Model):
+    """
+    Number of users per (join date, last-login month).
+    Maintained by signals in signals.py; rebuilt with `manage.py rebuild_user_cohorts`.
+    """
+    join_date = models.DateField()
+    # First day of join_date's month, so reads can group by month without date functions
+    join_month = models.DateField()
+    # First day of the month of the user's last login (NULL = never logged in)
+    active_month = models.DateField(null=True, blank=True)
+    users = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('join_date', 'active_month')
+        constraints = [
+            # NULLs are distinct in unique_together, so "never active" rows need their own constraint
+            models.UniqueConstraint(fields=['join_date'], condition=models.Q(active_month__isnull=True),
+                                    name='usercohort_never_active_uniq'),
+        ]
+        ordering = ['join_date', 'active_month']
+
+    def __str__(self):
+        return f"Joined {self.join_date} | active {self.active_month or 'never'}: {self.users}"
+
+
+class PlatformDailyRollup(models.Model):
+    """
+    Platform-wide totals per day and expense category / income source.
+    Maintained on every Expense/Income write (see services/platform_rollups.py);
+    rebuilt with `manage.py rebuild_platform_rollups`.
+    """
+    KIND_CHOICES = [
+        ('expense', 'Expense'),
+        ('income', 'Income'),
+    ]
+
+    date = models.DateField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    key = models.CharField(max_length=20)  # Expense.category or Income.source
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+    count = models.IntegerField(default=0)
+    users = models.IntegerField(default=0)  # distinct users with a row that day under this key
+
+    class Meta:
+        unique_together = ('kind', 'date', 'key')
+        ordering = ['date', 'kind', 'key']
+
+    def __str__(self):
+        return f"{self.date} | {self.kind}:{self.key} = {self.total} ({self.count} rows, {self.users} users)"
+
+
+class MonthlyCategorySpend(models.Model):
+    """
+    A user's expense total per calendar month and category, read by budget
+    utilisation. Maintained on every Expense write (see services/spend_counters.py);
+    rebuilt with `manage.py rebuild_spend_counters`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_spend')
+    month = models.DateField()  # first day of the month
+    category = models.CharField(max_length=20)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'month', 'category')
+        ordering = ['user', 'month', 'category']
+
+    def __str__(self):
+        return f"{self.user_id} | {self.month:%Y-%m} {self.category} = {self.total} ({self.count} rows)"
+
+
+class BudgetAlert(models.Model):
+    """
+    Outbox row for a budget threshold crossed by an expense write, at most one
+    per (user, category, month, threshold). Written by services/budget_alerts.py,
+    shown on the dashboard until dismissed and sent by `manage.py deliver_budget_alerts`.
+    """
+    THRESHOLD_CHOICES = [
+        (50, '50%'),
+        (80, '80%'),
+        (100, '100%'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('skipped', 'Skipped'),  # no address to deliver to
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budget_alerts')
+    category = models.CharField(max_length=20)
+    month = models.DateField()  # first day of the month
+    threshold = models.PositiveSmallIntegerField(choices=THRESHOLD_CHOICES)
+    spent = models.DecimalField(max_digits=14, decimal_places=2)  # month's spend when the threshold was crossed
+    limit = models.DecimalField(max_digits=10, decimal_places=2)  # the budget at that time
+    created_at = models.DateTimeField(auto_now_add=True)
+    dismissed_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)  # retry backoff after a failed send
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        unique_together = ('user', 'category', 'month', 'threshold')
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='budgetalert_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} | {self.month:%Y-%m} {self.category} reached {self.threshold}% ({self.status})"
+
+
+class AdminInsight(models.Model):
+    """
+    Latest result of one admin insight rule (see utils/admin_insights.py).
+    Refreshed by `manage.py refresh_admin_insights` or lazily once stale.
+    """
+    TYPE_CHOICES = [
+        ('info', 'Info'),
+        ('success', 'Success'),
+        ('warning', 'Warning'),
+        ('danger', 'Danger'),
+    ]
+
+    rule = models.CharField(max_length=64, unique=True)
+    position = models.PositiveSmallIntegerField(default=0)
+    type = models.CharField(max_length=10, choices=TYPE_CHOICES, default='info')
+    icon = models.CharField(max_length=8, blank=True)
+    message = models.CharField(max_length=255)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['position']
+
+    def __str__(self):
+        return f"{self.rule} [{self.type}]: {self.message}"
+
+
+def private_storage():
+    """Storage outside MEDIA_ROOT for files only the owning user may download (settings.STORAGES['private'])."""
+    return storages['private']
+
+
+def job_result_path(instance, filename):
+    # Unguessable, so a leaked or listed directory does not map names to users;
+    # the download view sends the job's own filename
+    return f"exports/{secrets.token_urlsafe(24)}{os.path.splitext(filename)[1]}"
+
+
+class BackgroundJob(models.Model):
+    """
+    Work queued by a request and run by `manage.py run_export_worker`: large
+    CSV/PDF/Parquet exports, user imports, deletions and deactivations. Each
+    kind writes a result file (the export, or a per-user report). See
+    services/jobs.py for the queue and JOB_WRITERS for the writers.
+    """
+    KIND_CHOICES = [
+        ('user_csv', 'My expenses (CSV)'),
+        ('user_pdf', 'My expenses (PDF)'),
+        ('admin_csv', 'All expenses (CSV)'),
+        ('admin_pdf', 'All expenses (PDF)'),
+        ('user_parquet', 'My data (Parquet)'),
+        ('admin_parquet', 'All data (Parquet)'),
+        ('user_import', 'User import report'),
+        ('user_delete', 'User deletion'),
+        ('user_deactivate', 'User deactivation'),
+        ('user_statements', 'Statements of all users (zip)'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='background_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    progress = models.IntegerField(default=0)  # rows written so far
+    total = models.IntegerField(null=True, blank=True)  # rows expected, when known
+    partitions = models.JSONField(default=list, blank=True)  # per-partition progress of parallel exports
+    filename = models.CharField(max_length=150, blank=True)
+    result_file = models.FileField(upload_to=job_result_path, storage=private_storage, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # last progress report from the worker
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='backgroundjob_status_idx'),
+            models.Index(fields=['expires_at'], name='backgroundjob_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.user.username} [{self.status}]"
+
+    @property
+    def percent(self):
+        if self.status == 'done':
+            return 100
+        if not self.total:
+            return 0
+        return min(99, int(self.progress * 100 / self.total))
+
+
+class ActiveUserSketch(models.Model):
+    """
+    HyperLogLog sketch of the users active on one day (logged in or wrote an
+    expense/income), split into shards by user id so concurrent writers lock
+    different rows; a day's sketch is the merge of its shards. Maintained by
+    signals (see services/active_users.py); rebuilt with
+    `manage.py rebuild_active_user_sketches`.
+    """
+    date = models.DateField()
+    shard = models.PositiveSmallIntegerField(default=0)
+    sketch = models.BinaryField()  # zlib-compressed registers, see services/hll.py
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('date', 'shard')
+        ordering = ['date', 'shard']
+
+    def __str__(self):
+        return f"Active users on {self.date} (shard {self.shard})"
+
+
+class ShadowEvalCounter(models.Model):
+    """
+    Cumulative shadow-evaluation counter for one candidate category model,
+    shared by every web process (see ml/shadow_evaluator.py). `name` is
+    compared / agreed / dropped / errors, or a latency bucket such as
+    'candidate:<=5ms' whose total_ms sums the latencies counted in it.
+    """
+    candidate_version = models.CharField(max_length=12)
+    name = models.CharField(max_length=32)
+    count = models.BigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('candidate_version', 'name')
+        ordering = ['candidate_version', 'name']
+
+    def __str__(self):
+        return f"{self.candidate_version} {self.name}: {self.count}"
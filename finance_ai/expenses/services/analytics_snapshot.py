@@ -0,0 +1,148 @@
+"""
+analytics_snapshot.py — Columnar snapshot of expenses/incomes for heavy admin analytics.
+
+`manage.py refresh_analytics_snapshot` (run from cron) writes the Expense and
+Income tables to Parquet under ANALYTICS_SNAPSHOT_DIR using the typed
+writers in columnar.py. Each build goes into its own directory and
+manifest.json is swapped in last, so readers never see a half-written
+snapshot. `query()` runs SQL over it with an in-process DuckDB connection.
+Cross-user GROUP BYs then read the files and never touch the SQLite
+database that serves user writes.
+
+Tables available to query():
+  expenses(id, date, user_id, username, category, amount_minor, description)
+  incomes(id, date, user_id, username, source, amount_minor, description)
+
+duckdb and pyarrow are optional (requirements-analytics.txt). Without them,
+or before the first refresh, `available()` is False and callers fall back to
+the ORM; refresh() and query() raise SnapshotUnavailable saying what is missing.
+"""
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from expenses.services import columnar
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+MANIFEST_NAME = 'manifest.json'
+
+MISSING_PACKAGES = (
+    "The analytics snapshot requires the duckdb and pyarrow packages "
+    "(pip install -r requirements-analytics.txt)."
+)
+
+# dataset -> table name exposed to query()
+TABLES = {'expenses': 'expenses', 'incomes': 'incomes'}
+
+
+class SnapshotUnavailable(Exception):
+    """No snapshot has been built, or duckdb is not installed."""
+
+
+def _root():
+    return settings.ANALYTICS_SNAPSHOT_DIR
+
+
+def _manifest_path():
+    return os.path.join(_root(), MANIFEST_NAME)
+
+
+def manifest():
+    """The current snapshot's manifest dict, or None before the first refresh."""
+    try:
+        with open(_manifest_path()) as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def status():
+    """
+    Freshness of the current snapshot for the admin UI:
+    {'engine', 'built_at', 'age_seconds', 'stale', 'rows'}; engine is 'live'
+    when analytics run on the transactional database instead.
+    """
+    current = manifest()
+    if duckdb is None or current is None:
+        return {'engine': 'live', 'built_at': None, 'age_seconds': None, 'stale': False, 'rows': {}}
+    age = time.time() - current['built_ts']
+    return {
+        'engine': 'snapshot',
+        'built_at': current['built_at'],
+        'age_seconds': round(age),
+        'stale': age > settings.ANALYTICS_SNAPSHOT_MAX_AGE,
+        'rows': current['rows'],
+    }
+
+
+def available():
+    return duckdb is not None and manifest() is not None
+
+
+def refresh():
+    """Write a new snapshot, publish it, and delete older builds. Returns its manifest."""
+    from expenses.models import Expense, Income
+
+    if not columnar.available() or duckdb is None:
+        raise SnapshotUnavailable(MISSING_PACKAGES)
+
+    started = time.time()
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    build_dir = os.path.join(_root(), version)
+    os.makedirs(build_dir)
+
+    rows = {}
+    for dataset, qs in (('expenses', Expense.objects.all()), ('incomes', Income.objects.all())):
+        with open(os.path.join(build_dir, f'{dataset}.parquet'), 'wb') as output:
+            rows[dataset] = columnar.write_parquet(output, qs, dataset)
+
+    new_manifest = {
+        'version': version,
+        'built_at': datetime.fromtimestamp(started, tz=timezone.utc).isoformat(),
+        'built_ts': started,
+        'build_seconds': round(time.time() - started, 2),
+        'rows': rows,
+    }
+    tmp_path = _manifest_path() + '.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(new_manifest, fh)
+    os.replace(tmp_path, _manifest_path())
+
+    # Older builds may still be read by an in-flight query; they are small
+    # enough that keeping the previous one around covers that window.
+    builds = sorted(name for name in os.listdir(_root()) if name != version and os.path.isdir(os.path.join(_root(), name)))
+    for name in builds[:-1]:
+        shutil.rmtree(os.path.join(_root(), name), ignore_errors=True)
+    return new_manifest
+
+
+def query(sql, params=None):
+    """
+    Run `sql` against the current snapshot and return a list of row dicts.
+    Raises SnapshotUnavailable when there is nothing to query.
+    """
+    if duckdb is None:
+        raise SnapshotUnavailable(MISSING_PACKAGES)
+    current = manifest()
+    if current is None:
+        raise SnapshotUnavailable("No analytics snapshot is available; run manage.py refresh_analytics_snapshot.")
+
+    build_dir = os.path.join(_root(), current['version'])
+    con = duckdb.connect()
+    try:
+        for dataset, table in TABLES.items():
+            path = os.path.join(build_dir, f'{dataset}.parquet').replace("'", "''")
+            con.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{path}')")
+        cursor = con.execute(sql, params or [])
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        con.close()
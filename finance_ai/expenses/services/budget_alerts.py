@@ -0,0 +1,153 @@
+"""
+budget_alerts.py — Budget threshold alerts detected at write time, delivered from an outbox.
+
+Whenever an expense write moves a spend counter (services/spend_counters.py)
+for the running month, record_crossings() compares the spend before and
+after the write with the category's budget. Each of THRESHOLDS (% of the
+budget) that was crossed is inserted as a BudgetAlert in the same
+transaction. The (user, category, month, threshold) unique constraint plus
+ignore_conflicts keeps it to one alert per threshold per month, however
+often spend goes back and forth around it.
+
+Two consumers read the outbox. The dashboard lists this month's alerts until
+the user dismisses them, and `manage.py deliver_budget_alerts` e-mails
+pending alerts. The worker claims alerts with a conditional UPDATE. It
+retries failures with a growing delay, up to BUDGET_ALERT_MAX_ATTEMPTS
+times, and re-queues claims abandoned for longer than
+BUDGET_ALERT_STALE_MINUTES.
+"""
+import logging
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+THRESHOLDS = (50, 80, 100)
+
+
+def crossed(old_total, new_total, limit):
+    """Thresholds (percent of `limit`) that spend passed on its way from old_total to new_total."""
+    if limit <= 0 or new_total <= old_total:
+        return []
+    return [t for t in THRESHOLDS if old_total * 100 < limit * t <= new_total * 100]
+
+
+def record_crossings(user_id, month, category, old_total, new_total, limit=None):
+    """
+    Insert an alert for every threshold crossed by moving this month's
+    `category` spend from old_total to new_total. Past months are ignored,
+    so backdated expenses never alert. Call inside the write's transaction.
+    """
+    from expenses.models import Budget, BudgetAlert
+
+    if new_total <= old_total or month != date.today().replace(day=1):
+        return []
+    if limit is None:
+        limit = Budget.objects.filter(user_id=user_id, category=category).values_list('monthly_budget', flat=True).first()
+        if limit is None:
+            return []
+    thresholds = crossed(old_total, new_total, limit)
+    if thresholds:
+        BudgetAlert.objects.bulk_create(
+            [BudgetAlert(user_id=user_id, category=category, month=month, threshold=t, spent=new_total, limit=limit)
+             for t in thresholds],
+            ignore_conflicts=True,
+        )
+    return thresholds
+
+
+def record_budget_change(budget):
+    """Alert on thresholds the month's spend already passes under a new or changed budget."""
+    from expenses.services import spend_counters
+
+    month = date.today().replace(day=1)
+    spent = spend_counters.month_totals(budget.user_id, month).get(budget.category)
+    if spent:
+        record_crossings(budget.user_id, month, budget.category, 0, spent, budget.monthly_budget)
+
+
+def active(user, today=None):
+    """This month's undismissed alerts, the highest threshold per category, most severe first."""
+    from expenses.models import BudgetAlert
+
+    month = (today or date.today()).replace(day=1)
+    latest = {}
+    for alert in BudgetAlert.objects.filter(user=user, month=month, dismissed_at__isnull=True).order_by('threshold'):
+        latest[alert.category] = alert
+    return sorted(latest.values(), key=lambda alert: (-alert.threshold, alert.created_at))
+
+
+def dismiss(user, category, today=None):
+    """Hide this month's alerts for `category` from the dashboard."""
+    from expenses.models import BudgetAlert
+
+    month = (today or date.today()).replace(day=1)
+    return BudgetAlert.objects.filter(
+        user=user, month=month, category=category, dismissed_at__isnull=True
+    ).update(dismissed_at=timezone.now())
+
+
+# ── Delivery ─────────────────────────────────────────────────────────────────
+
+def claim_next():
+    """Atomically take the oldest pending alert, or return None."""
+    from expenses.models import BudgetAlert
+
+    while True:
+        due = Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now())
+        candidate = BudgetAlert.objects.filter(due, status='pending').order_by('created_at', 'id').values_list('id', flat=True).first()
+        if candidate is None:
+            return None
+        claimed = BudgetAlert.objects.filter(pk=candidate, status='pending').update(
+            status='sending', claimed_at=timezone.now(), attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return BudgetAlert.objects.select_related('user').get(pk=candidate)
+        # Another worker won the race; try the next one
+
+
+def _message(alert):
+    label = alert.month.strftime('%B %Y')
+    if alert.threshold >= 100:
+        headline = f"You have reached your {alert.category} budget for {label}."
+    else:
+        headline = f"You have used {alert.threshold}% of your {alert.category} budget for {label}."
+    body = (
+        f"Hi {alert.user.username},\n\n{headline}\n"
+        f"Spent: ₹{alert.spent:.2f} of ₹{alert.limit:.2f}.\n"
+    )
+    return f"Budget alert: {alert.category} at {alert.threshold}%", body
+
+
+def deliver(alert):
+    """Send one claimed alert and record the outcome on its row."""
+    from expenses.models import BudgetAlert
+
+    if not alert.user.email:
+        BudgetAlert.objects.filter(pk=alert.pk).update(status='skipped', delivered_at=timezone.now())
+        return 'skipped'
+    subject, body = _message(alert)
+    try:
+        send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [alert.user.email])
+    except Exception as exc:
+        logger.exception('Budget alert %s could not be delivered', alert.pk)
+        status = 'failed' if alert.attempts >= settings.BUDGET_ALERT_MAX_ATTEMPTS else 'pending'
+        retry_at = timezone.now() + timedelta(minutes=settings.BUDGET_ALERT_RETRY_MINUTES * alert.attempts)
+        BudgetAlert.objects.filter(pk=alert.pk).update(status=status, next_attempt_at=retry_at, last_error=str(exc)[:1000])
+        return status
+    BudgetAlert.objects.filter(pk=alert.pk).update(status='sent', delivered_at=timezone.now(), last_error='')
+    return 'sent'
+
+
+def requeue_stale():
+    """Put alerts back in the queue when the worker that claimed them disappeared."""
+    from expenses.models import BudgetAlert
+
+    cutoff = timezone.now() - timedelta(minutes=settings.BUDGET_ALERT_STALE_MINUTES)
+    stale = BudgetAlert.objects.filter(status='sending', claimed_at__lt=cutoff)
+    stale.filter(attempts__gte=settings.BUDGET_ALERT_MAX_ATTEMPTS).update(status='failed', last_error='Delivery was interrupted.')
+    return stale.update(status='pending')
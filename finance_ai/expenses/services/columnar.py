@@ -0,0 +1,131 @@
+"""
+columnar.py — Typed Parquet exports of expenses and incomes for analysts.
+
+Rows come from the same keyset walk as the CSV/PDF exports and are written
+one row group at a time, so memory is bounded by PARQUET_ROW_GROUP_SIZE:
+
+  date          date32
+  amount_minor  int64    amount in paise (₹12.34 -> 1234), no float rounding
+  category /    dictionary<int8, string> over the model's fixed choices
+  source
+  username      dictionary<int32, string>
+
+pyarrow is optional (requirements-analytics.txt): without it `available()` is
+False and the views refuse Parquet exports with MISSING_PACKAGE instead of
+queuing jobs that would fail.
+"""
+from expenses.services import exports
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Rows per Parquet row group (one DB keyset walk feeds several chunks into each)
+PARQUET_ROW_GROUP_SIZE = 50_000
+PARQUET_COMPRESSION = 'zstd'
+
+DATASETS = ('expenses', 'incomes')
+
+MISSING_PACKAGE = "Parquet export requires the pyarrow package (pip install -r requirements-analytics.txt)."
+
+
+def available():
+    return pa is not None
+
+
+def _dataset_spec(dataset):
+    """(fields, label column, its fixed choices) for values_list() of a dataset."""
+    from expenses.models import Expense, Income
+
+    if dataset == 'expenses':
+        return (
+            ('id', 'date', 'user_id', 'user__username', 'category', 'amount', 'description'),
+            'category',
+            [value for value, _ in Expense.CATEGORY_CHOICES],
+        )
+    if dataset == 'incomes':
+        return (
+            ('id', 'date', 'user_id', 'user__username', 'source', 'amount', 'description'),
+            'source',
+            [value for value, _ in Income.SOURCE_CHOICES],
+        )
+    raise ValueError(f"Unknown dataset: {dataset}")
+
+
+def schema(dataset):
+    _fields, label, _choices = _dataset_spec(dataset)
+    return pa.schema([
+        ('id', pa.int64()),
+        ('date', pa.date32()),
+        ('user_id', pa.int64()),
+        ('username', pa.dictionary(pa.int32(), pa.string())),
+        (label, pa.dictionary(pa.int8(), pa.string())),
+        ('amount_minor', pa.int64()),
+        ('description', pa.string()),
+    ])
+
+
+def _label_array(values, choices):
+    # Indices into the fixed choice list keep the dictionary identical in
+    # every row group. Values outside it (legacy rows) are appended to this
+    # row group's dictionary so they are exported as-is rather than dropped.
+    positions = {choice: i for i, choice in enumerate(choices)}
+    dictionary = list(choices)
+    indices = []
+    for value in values:
+        if value not in positions:
+            if len(dictionary) > 127:
+                raise ValueError(f"Too many distinct labels for an int8 dictionary (at {value!r}).")
+            positions[value] = len(dictionary)
+            dictionary.append(value)
+        indices.append(positions[value])
+    return pa.DictionaryArray.from_arrays(
+        pa.array(indices, type=pa.int8()),
+        pa.array(dictionary, type=pa.string()),
+    )
+
+
+def _record_batch(columns, table_schema, choices):
+    ids, dates, user_ids, usernames, labels, amounts, descriptions = columns
+    return pa.RecordBatch.from_arrays([
+        pa.array(ids, type=pa.int64()),
+        pa.array(dates, type=pa.date32()),
+        pa.array(user_ids, type=pa.int64()),
+        pa.array(usernames, type=pa.string()).dictionary_encode(),
+        _label_array(labels, choices),
+        pa.array([int(amount * 100) for amount in amounts], type=pa.int64()),
+        pa.array(descriptions, type=pa.string()),
+    ], schema=table_schema)
+
+
+def write_parquet(output, qs, dataset, progress=None, total=None):
+    """
+    Write `qs` (Expense or Income rows, newest first) to `output` as Parquet.
+    Returns the number of rows written.
+    """
+    if not available():
+        raise RuntimeError(MISSING_PACKAGE)
+
+    fields, _label, choices = _dataset_spec(dataset)
+    table_schema = schema(dataset)
+    written = 0
+
+    with pq.ParquetWriter(output, table_schema, compression=PARQUET_COMPRESSION) as writer:
+        columns = [[] for _ in fields]
+        for row in exports.iter_expense_rows(qs, fields=fields):
+            for column, value in zip(columns, row):
+                column.append(value)
+            if len(columns[0]) >= PARQUET_ROW_GROUP_SIZE:
+                writer.write_batch(_record_batch(columns, table_schema, choices))
+                written += len(columns[0])
+                columns = [[] for _ in fields]
+                if progress:
+                    progress(written, total)
+        if columns[0]:
+            writer.write_batch(_record_batch(columns, table_schema, choices))
+            written += len(columns[0])
+    if progress:
+        progress(written, total)
+    return written
@@ -0,0 +1,33 @@
+"""
+counter_rows.py — Race-safe increments of derived counter rows.
+
+The derived tables (user cohorts, platform rollups, spend counters) are kept
+with `UPDATE ... SET n = n + delta`, plus an INSERT when the row does not
+exist yet. Two writers can both miss the row and both insert, and the second
+INSERT then violates the table's unique constraint. increment() makes the
+INSERT inside a savepoint and, when it loses that race, applies its delta to
+the row the other writer created. The surrounding request never sees the
+IntegrityError.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def increment(model, lookup, deltas, defaults=None):
+    """
+    Add `deltas` ({field: amount}) to the `model` row matching `lookup`,
+    creating it with `defaults` and the deltas as initial values when it is
+    missing. Returns True when this call created the row.
+    """
+    changes = {field: F(field) + amount for field, amount in deltas.items()}
+    if model.objects.filter(**lookup).update(**changes):
+        return False
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **(defaults or {}), **deltas)
+    except IntegrityError:
+        # A concurrent writer inserted the row first; the update now finds it
+        if not model.objects.filter(**lookup).update(**changes):
+            raise
+        return False
+    return True
@@ -0,0 +1,100 @@
+"""
+expense_search.py — Full-text index over Expense.description for the Django admin.
+
+On SQLite the index is an FTS5 table that uses expenses_expense as its
+external content table. Insert, update and delete triggers keep it in sync
+with the table. A search is then an index lookup. Without the index it is a
+`LIKE '%term%'` scan over every description.
+
+Migrations that rebuild expenses_expense (SQLite table remakes) drop the
+triggers. repair() runs after every `migrate` (see signals.py) and, when a
+trigger is missing, reinstalls them and reindexes; `manage.py
+rebuild_expense_search` does the same on demand. On other backends, or with EXPENSE_ADMIN_FTS off, `available()`
+is False and the admin falls back to its plain search.
+"""
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'expenses_expense_fts'
+
+_INSTALL_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"description, content='expenses_expense', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON expenses_expense BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON expenses_expense BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description ON expenses_expense BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+]
+
+_DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def install(schema_editor=None):
+    """Create the index and its triggers if missing, then reindex every description."""
+    return _install(schema_editor.connection if schema_editor else connection)
+
+
+def _install(conn):
+    if conn.vendor != 'sqlite':
+        return False
+    with conn.cursor() as cursor:
+        for statement in _INSTALL_SQL:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def missing_triggers(conn=connection):
+    """Names of the sync triggers missing while the index exists ([] without the index)."""
+    if conn.vendor != 'sqlite' or FTS_TABLE not in conn.introspection.table_names(include_views=False):
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'expenses_expense'")
+        present = {name for name, in cursor.fetchall()}
+    return [name for name in (f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au') if name not in present]
+
+
+def repair(using='default'):
+    """Reinstall the triggers and reindex when a table rebuild dropped them. Returns True if it did."""
+    conn = connections[using]
+    if not missing_triggers(conn):
+        return False
+    return _install(conn)
+
+
+def uninstall(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        for statement in _DROP_SQL:
+            cursor.execute(statement)
+
+
+def available():
+    if not settings.EXPENSE_ADMIN_FTS or connection.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in connection.introspection.table_names(include_views=False)
+
+
+def match_expression(term):
+    """
+    Quote each word of `term` as an FTS5 string with a prefix match, so user
+    input never reaches the MATCH grammar: 'coffee star' -> '"coffee"* "star"*'.
+    """
+    words = [word.replace('"', '""') for word in term.split()]
+    return ' '.join(f'"{word}"*' for word in words if word)
+
+
+def matching_ids(term):
+    """An `id__in` subquery of the expenses whose description matches every word of `term`."""
+    return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match_expression(term)])
@@ -0,0 +1,99 @@
+"""
+exports.py — Shared building blocks for expense report exports.
+
+Rows are read with a keyset walk over (date, id) — served by the
+expense_date_id_idx index — fetching fixed-size chunks of plain tuples, so
+memory stays flat no matter how many rows an export covers.
+"""
+import csv
+from datetime import datetime
+
+from django.db.models import Q
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Columns fetched for admin exports, in values_list() order
+EXPORT_FIELDS = ('id', 'date', 'user__username', 'category', 'amount', 'description')
+
+
+def parse_export_filters(data):
+    """
+    Read start_date / end_date (YYYY-MM-DD) and category from a request
+    QueryDict. Blank values mean "no filter"; malformed dates raise ValueError.
+    """
+    from expenses.models import Expense
+
+    filters = {'start_date': None, 'end_date': None, 'category': None}
+    for key in ('start_date', 'end_date'):
+        value = (data.get(key) or '').strip()
+        if value:
+            filters[key] = datetime.strptime(value, '%Y-%m-%d').date()
+
+    if filters['start_date'] and filters['end_date'] and filters['start_date'] > filters['end_date']:
+        raise ValueError("Start date must be on or before end date.")
+
+    category = (data.get('category') or '').strip()
+    if category:
+        if category not in dict(Expense.CATEGORY_CHOICES):
+            raise ValueError(f"Unknown category: {category}")
+        filters['category'] = category
+    return filters
+
+
+def filtered_expenses(filters):
+    from expenses.models import Expense
+
+    qs = Expense.objects.all()
+    if filters.get('start_date'):
+        qs = qs.filter(date__gte=filters['start_date'])
+    if filters.get('end_date'):
+        qs = qs.filter(date__lte=filters['end_date'])
+    if filters.get('category'):
+        qs = qs.filter(category=filters['category'])
+    return qs
+
+
+def describe_filters(filters):
+    """Human-readable summary of the active filters, for report headers."""
+    parts = []
+    if filters.get('start_date') or filters.get('end_date'):
+        start = filters['start_date'].strftime('%Y-%m-%d') if filters.get('start_date') else 'beginning'
+        end = filters['end_date'].strftime('%Y-%m-%d') if filters.get('end_date') else 'today'
+        parts.append(f"{start} to {end}")
+    if filters.get('category'):
+        parts.append(f"category {filters['category']}")
+    return ', '.join(parts) or 'All expenses'
+
+
+def iter_expense_rows(qs, fields=EXPORT_FIELDS, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield values_list() tuples of `fields` newest first, one keyset chunk at a
+    time. `fields` must start with 'id', 'date'.
+    """
+    last_date = last_id = None
+    while True:
+        chunk_qs = qs
+        if last_id is not None:
+            chunk_qs = chunk_qs.filter(Q(date__lt=last_date) | Q(date=last_date, id__lt=last_id))
+        chunk = list(chunk_qs.order_by('-date', '-id').values_list(*fields)[:chunk_size])
+        if not chunk:
+            return
+        yield from chunk
+        last_id, last_date = chunk[-1][0], chunk[-1][1]
+        if len(chunk) < chunk_size:
+            return
+
+
+class Echo:
+    """File-like object whose write() just returns the value, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    """Yield encoded CSV lines for a header and an iterable of rows."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
@@ -0,0 +1,234 @@
+"""
+jobs.py — Lightweight background job queue stored in the application database.
+
+Requests enqueue a BackgroundJob (an export, user import, deletion or
+deactivation) and return immediately. `manage.py run_export_worker`
+processes claim pending jobs with a conditional UPDATE (safe with several
+workers on any backend), run the matching writer from JOB_WRITERS into a
+file in private storage (never served from MEDIA_URL; see
+BackgroundJob.result_file), and report progress on the row as they go.
+Finished files expire after EXPORT_RESULT_TTL_HOURS.
+
+A claim is a lease: while a job runs, a heartbeat thread refreshes its
+heartbeat_at even when the writer is stuck in one long step (laying out a
+PDF, hashing passwords), and requeue_stale() only takes back jobs whose
+worker has been silent for EXPORT_JOB_STALE_MINUTES. A claim is identified
+by (worker, started_at); progress reports and the final status update only
+apply while the claim still holds, so a worker whose job was re-queued
+stops and discards its result instead of overwriting the new run.
+"""
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from expenses.services import report_writers, statements, user_deletion, user_import
+
+logger = logging.getLogger(__name__)
+
+# kind -> writer(output, user, params, progress); progress(done, total=None, partitions=None)
+JOB_WRITERS = {
+    'user_csv': report_writers.write_user_csv,
+    'user_pdf': report_writers.write_user_pdf,
+    'admin_csv': report_writers.write_admin_csv,
+    'admin_pdf': report_writers.write_admin_pdf,
+    'user_parquet': report_writers.write_user_parquet,
+    'admin_parquet': report_writers.write_admin_parquet,
+    'user_import': user_import.write_import_report,
+    'user_delete': user_deletion.write_deletion_report,
+    'user_deactivate': user_deletion.write_deactivation_report,
+    'user_statements': statements.write_statements_zip,
+}
+
+# Minimum seconds between progress writes to the job row
+PROGRESS_INTERVAL = 1.0
+
+# Export kinds that run_inline() may build within the request when they are small
+INLINE_KINDS = {'user_csv', 'user_pdf', 'user_parquet', 'admin_csv', 'admin_pdf', 'admin_parquet'}
+
+# Inline results are kept in memory up to this size, then spill to a temporary file
+INLINE_SPOOL_BYTES = 4 * 1024 * 1024
+
+
+class ClaimLost(Exception):
+    """The job was re-queued, and possibly claimed again, while this worker ran it."""
+
+
+def heartbeat_interval():
+    """Seconds between heartbeats: a few per stale timeout, at most one a minute."""
+    return min(60.0, settings.EXPORT_JOB_STALE_MINUTES * 60 / 4)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(user, kind, params, filename):
+    """Queue a job of `kind` for `user`; returns the pending BackgroundJob."""
+    from expenses.models import BackgroundJob
+
+    if kind not in JOB_WRITERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return BackgroundJob.objects.create(user=user, kind=kind, params=params, filename=filename)
+
+
+def run_inline(user, kind, params):
+    """
+    Build a small export (at most EXPORT_SYNC_MAX_ROWS rows) within the
+    request, with the writer the worker would use, and return the rewound
+    file. Returns None when the export is large and should be enqueued.
+    """
+    if kind not in INLINE_KINDS or not report_writers.fits_in_request(kind, user, params):
+        return None
+    output = tempfile.SpooledTemporaryFile(max_size=INLINE_SPOOL_BYTES)
+    JOB_WRITERS[kind](output, user, params, lambda done, total=None, partitions=None: None)
+    output.seek(0)
+    return output
+
+
+def claim_next(worker_id):
+    """Atomically take the oldest pending job for this worker, or return None."""
+    from expenses.models import BackgroundJob
+
+    while True:
+        candidate = BackgroundJob.objects.filter(status='pending').order_by('created_at', 'id').values_list('id', flat=True).first()
+        if candidate is None:
+            return None
+        now = timezone.now()
+        claimed = BackgroundJob.objects.filter(pk=candidate, status='pending').update(
+            status='running', worker=worker_id, started_at=now, heartbeat_at=now, progress=0, error='',
+        )
+        if claimed:
+            return BackgroundJob.objects.select_related('user').get(pk=candidate)
+        # Another worker won the race; try the next one
+
+
+def delete_upload(job):
+    """Delete the uploaded input of a job (params['source'], e.g. a user import CSV) if it is still there."""
+    from expenses.models import private_storage
+
+    if job.params.get('source'):
+        private_storage().delete(job.params['source'])
+
+
+def _claimed(job):
+    """The job's row, matched only while this worker's claim on it holds."""
+    from expenses.models import BackgroundJob
+
+    return BackgroundJob.objects.filter(pk=job.pk, status='running', worker=job.worker, started_at=job.started_at)
+
+
+class _Heartbeat(threading.Thread):
+    """Refreshes heartbeat_at of a running job until stopped, on its own connection."""
+
+    def __init__(self, job):
+        super().__init__(name=f'job-{job.pk}-heartbeat', daemon=True)
+        self.job = job
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stop_event.wait(heartbeat_interval()):
+                try:
+                    if not _claimed(self.job).update(heartbeat_at=timezone.now()):
+                        self.lost = True
+                        return
+                except DatabaseError:
+                    # E.g. SQLite busy while the job writes; the next beat retries
+                    logger.warning('Heartbeat of job %s failed', self.job.pk, exc_info=True)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _progress_reporter(job):
+    last_write = 0.0
+
+    def progress(done, total=None, partitions=None):
+        nonlocal last_write
+        now = time.monotonic()
+        # Throttled, except for the update that completes the job
+        if now - last_write < PROGRESS_INTERVAL and (total is None or done < total):
+            return
+        last_write = now
+        fields = {'progress': done, 'total': total, 'heartbeat_at': timezone.now()}
+        if partitions is not None:
+            fields['partitions'] = partitions
+        if not _claimed(job).update(**fields):
+            # Stop the writer: its work now belongs to another run
+            raise ClaimLost()
+
+    return progress
+
+
+def run_job(job):
+    """Build the job's file and mark it done, or failed with the error message."""
+    writer = JOB_WRITERS[job.kind]
+    heartbeat = _Heartbeat(job)
+    heartbeat.start()
+    try:
+        with tempfile.TemporaryFile() as output:
+            writer(output, job.user, job.params, _progress_reporter(job))
+            if heartbeat.lost:
+                raise ClaimLost()
+            output.seek(0)
+            job.result_file.save(job.filename, File(output), save=False)
+
+        now = timezone.now()
+        job.refresh_from_db(fields=['progress', 'total'])
+        finished = _claimed(job).update(
+            status='done',
+            result_file=job.result_file.name,
+            progress=job.total if job.total is not None else job.progress,
+            finished_at=now,
+            heartbeat_at=now,
+            expires_at=now + timedelta(hours=settings.EXPORT_RESULT_TTL_HOURS),
+        )
+        if not finished:
+            raise ClaimLost()
+    except ClaimLost:
+        logger.warning('Job %s was re-queued while running; discarding this run', job.pk)
+        if job.result_file:
+            job.result_file.delete(save=False)
+    except Exception as exc:
+        logger.exception('Job %s failed', job.pk)
+        if job.result_file:
+            job.result_file.delete(save=False)
+        delete_upload(job)
+        _claimed(job).update(status='failed', error=str(exc)[:1000], finished_at=timezone.now())
+    finally:
+        heartbeat.stop()
+
+
+def expire_results():
+    """Delete files (results and any leftover upload) of finished jobs past their expiry; returns how many expired."""
+    from expenses.models import BackgroundJob
+
+    expired = 0
+    for job in BackgroundJob.objects.filter(status='done', expires_at__lte=timezone.now()).iterator():
+        if job.result_file:
+            job.result_file.delete(save=False)
+        delete_upload(job)
+        BackgroundJob.objects.filter(pk=job.pk).update(status='expired', result_file='')
+        expired += 1
+    return expired
+
+
+def requeue_stale():
+    """Put running jobs back in the queue when their worker stopped its heartbeat (e.g. it was killed)."""
+    from expenses.models import BackgroundJob
+
+    cutoff = timezone.now() - timedelta(minutes=settings.EXPORT_JOB_STALE_MINUTES)
+    return BackgroundJob.objects.filter(status='running', heartbeat_at__lt=cutoff).update(status='pending', worker='')
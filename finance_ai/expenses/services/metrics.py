@@ -0,0 +1,193 @@
+"""
+metrics.py — Generic time-series metrics engine for the dashboards.
+
+series() answers "metric of source per granularity bucket" with a single
+grouped query and returns a gap-filled calendar:
+
+    series('expense', metric='sum', granularity='month',
+           user=request.user, start_date=start, end_date=end,
+           derived=('growth', 'moving_average'))
+    -> [{'period': date(2026, 1, 1), 'label': 'Jan 2026', 'value': 1250.0,
+         'growth': 12.5, 'moving_average': 1100.0}, ...]
+
+Sources, metrics and granularities are table-driven: adding an entry to
+SOURCES or GRANULARITIES is all a new dimension needs. Platform-wide sum and
+count queries on expenses/income are served from PlatformDailyRollup.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import Trunc
+
+# model: expenses.models class name; date/value: field names;
+# category: field filtered by `category`; user: owner FK (None = not per user);
+# rollup: PlatformDailyRollup kind for platform-wide sum/count, if any.
+SOURCES = {
+    'expense': {'model': 'Expense', 'date': 'date', 'value': 'amount', 'category': 'category', 'user': 'user', 'rollup': 'expense'},
+    'income': {'model': 'Income', 'date': 'date', 'value': 'amount', 'category': 'source', 'user': 'user', 'rollup': 'income'},
+    # UserCohort rows already hold user counts, so only 'sum' is meaningful there
+    'signups': {'model': 'UserCohort', 'date': 'join_date', 'value': 'users', 'category': None, 'user': None, 'rollup': None, 'metrics': ('sum',)},
+}
+
+METRICS = ('sum', 'count', 'distinct')
+
+DERIVED = ('growth', 'moving_average')
+
+
+def _add_months(d, months):
+    month_index = d.year * 12 + d.month - 1 + months
+    return d.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+
+
+# floor: first day of the bucket containing a date; next: first day of the following bucket
+GRANULARITIES = {
+    'day': {
+        'floor': lambda d: d,
+        'next': lambda d: d + timedelta(days=1),
+        'label': lambda d: d.strftime('%d %b %Y'),
+    },
+    'week': {
+        'floor': lambda d: d - timedelta(days=d.weekday()),
+        'next': lambda d: d + timedelta(days=7),
+        'label': lambda d: f"Week of {d.strftime('%d %b %Y')}",
+    },
+    'month': {
+        'floor': lambda d: d.replace(day=1),
+        'next': lambda d: _add_months(d, 1),
+        'label': lambda d: d.strftime('%b %Y'),
+    },
+    'quarter': {
+        'floor': lambda d: d.replace(month=(d.month - 1) // 3 * 3 + 1, day=1),
+        'next': lambda d: _add_months(d, 3),
+        'label': lambda d: f"Q{(d.month - 1) // 3 + 1} {d.year}",
+    },
+}
+
+
+def _as_date(value):
+    return value.date() if hasattr(value, 'date') else value
+
+
+def _base_queryset(spec, metric, user, category):
+    """(queryset, date field, aggregate) for a source, preferring the rollups when possible."""
+    from expenses import models
+
+    if spec['rollup'] and user is None and metric in ('sum', 'count'):
+        qs = models.PlatformDailyRollup.objects.filter(kind=spec['rollup'], count__gt=0)
+        if category:
+            qs = qs.filter(key=category)
+        return qs, 'date', Sum('total' if metric == 'sum' else 'count')
+
+    qs = getattr(models, spec['model']).objects.all()
+    if user is not None:
+        qs = qs.filter(**{spec['user']: user})
+    if category:
+        qs = qs.filter(**{spec['category']: category})
+
+    if metric == 'sum':
+        aggregate = Sum(spec['value'])
+    elif metric == 'count':
+        aggregate = Count('pk')
+    else:
+        aggregate = Count(spec['user'], distinct=True)
+    return qs, spec['date'], aggregate
+
+
+def _calendar(granularity, first, last):
+    step = GRANULARITIES[granularity]
+    period = step['floor'](first)
+    while period <= last:
+        yield period
+        period = step['next'](period)
+
+
+def _add_derived(points, derived, window):
+    if 'growth' in derived:
+        previous = None
+        for point in points:
+            if not previous:
+                point['growth'] = 0
+            else:
+                point['growth'] = round((point['value'] - previous) / previous * 100, 2)
+            previous = point['value']
+
+    if 'moving_average' in derived:
+        values = [point['value'] for point in points]
+        for i, point in enumerate(points):
+            recent = values[max(0, i - window + 1):i + 1]
+            point['moving_average'] = round(sum(recent) / len(recent), 2)
+
+
+def series(source='expense', metric='sum', granularity='month', user=None, category=None,
+           start_date=None, end_date=None, derived=(), window=3, fill_gaps=True):
+    """
+    One metric bucketed by granularity, with optional derived series.
+
+    Buckets without data inside [start_date, end_date] are returned with
+    value 0. When either bound is omitted the first/last bucket with data is
+    used instead. Raises ValueError for unknown sources, metrics,
+    granularities or derived series.
+    """
+    spec = SOURCES.get(source)
+    if spec is None:
+        raise ValueError(f"Unknown metrics source: {source}")
+    if metric not in spec.get('metrics', METRICS):
+        raise ValueError(f"Metric '{metric}' is not supported for {source}")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    if user is not None and spec['user'] is None:
+        raise ValueError(f"{source} cannot be filtered by user")
+    if category and spec['category'] is None:
+        raise ValueError(f"{source} cannot be filtered by category")
+    unknown = set(derived) - set(DERIVED)
+    if unknown:
+        raise ValueError(f"Unknown derived series: {', '.join(sorted(unknown))}")
+
+    start_date, end_date = _as_date(start_date), _as_date(end_date)
+    qs, date_field, aggregate = _base_queryset(spec, metric, user, category)
+    if start_date:
+        qs = qs.filter(**{f'{date_field}__gte': start_date})
+    if end_date:
+        qs = qs.filter(**{f'{date_field}__lte': end_date})
+
+    if granularity == 'day':
+        bucket = F(date_field)
+    else:
+        bucket = Trunc(date_field, granularity, output_field=DateField())
+    rows = qs.filter(**{f'{date_field}__isnull': False}).annotate(
+        period=bucket
+    ).values('period').annotate(value=aggregate).values_list('period', 'value').order_by('period')
+
+    totals = {_as_date(period): float(value or 0) for period, value in rows}
+
+    if fill_gaps and (totals or (start_date and end_date)):
+        first = start_date or min(totals)
+        last = end_date or max(totals)
+        periods = list(_calendar(granularity, first, last))
+    else:
+        periods = sorted(totals)
+
+    label = GRANULARITIES[granularity]['label']
+    points = [{'period': p, 'label': label(p), 'value': totals.get(p, 0.0)} for p in periods]
+    _add_derived(points, derived, window)
+    return points
+
+
+def combine(granularity, named_series):
+    """
+    Align several series() results on one gap-free calendar:
+    {'expense': [...], 'income': [...]} -> [{'period', 'label', 'expense', 'income'}].
+    """
+    values = {name: {p['period']: p['value'] for p in points} for name, points in named_series.items()}
+    periods = [period for points in values.values() for period in points]
+    if not periods:
+        return []
+
+    label = GRANULARITIES[granularity]['label']
+    combined = []
+    for period in _calendar(granularity, min(periods), max(periods)):
+        row = {'period': period, 'label': label(period)}
+        for name, by_period in values.items():
+            row[name] = by_period.get(period, 0.0)
+        combined.append(row)
+    return combined
@@ -0,0 +1,166 @@
+"""
+parallel_export.py — Build large admin exports as date partitions in a process pool.
+
+The filtered date range is cut into EXPORT_PARALLEL_WORKERS partitions of
+roughly equal row counts (balanced with the PlatformDailyRollup day counts,
+so planning costs no scan of the Expense table). Each partition is written
+by a separate process to its own temp file with the usual keyset walk, so
+every process stays memory-bounded. The parts are then joined newest
+first:
+
+  CSV      byte-wise concatenation (header written once)
+  Parquet  row groups copied one at a time into a single file
+
+Workers report rows done per partition through a shared dict. The parent
+folds those counts into the job's progress and per-partition list.
+"""
+import csv
+import os
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+from multiprocessing import Manager
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Sum
+
+from expenses.services import columnar, exports
+
+# How often the parent folds worker progress into the job row (seconds)
+_PROGRESS_POLL = 1.0
+# Workers publish their row count every this many rows
+_REPORT_EVERY = exports.EXPORT_CHUNK_SIZE
+
+
+def should_split(total_rows):
+    return settings.EXPORT_PARALLEL_WORKERS > 1 and total_rows >= settings.EXPORT_PARALLEL_MIN_ROWS
+
+
+def plan_partitions(filters, partitions, rollup_kind='expense'):
+    """
+    Split the filtered date range into up to `partitions` contiguous
+    (start_date, end_date) ranges, newest first, with similar row counts.
+    The outermost bounds are the filter's own (None = open-ended).
+    """
+    from expenses.models import PlatformDailyRollup
+
+    days = PlatformDailyRollup.objects.filter(kind=rollup_kind, count__gt=0)
+    if filters.get('start_date'):
+        days = days.filter(date__gte=filters['start_date'])
+    if filters.get('end_date'):
+        days = days.filter(date__lte=filters['end_date'])
+    if filters.get('category') and rollup_kind == 'expense':
+        days = days.filter(key=filters['category'])
+    per_day = list(days.values('date').annotate(rows=Sum('count')).values_list('date', 'rows').order_by('-date'))
+
+    total = sum(rows for _day, rows in per_day)
+    target = total / partitions if partitions else total
+    ranges = []
+    end = filters.get('end_date')
+    running = 0
+    for day, rows in per_day:
+        running += rows
+        if len(ranges) < partitions - 1 and running >= target * (len(ranges) + 1):
+            ranges.append((day, end))
+            end = day - timedelta(days=1)
+    ranges.append((filters.get('start_date'), end))
+    return ranges
+
+
+def _partition_queryset(dataset, filters, start_date, end_date):
+    from expenses.models import Income
+
+    if dataset == 'incomes':
+        qs = Income.objects.all()
+    else:
+        qs = exports.filtered_expenses({'category': filters.get('category')})
+    if start_date:
+        qs = qs.filter(date__gte=start_date)
+    if end_date:
+        qs = qs.filter(date__lte=end_date)
+    return qs
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+    # Never reuse a connection inherited from the parent across a fork
+    connections.close_all()
+
+
+def _build_partition(fmt, dataset, filters, index, start_date, end_date, directory, shared):
+    from expenses.services import report_writers
+
+    qs = _partition_queryset(dataset, filters, start_date, end_date)
+    path = os.path.join(directory, f'part-{index:04d}.{fmt}')
+
+    def progress(done, _total=None):
+        shared[index] = done
+
+    with open(path, 'wb') as output:
+        if fmt == 'csv':
+            writer = csv.writer(exports.Echo())
+            done = 0
+            for row in report_writers.admin_csv_rows(qs):
+                output.write(writer.writerow(row).encode('utf-8'))
+                done += 1
+                if done % _REPORT_EVERY == 0:
+                    progress(done)
+            progress(done)
+        else:
+            progress(columnar.write_parquet(output, qs, dataset, progress))
+    connections.close_all()
+    return index, path
+
+
+def _join_parts(fmt, dataset, paths, output, header):
+    if fmt == 'csv':
+        output.write(csv.writer(exports.Echo()).writerow(header).encode('utf-8'))
+        for path in paths:
+            with open(path, 'rb') as part:
+                shutil.copyfileobj(part, output)
+        return
+
+    with columnar.pq.ParquetWriter(output, columnar.schema(dataset), compression=columnar.PARQUET_COMPRESSION) as writer:
+        for path in paths:
+            part = columnar.pq.ParquetFile(path)
+            for group in range(part.num_row_groups):
+                writer.write_table(part.read_row_group(group))
+
+
+def write_partitioned(output, fmt, dataset, filters, progress, total, header=None):
+    """
+    Write an admin CSV ('csv') or Parquet ('parquet') export of `dataset`
+    using a process pool; `progress(done, total, partitions=[...])`.
+    """
+    workers = settings.EXPORT_PARALLEL_WORKERS
+    ranges = plan_partitions(filters, workers, 'income' if dataset == 'incomes' else 'expense')
+    partitions = [
+        {'start': start.isoformat() if start else None, 'end': end.isoformat() if end else None, 'rows': 0, 'done': False}
+        for start, end in ranges
+    ]
+
+    # Children open their own connections; none may be shared across the fork
+    connections.close_all()
+    with tempfile.TemporaryDirectory(prefix='export-parts-') as directory, Manager() as manager:
+        shared = manager.dict()
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), initializer=_init_worker) as pool:
+            pending = {
+                pool.submit(_build_partition, fmt, dataset, filters, index, start, end, directory, shared)
+                for index, (start, end) in enumerate(ranges)
+            }
+            paths = {}
+            while pending:
+                finished, pending = wait(pending, timeout=_PROGRESS_POLL, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index, path = future.result()
+                    paths[index] = path
+                    partitions[index]['done'] = True
+                for index, rows in shared.items():
+                    partitions[index]['rows'] = rows
+                progress(sum(p['rows'] for p in partitions), total, partitions=partitions)
+
+        _join_parts(fmt, dataset, [paths[i] for i in range(len(ranges))], output, header)
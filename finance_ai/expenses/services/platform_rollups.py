@@ -0,0 +1,194 @@
+"""
+platform_rollups.py — Incrementally maintained platform-wide daily rollups.
+
+One PlatformDailyRollup row per (kind, date, key) where kind is "expense"
+(key = category) or "income" (key = source). Expense/Income signals apply
+deltas on every write; rebuild() recomputes any date range from the source
+tables for writes that bypass signals.
+
+Expense.save() and Income.save() run in one transaction together with their
+signal receivers, so a write and all of its derived-table updates (these
+rollups, user totals, spend counters, budget alerts) share a single commit.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from expenses.services import counter_rows
+
+KIND_FIELDS = {
+    'expense': 'category',
+    'income': 'source',
+}
+
+
+def _source_model(kind):
+    from expenses.models import Expense, Income
+    return Expense if kind == 'expense' else Income
+
+
+def kind_of(instance):
+    from expenses.models import Expense
+    return 'expense' if isinstance(instance, Expense) else 'income'
+
+
+def snapshot(instance):
+    """The fields of an Expense/Income that the rollups depend on."""
+    kind = kind_of(instance)
+    return {
+        'kind': kind,
+        'date': instance.date,
+        'key': getattr(instance, KIND_FIELDS[kind]),
+        'amount': instance.amount,
+        'user_id': instance.user_id,
+    }
+
+
+def _user_has_other_rows(state, exclude_pk):
+    model = _source_model(state['kind'])
+    return model.objects.filter(
+        user_id=state['user_id'], date=state['date'], **{KIND_FIELDS[state['kind']]: state['key']}
+    ).exclude(pk=exclude_pk).exists()
+
+
+def _apply(state, sign, pk):
+    from expenses.models import PlatformDailyRollup
+
+    users_delta = 0 if _user_has_other_rows(state, pk) else sign
+    amount = Decimal(str(state['amount'])) * sign
+    counter_rows.increment(
+        PlatformDailyRollup, {'kind': state['kind'], 'date': state['date'], 'key': state['key']},
+        {'total': amount, 'count': sign, 'users': users_delta},
+    )
+
+
+def record_change(old_state, instance):
+    """Apply a create (old_state=None) or update of an Expense/Income."""
+    from expenses.models import PlatformDailyRollup
+
+    new_state = snapshot(instance)
+    if old_state == new_state:
+        return
+    with transaction.atomic():
+        if old_state is not None and {**old_state, 'amount': None} == {**new_state, 'amount': None}:
+            # Same user, day and key: only the total moves, and the row already exists
+            difference = Decimal(str(new_state['amount'])) - Decimal(str(old_state['amount']))
+            PlatformDailyRollup.objects.filter(
+                kind=new_state['kind'], date=new_state['date'], key=new_state['key']
+            ).update(total=F('total') + difference)
+            return
+        if old_state is not None:
+            _apply(old_state, -1, instance.pk)
+        _apply(new_state, 1, instance.pk)
+
+
+def record_delete(instance):
+    """Apply the removal of an already-deleted Expense/Income."""
+    with transaction.atomic():
+        _apply(snapshot(instance), -1, instance.pk)
+
+
+def apply_deltas(kind, deltas):
+    """
+    Apply {(date, key): (amount, count, users)} deltas in one go, for bulk
+    writes that bypass the per-row signals. Call inside the transaction
+    that makes the matching change to the source table.
+    """
+    from expenses.models import PlatformDailyRollup
+
+    for (day, key), (amount, count, users) in deltas.items():
+        counter_rows.increment(
+            PlatformDailyRollup, {'kind': kind, 'date': day, 'key': key},
+            {'total': amount, 'count': count, 'users': users},
+        )
+
+def apply_moves(kind, moves):
+    """
+    Apply rows that changed key without signals (e.g. bulk_update), given as
+    (user_id, date, old_key, new_key, amount). Call inside the transaction
+    of the update, after it: the users' current row counts per (date, key)
+    are read back so the distinct-user counts move exactly.
+    """
+    field = KIND_FIELDS[kind]
+    moved = {}  # (user_id, date, key) -> net rows added
+    deltas = {}
+    for user_id, day, old_key, new_key, amount in moves:
+        for key, sign in ((old_key, -1), (new_key, 1)):
+            moved[(user_id, day, key)] = moved.get((user_id, day, key), 0) + sign
+            total, count = deltas.get((day, key), (Decimal('0'), 0))
+            deltas[(day, key)] = (total + sign * Decimal(str(amount)), count + sign)
+    if not moved:
+        return
+
+    rows_now = {
+        (row['user_id'], row['date'], row[field]): row['n']
+        for row in _source_model(kind).objects.filter(
+            user_id__in={user_id for user_id, _day, _key in moved},
+            date__in={day for _user_id, day, _key in moved},
+        ).values('user_id', 'date', field).annotate(n=Count('id')).order_by()
+    }
+    users = {}
+    for (user_id, day, key), added in moved.items():
+        after = rows_now.get((user_id, day, key), 0)
+        users[(day, key)] = users.get((day, key), 0) + (after > 0) - (after - added > 0)
+    apply_deltas(kind, {
+        (day, key): (total, count, users[(day, key)]) for (day, key), (total, count) in deltas.items()
+    })
+
+
+def rebuild(start_date=None, end_date=None):
+    """
+    Recompute rollups for [start_date, end_date] (whole history when omitted)
+    with one grouped query per kind.
+    """
+    from expenses.models import PlatformDailyRollup
+
+    rows = []
+    for kind, field in KIND_FIELDS.items():
+        qs = _source_model(kind).objects.all()
+        if start_date:
+            qs = qs.filter(date__gte=start_date)
+        if end_date:
+            qs = qs.filter(date__lte=end_date)
+        grouped = qs.values('date', field).annotate(
+            total=Sum('amount'), count=Count('id'), users=Count('user', distinct=True)
+        ).order_by()
+        rows.extend(
+            PlatformDailyRollup(kind=kind, date=g['date'], key=g[field],
+                                total=g['total'], count=g['count'], users=g['users'])
+            for g in grouped
+        )
+
+    existing = PlatformDailyRollup.objects.all()
+    if start_date:
+        existing = existing.filter(date__gte=start_date)
+    if end_date:
+        existing = existing.filter(date__lte=end_date)
+
+    with transaction.atomic():
+        existing.delete()
+        PlatformDailyRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+# ── Read helpers ──────────────────────────────────────────────────────────────
+
+def rollups(kind, start_date=None):
+    from expenses.models import PlatformDailyRollup
+
+    # Rows emptied by deletes are kept (count 0) and simply skipped here
+    qs = PlatformDailyRollup.objects.filter(kind=kind, count__gt=0)
+    if start_date:
+        qs = qs.filter(date__gte=start_date)
+    return qs
+
+
+def totals_by_key(kind, start_date=None):
+    """[{'key': str, 'total': Decimal, 'count': int}] ordered by total descending."""
+    return list(
+        rollups(kind, start_date)
+        .values('key')
+        .annotate(total=Sum('total'), count=Sum('count'))
+        .order_by('-total')
+    )
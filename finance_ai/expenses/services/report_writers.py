@@ -0,0 +1,349 @@
+"""
+report_writers.py — CSV/PDF expense report writers used by the export jobs.
+
+Each writer takes a binary file object, the requesting user, the job params
+and a progress(done, total=None) callback, and streams rows from the keyset
+iterator in exports.py so memory stays flat regardless of report size.
+"""
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+from expenses.services import columnar, exports, parallel_export
+
+# Rows per table chunk, roughly one letter page with the admin styling below
+PDF_ROWS_PER_TABLE = 20
+
+ADMIN_PDF_TABLE_STYLE = TableStyle([
+    # Header row styling
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('TOPPADDING', (0, 0), (-1, 0), 12),
+
+    # Data rows styling
+    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#ecf0f1')),
+    ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
+    ('ALIGN', (2, 1), (2, -1), 'RIGHT'),  # Amount column right-aligned
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('TOPPADDING', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+
+    # Grid
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('LINEBELOW', (0, 0), (-1, 0), 2, colors.black),
+])
+
+USER_PDF_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+]
+
+# Appended to the last user table, which ends with the SQL-computed total row
+USER_PDF_TOTAL_STYLE = [
+    ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+]
+
+
+def _parse_date(value):
+    return date.fromisoformat(value) if value else None
+
+
+def admin_filters(params):
+    return {
+        'start_date': _parse_date(params.get('start_date')),
+        'end_date': _parse_date(params.get('end_date')),
+        'category': params.get('category') or None,
+    }
+
+
+def _user_expenses(user, params):
+    from expenses.models import Expense
+
+    return Expense.objects.filter(
+        user=user,
+        date__gte=_parse_date(params['start_date']),
+        date__lte=_parse_date(params['end_date']),
+    )
+
+
+def _columnar_queryset(params, user=None):
+    """Expense or Income rows for params['dataset'], date-filtered (category applies to expenses only)."""
+    from expenses.models import Income
+
+    filters = admin_filters(params)
+    if params.get('dataset', 'expenses') == 'expenses':
+        qs = exports.filtered_expenses(filters)
+    else:
+        qs = Income.objects.all()
+        if filters['start_date']:
+            qs = qs.filter(date__gte=filters['start_date'])
+        if filters['end_date']:
+            qs = qs.filter(date__lte=filters['end_date'])
+    if user is not None:
+        qs = qs.filter(user=user)
+    return qs
+
+
+def _export_queryset(kind, user, params):
+    """The rows an export of `kind` writes, one per output row."""
+    if kind in ('user_csv', 'user_pdf'):
+        return _user_expenses(user, params)
+    if kind == 'user_parquet':
+        return _columnar_queryset(params, user=user)
+    if kind in ('admin_csv', 'admin_pdf'):
+        return exports.filtered_expenses(admin_filters(params))
+    return _columnar_queryset(params)
+
+
+def fits_in_request(kind, user, params):
+    """True when the export has at most EXPORT_SYNC_MAX_ROWS rows; counts no further than one past the limit."""
+    limit = settings.EXPORT_SYNC_MAX_ROWS
+    return _export_queryset(kind, user, params).order_by()[:limit + 1].count() <= limit
+
+
+class StreamingDocTemplate(SimpleDocTemplate):
+    """
+    SimpleDocTemplate that lays out flowables pulled from an iterator.
+
+    build_streamed() starts a normal build() with the head flowables, and
+    handle_flowable() tops that story up from the iterator before each
+    flowable is placed, so only a few page-sized tables exist at a time.
+    """
+
+    def __init__(self, *args, low_water=2, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._low_water = low_water
+        self._story = self._pending = None
+
+    def _top_up(self):
+        while self._pending is not None and len(self._story) < self._low_water:
+            try:
+                self._story.append(next(self._pending))
+            except StopIteration:
+                self._pending = None
+
+    def handle_flowable(self, flowables):
+        # Also called for the template's own page-begin actions; only the story is fed
+        if flowables is self._story:
+            self._top_up()
+        super().handle_flowable(flowables)
+
+    def build_streamed(self, head, flowables):
+        """build() `head` followed by every flowable from the `flowables` iterator."""
+        self._story, self._pending = list(head), iter(flowables)
+        self._top_up()
+        try:
+            self.build(self._story)
+        finally:
+            self._story = self._pending = None
+
+
+def _chunked_tables(rows, header, col_widths, style, total_row=None, total_style=None):
+    """Yield page-sized Tables (header repeated); total_row is appended to the last one."""
+    data = [header]
+    for row in rows:
+        data.append(row)
+        if len(data) > PDF_ROWS_PER_TABLE:
+            yield Table(data, colWidths=col_widths, repeatRows=1, style=style)
+            data = [header]
+    if total_row is not None:
+        data.append(total_row)
+        yield Table(data, colWidths=col_widths, repeatRows=1, style=list(style) + list(total_style or []))
+    elif len(data) > 1:
+        yield Table(data, colWidths=col_widths, repeatRows=1, style=style)
+
+
+def _counted(rows, progress, total):
+    done = 0
+    for row in rows:
+        done += 1
+        progress(done, total)
+        yield row
+
+
+# ── Admin reports ─────────────────────────────────────────────────────────────
+
+ADMIN_CSV_HEADER = ['Date', 'Username', 'Category', 'Amount (INR)', 'Description']
+
+
+def admin_csv_rows(expenses):
+    return (
+        (expense_date.strftime('%Y-%m-%d'), username, category, f"₹{amount:.2f}", description)
+        for _id, expense_date, username, category, amount, description in exports.iter_expense_rows(expenses)
+    )
+
+
+def write_admin_csv(output, user, params, progress):
+    """
+    All users' expenses: Date, Username, Category, Amount, Description.
+    Large exports are split into date partitions built in parallel
+    (services/parallel_export.py); the file is the same either way.
+    """
+    filters = admin_filters(params)
+    expenses = exports.filtered_expenses(filters)
+    total = expenses.count()
+    if parallel_export.should_split(total):
+        parallel_export.write_partitioned(output, 'csv', 'expenses', filters, progress, total, ADMIN_CSV_HEADER)
+        return
+    for line in exports.stream_csv(ADMIN_CSV_HEADER, _counted(admin_csv_rows(expenses), progress, total)):
+        output.write(line.encode('utf-8'))
+
+
+def write_admin_pdf(output, user, params, progress):
+    """
+    All users' expenses as a PDF with SQL-computed totals.
+
+    Rows are laid out as page-sized tables created on demand
+    (StreamingDocTemplate). Measured for 100k rows (SQLite, 5000 pages,
+    7.9 MB PDF): ~55 s build, ~70 MB peak RSS above the idle worker, mostly
+    ReportLab's finished-page objects held until save.
+    """
+    filters = admin_filters(params)
+    expenses = exports.filtered_expenses(filters)
+    summary = expenses.aggregate(count=Count('id'), total=Sum('amount'))
+
+    doc = StreamingDocTemplate(output, pagesize=letter)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # ==========================================
+    # TITLE
+    # ==========================================
+    title = Paragraph("<b>Expense Report - All Users</b>", styles['Title'])
+    elements.append(title)
+    elements.append(Spacer(1, 0.3 * inch))
+
+    # ==========================================
+    # REPORT METADATA
+    # ==========================================
+    report_info = f"<b>Generated:</b> {datetime.now().strftime('%B %d, %Y at %I:%M %p')}<br/>"
+    report_info += f"<b>Filters:</b> {exports.describe_filters(filters)}<br/>"
+    report_info += f"<b>Total Expenses:</b> {summary['count']}<br/>"
+    report_info += f"<b>Total Amount:</b> ₹{summary['total'] or 0:.2f}"
+    info_paragraph = Paragraph(report_info, styles['Normal'])
+    elements.append(info_paragraph)
+    elements.append(Spacer(1, 0.4 * inch))
+
+    # ==========================================
+    # TABLE: User | Category | Amount | Date
+    # ==========================================
+    rows = (
+        [username, category, f"₹{amount:.2f}", expense_date.strftime('%Y-%m-%d')]
+        for _id, expense_date, username, category, amount
+        in exports.iter_expense_rows(expenses, fields=('id', 'date', 'user__username', 'category', 'amount'))
+    )
+    tables = _chunked_tables(
+        _counted(rows, progress, summary['count']),
+        ['User', 'Category', 'Amount', 'Date'],
+        [1.5*inch, 1.5*inch, 1.2*inch, 1.5*inch],
+        ADMIN_PDF_TABLE_STYLE,
+    )
+    doc.build_streamed(elements, tables)
+
+
+def write_admin_parquet(output, user, params, progress):
+    """All users' expenses or incomes as typed Parquet (see services/columnar.py)."""
+    dataset = params.get('dataset', 'expenses')
+    qs = _columnar_queryset(params)
+    total = qs.count()
+    if parallel_export.should_split(total):
+        filters = admin_filters(params) if dataset == 'expenses' else {**admin_filters(params), 'category': None}
+        parallel_export.write_partitioned(output, 'parquet', dataset, filters, progress, total)
+        return
+    columnar.write_parquet(output, qs, dataset, progress, total)
+
+
+# ── Per-user reports ──────────────────────────────────────────────────────────
+
+USER_CSV_HEADER = ['Date', 'Category', 'Amount', 'Description']
+
+
+def user_csv_row(expense_date, category, amount, description):
+    return (expense_date.strftime('%Y-%m-%d'), category, f"{amount:.2f}", description)
+
+
+def write_user_csv(output, user, params, progress):
+    """One user's expenses for a period: Date, Category, Amount, Description."""
+    expenses = _user_expenses(user, params)
+    total = expenses.count()
+    rows = (
+        user_csv_row(*row[1:])
+        for row in exports.iter_expense_rows(expenses, fields=('id', 'date', 'category', 'amount', 'description'))
+    )
+    for line in exports.stream_csv(USER_CSV_HEADER, _counted(rows, progress, total)):
+        output.write(line.encode('utf-8'))
+
+
+def build_user_pdf(output, username, period_label, rows, total):
+    """
+    Lay out one user's statement PDF from (date, category, amount,
+    description) rows; `total` is printed in the final row.
+    """
+    doc = StreamingDocTemplate(output, pagesize=letter)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    title = Paragraph(f"Expense Report - {username}", styles['Title'])
+    elements.append(title)
+
+    filter_context = Paragraph(f"Period: {period_label}", styles['Normal'])
+    elements.append(filter_context)
+
+    date_p = Paragraph(f"Report Generated: {date.today().strftime('%Y-%m-%d')}", styles['Normal'])
+    elements.append(date_p)
+    elements.append(Spacer(1, 12))
+
+    table_rows = (
+        [
+            expense_date.strftime('%Y-%m-%d'),
+            category,
+            f"{amount:.2f}",
+            description[:50] + ('...' if len(description) > 50 else ''),
+        ]
+        for expense_date, category, amount, description in rows
+    )
+    tables = _chunked_tables(
+        table_rows,
+        ['Date', 'Category', 'Amount (Rs)', 'Description'],
+        [80, 100, 80, 240],
+        USER_PDF_TABLE_STYLE,
+        total_row=['', 'Total:', f"{total or 0:.2f}", ''],
+        total_style=USER_PDF_TOTAL_STYLE,
+    )
+    doc.build_streamed(elements, tables)
+
+
+def write_user_pdf(output, user, params, progress):
+    """One user's expenses for a period as a PDF, with the total computed in SQL."""
+    expenses = _user_expenses(user, params)
+    summary = expenses.aggregate(count=Count('id'), total=Sum('amount'))
+    rows = (
+        row[1:] for row in
+        exports.iter_expense_rows(expenses, fields=('id', 'date', 'category', 'amount', 'description'))
+    )
+    build_user_pdf(output, user.username, params.get('label', ''), _counted(rows, progress, summary['count']),
+                   summary['total'])
+
+
+def write_user_parquet(output, user, params, progress):
+    """One user's expenses or incomes for a period as typed Parquet."""
+    qs = _columnar_queryset(params, user=user)
+    columnar.write_parquet(output, qs, params.get('dataset', 'expenses'), progress, qs.count())
@@ -8,6 +8,8 @@ from decimal import Decimal
 from datetime import date, timedelta
 from django.db.models import Sum
 
+from expenses.services import spend_counters
+
 
 def analyze(user, budgets, today=None):
     """
@@ -21,34 +23,17 @@ def analyze(user, budgets, today=None):
     if today is None:
         today = date.today()
 
-    from expenses.models import Expense, Income, SavingGoal
+    from expenses.models import Income, SavingGoal
 
     suggestions = []
     alerts = []
     tips = []
 
-    # ── Fetch current month data ──────────────────────────────────────────────
-    month_expenses = Expense.objects.filter(
-        user=user,
-        date__year=today.year,
-        date__month=today.month,
-    )
-    current_by_cat = {}
-    for exp in month_expenses:
-        current_by_cat[exp.category] = current_by_cat.get(exp.category, Decimal('0')) + exp.amount
-
-    # ── Fetch previous month data for trend analysis ──────────────────────────
+    # ── Fetch current and previous month spend per category ───────────────────
     first_of_month = today.replace(day=1)
-    prev_month_end = first_of_month - timedelta(days=1)
-    prev_month_start = prev_month_end.replace(day=1)
-    prev_expenses = Expense.objects.filter(
-        user=user,
-        date__gte=prev_month_start,
-        date__lte=prev_month_end,
-    )
-    prev_by_cat = {}
-    for exp in prev_expenses:
-        prev_by_cat[exp.category] = prev_by_cat.get(exp.category, Decimal('0')) + exp.amount
+    prev_month_start = (first_of_month - timedelta(days=1)).replace(day=1)
+    current_by_cat = spend_counters.month_totals(user, first_of_month)
+    prev_by_cat = spend_counters.month_totals(user, prev_month_start)
 
     # ── Fetch income ──────────────────────────────────────────────────────────
     monthly_income = Income.objects.filter(
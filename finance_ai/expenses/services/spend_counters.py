@@ -0,0 +1,149 @@
+"""
+spend_counters.py — Per-user spend per month and category, maintained on write.
+
+One MonthlyCategorySpend row per (user, month, category). Expense signals
+apply deltas on every write, so budget utilisation for every category of
+a month is a single read on the (user, month, category) unique index
+instead of an aggregate over the Expense table per budget. Increases of
+the running month are also checked for budget thresholds crossed
+(services/budget_alerts.py). rebuild() recomputes the counters for
+writes that bypass signals.
+
+"Running month" is date.today(), as on the dashboard, so a write alerts for
+exactly the month whose budgets the user is looking at. A counter that a
+write has to create while the month already has other expenses (rows that
+predate the counters and were never counted) is recomputed from the Expense
+table instead of alerting from a zero baseline.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from expenses.services import budget_alerts, counter_rows
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def _restore_baseline(lookup, count):
+    """
+    Recompute a counter just created by a write of `count` expenses when the
+    month already holds more expenses than that. Returns True when it did:
+    the spend before the write is then unknown, so no alert may be raised.
+    """
+    from expenses.models import Expense, MonthlyCategorySpend
+
+    month = lookup['month']
+    actual = Expense.objects.filter(
+        user_id=lookup['user_id'], category=lookup['category'],
+        date__gte=month, date__lt=month_of(month + timedelta(days=31)),
+    ).aggregate(total=Sum('amount'), count=Count('id'))
+    if actual['count'] <= count:
+        return False
+    MonthlyCategorySpend.objects.filter(**lookup).update(total=actual['total'], count=actual['count'])
+    return True
+
+
+def _apply(user_id, month, category, amount, count):
+    from expenses.models import Budget, MonthlyCategorySpend
+
+    lookup = {'user_id': user_id, 'month': month, 'category': category}
+    counter = MonthlyCategorySpend.objects.filter(**lookup)
+    with transaction.atomic():
+        created = False
+        if count > 0:
+            created = counter_rows.increment(MonthlyCategorySpend, lookup, {'total': amount, 'count': count})
+        else:
+            # A removal without a counter means the user's counters were already
+            # cascaded away (user.delete()); recreating one would orphan it
+            counter.update(total=F('total') + amount, count=F('count') + count)
+        if amount <= 0 or month != date.today().replace(day=1):
+            return
+        if created and _restore_baseline(lookup, count):
+            return
+        limit = Budget.objects.filter(user_id=user_id, category=category).values_list('monthly_budget', flat=True).first()
+        if limit is None:
+            return
+        # Lock the counter so no other write moves it between this write and the read
+        new_total = counter.select_for_update().values_list('total', flat=True).first()
+        if new_total is not None:
+            budget_alerts.record_crossings(user_id, month, category, new_total - amount, new_total, limit)
+
+
+def _key(state):
+    return state['user_id'], month_of(state['date']), state['key']
+
+
+def record_change(old_state, instance):
+    """Apply a create (old_state=None) or update of an Expense, using platform_rollups snapshots."""
+    new_key = (instance.user_id, month_of(instance.date), instance.category)
+    amount = Decimal(str(instance.amount))
+    with transaction.atomic():
+        if old_state is not None:
+            old_amount = Decimal(str(old_state['amount']))
+            if _key(old_state) == new_key:
+                # Only the amount moved: the counter's current total is the baseline
+                if old_amount != amount:
+                    _apply(*new_key, amount - old_amount, 0)
+                return
+            _apply(*_key(old_state), -old_amount, -1)
+        _apply(*new_key, amount, 1)
+
+
+def record_delete(instance):
+    """Apply the removal of an already-deleted Expense."""
+    with transaction.atomic():
+        _apply(instance.user_id, month_of(instance.date), instance.category, -Decimal(str(instance.amount)), -1)
+
+
+def apply_deltas(deltas):
+    """
+    Apply {(user_id, month, category): (amount, count)} deltas, for bulk
+    writes that bypass the per-row signals. Call inside the transaction
+    that makes the matching change to the Expense table. Increases are
+    checked for budget thresholds exactly as in record_change().
+    """
+    for (user_id, month, category), (amount, count) in deltas.items():
+        if amount or count:
+            _apply(user_id, month, category, amount, count)
+
+
+def month_totals(user, month):
+    """{category: total} of the user's expenses in the month containing `month`."""
+    from expenses.models import MonthlyCategorySpend
+
+    return dict(
+        MonthlyCategorySpend.objects.filter(user=user, month=month_of(month), count__gt=0)
+        .values_list('category', 'total')
+    )
+
+
+def rebuild(user_ids=None):
+    """Recompute the counters of the given users (all users when omitted) with one grouped query."""
+    from expenses.models import Expense, MonthlyCategorySpend
+
+    expenses = Expense.objects.all()
+    counters = MonthlyCategorySpend.objects.all()
+    if user_ids is not None:
+        expenses = expenses.filter(user_id__in=user_ids)
+        counters = counters.filter(user_id__in=user_ids)
+
+    rows = (
+        expenses.annotate(month=TruncMonth('date'))
+        .values('user_id', 'month', 'category')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    counters_new = [
+        MonthlyCategorySpend(user_id=row['user_id'], month=row['month'], category=row['category'],
+                             total=row['total'], count=row['count'])
+        for row in rows.iterator()
+    ]
+    with transaction.atomic():
+        counters.delete()
+        MonthlyCategorySpend.objects.bulk_create(counters_new, batch_size=1000)
+    return len(counters_new)
@@ -0,0 +1,104 @@
+"""
+stale_cache.py — Stale-while-revalidate cache with request coalescing.
+
+Entries are stored together with the time they were computed. Within the
+soft TTL they are served as-is. Past it, the stale payload is still served
+while exactly one caller, holding a cache lock taken with cache.add(),
+recomputes the value in a background thread. Callers that find no entry at
+all wait for the lock holder instead of all recomputing at once.
+
+The lock is only as shared as the cache backend: with the default LocMemCache
+it coalesces per process, with Redis/Memcached across all workers.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# How often a caller without any entry re-checks the cache while another computes it
+_POLL_INTERVAL = 0.05
+
+
+def _lock_key(key):
+    return f"{key}:refresh_lock"
+
+
+def _compute_and_store(key, compute, hard_ttl):
+    started = time.perf_counter()
+    data = compute()
+    entry = {
+        'data': data,
+        'computed_at': time.time(),
+        'compute_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    cache.set(key, entry, hard_ttl)
+    return entry
+
+
+def _refresh_in_background(key, compute, hard_ttl):
+    def run():
+        try:
+            _compute_and_store(key, compute, hard_ttl)
+        except Exception as exc:
+            logger.error('Background refresh of %s failed: %s', key, exc)
+        finally:
+            cache.delete(_lock_key(key))
+            close_old_connections()
+
+    threading.Thread(target=run, name=f'swr-refresh-{key}', daemon=True).start()
+
+
+def _meta(entry, status):
+    return {
+        'cache': status,
+        'computed_at': datetime.fromtimestamp(entry['computed_at'], tz=timezone.utc).isoformat(),
+        'age_seconds': round(time.time() - entry['computed_at'], 1),
+        'compute_ms': entry['compute_ms'],
+    }
+
+
+def get_or_refresh(key, compute, soft_ttl=300, hard_ttl=3600, lock_ttl=60):
+    """
+    Return (data, meta) for `key`, computing it with `compute()` when needed.
+
+    meta['cache'] is one of:
+      fresh     — entry younger than soft_ttl
+      stale     — entry past soft_ttl, served while a refresh runs
+      miss      — no entry; this caller computed it
+      coalesced — no entry; another caller computed it while this one waited
+    """
+    entry = cache.get(key)
+    if entry is not None and time.time() - entry['computed_at'] < soft_ttl:
+        return entry['data'], _meta(entry, 'fresh')
+
+    lock_key = _lock_key(key)
+    if entry is not None:
+        # Only the caller that wins the lock schedules a refresh; everyone gets the stale copy
+        if cache.add(lock_key, True, lock_ttl):
+            _refresh_in_background(key, compute, hard_ttl)
+        return entry['data'], _meta(entry, 'stale')
+
+    if not cache.add(lock_key, True, lock_ttl):
+        deadline = time.monotonic() + lock_ttl
+        while time.monotonic() < deadline:
+            time.sleep(_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['data'], _meta(entry, 'coalesced')
+            if cache.add(lock_key, True, lock_ttl):
+                break
+        else:
+            # The lock holder never finished; compute without it rather than fail
+            entry = _compute_and_store(key, compute, hard_ttl)
+            return entry['data'], _meta(entry, 'miss')
+
+    try:
+        entry = _compute_and_store(key, compute, hard_ttl)
+    finally:
+        cache.delete(lock_key)
+    return entry['data'], _meta(entry, 'miss')
@@ -0,0 +1,147 @@
+"""
+statements.py — Month-end statements for many users as one streamed zip.
+
+stream_statements_zip() reads every selected user's expenses for the period
+in a single query ordered by user, splits the stream per user with
+itertools.groupby, joins the groups to the users on user_id and writes one
+CSV (and optionally one PDF) per user into a zip archive. The archive is written to a ZipStream sink that hands each
+compressed chunk straight to the HTTP response. CSV rows are never held in
+memory; with PDFs included, one user's rows are kept while their two files
+are written.
+
+Statements for every regular user are too many for one request; they run
+as a 'user_statements' background job (write_statements_zip) that writes
+the same stream to the job's result file.
+"""
+import io
+import zipfile
+from datetime import date
+from decimal import Decimal
+from itertools import groupby
+
+from django.contrib.auth.models import User
+
+from expenses.services import exports, report_writers
+
+# Rows fetched per round trip from the single statement query
+STATEMENT_FETCH_SIZE = 2000
+
+
+class ZipStream(io.RawIOBase):
+    """
+    Write-only, unseekable sink for zipfile.ZipFile. zipfile falls back to
+    data descriptors when it cannot seek, so entries can be emitted as soon
+    as they are written; drain() returns what has accumulated so far.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        # zipfile records entry offsets with tell(); seeking stays unsupported
+        return self._offset
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def statement_rows(users, start_date, end_date):
+    """(user_id, date, category, amount, description) for all `users`, grouped by user, newest first."""
+    from expenses.models import Expense
+
+    return (
+        Expense.objects.filter(user__in=users.values('id'), date__gte=start_date, date__lte=end_date)
+        .order_by('user_id', '-date', '-id')
+        .values_list('user_id', 'date', 'category', 'amount', 'description')
+        .iterator(chunk_size=STATEMENT_FETCH_SIZE)
+    )
+
+
+def _write_csv_entry(archive, name, rows):
+    with archive.open(name, 'w') as entry:
+        for line in exports.stream_csv(report_writers.USER_CSV_HEADER,
+                                       (report_writers.user_csv_row(*row) for row in rows)):
+            entry.write(line.encode('utf-8'))
+
+
+def statements_by_user(users, start_date, end_date):
+    """
+    Yield (user_id, username, rows) for each of `users` in id order, where
+    rows are that user's statement rows (empty when they have none). The
+    grouped statement query is merge-joined to the users on user_id, so a
+    group is only ever paired with the user whose id it carries.
+    """
+    groups = groupby(statement_rows(users, start_date, end_date), key=lambda row: row[0])
+    group_id, group_rows = next(groups, (None, None))
+    for user_id, username in users.order_by('id').values_list('id', 'username').iterator():
+        while group_id is not None and group_id < user_id:
+            group_id, group_rows = next(groups, (None, None))
+        if group_id == user_id:
+            yield user_id, username, (row[1:] for row in group_rows)
+        else:
+            yield user_id, username, iter(())
+
+
+def stream_statements_zip(users, start_date, end_date, period_label, include_pdf=False, progress=None):
+    """
+    Yield the bytes of a zip holding `<username>_<yyyy-mm>.csv` (and `.pdf`)
+    for each user in the `users` queryset, covering [start_date, end_date].
+    Users without expenses get an empty statement. `progress(users_done)`
+    is called after each user.
+    """
+    sink = ZipStream()
+    suffix = start_date.strftime('%Y-%m')
+
+    done = 0
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for _user_id, username, rows in statements_by_user(users, start_date, end_date):
+            if include_pdf:
+                # The PDF needs the rows a second time; only this user's are held
+                rows = list(rows)
+
+            _write_csv_entry(archive, f"{username}_{suffix}.csv", rows)
+            yield sink.drain()
+
+            if include_pdf:
+                total = sum((amount for _date, _category, amount, _description in rows), Decimal('0'))
+                with archive.open(f"{username}_{suffix}.pdf", 'w') as entry:
+                    report_writers.build_user_pdf(entry, username, period_label, rows, total)
+                yield sink.drain()
+            done += 1
+            if progress:
+                progress(done)
+    yield sink.drain()
+
+
+def queue_all_statements(requested_by, start_date, end_date, period_label, include_pdf, filename):
+    """Queue the statements zip of every regular user; returns the BackgroundJob."""
+    from expenses.services import jobs
+
+    return jobs.enqueue(requested_by, 'user_statements', {
+        'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
+        'label': period_label, 'include_pdf': include_pdf,
+    }, filename)
+
+
+def write_statements_zip(output, user, params, progress):
+    """Job writer for kind 'user_statements': every regular user's statements for the period, as a zip."""
+    users = User.objects.filter(is_staff=False)
+    total = users.count()
+    chunks = stream_statements_zip(
+        users, date.fromisoformat(params['start_date']), date.fromisoformat(params['end_date']),
+        params['label'], include_pdf=params['include_pdf'], progress=lambda done: progress(done, total),
+    )
+    for chunk in chunks:
+        output.write(chunk)
+    progress(total, total)
@@ -0,0 +1,74 @@
+"""
+user_cohorts.py — Incrementally maintained signup/activity cohort counts.
+
+Each User contributes 1 to the UserCohort row for its (join date, last-login
+month). Signals move that unit whenever date_joined / last_login change, so
+retention analytics read a table whose size depends on the number of days
+and months, never on the number of users.
+"""
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from expenses.services import counter_rows
+
+
+def cohort_key(user):
+    """(join_date, active_month) for a User instance."""
+    join_date = timezone.localtime(user.date_joined).date() if timezone.is_aware(user.date_joined) else user.date_joined.date()
+    active_month = None
+    if user.last_login:
+        last_login = timezone.localtime(user.last_login) if timezone.is_aware(user.last_login) else user.last_login
+        active_month = last_login.date().replace(day=1)
+    return join_date, active_month
+
+
+def adjust(key, delta):
+    """Add delta users to the cohort row identified by key, creating it if needed."""
+    from expenses.models import UserCohort
+
+    join_date, active_month = key
+    counter_rows.increment(
+        UserCohort, {'join_date': join_date, 'active_month': active_month}, {'users': delta},
+        defaults={'join_month': join_date.replace(day=1)},
+    )
+
+
+def move(old_key, new_key):
+    """Move one user from old_key to new_key (no-op when unchanged)."""
+    if old_key == new_key:
+        return
+    with transaction.atomic():
+        if old_key is not None:
+            adjust(old_key, -1)
+        adjust(new_key, 1)
+
+
+def rebuild():
+    """Recompute every cohort row from the User table in one grouped query."""
+    from django.contrib.auth.models import User
+    from expenses.models import UserCohort
+
+    rows = (
+        User.objects.annotate(
+            join_date=TruncDate('date_joined'),
+            active_month=TruncMonth('last_login'),
+        ).values('join_date', 'active_month').annotate(
+            users=Count('id')
+        ).order_by()
+    )
+    cohorts = []
+    for row in rows:
+        active_month = row['active_month']
+        if active_month is not None and hasattr(active_month, 'date'):
+            active_month = active_month.date()
+        cohorts.append(UserCohort(
+            join_date=row['join_date'], join_month=row['join_date'].replace(day=1),
+            active_month=active_month, users=row['users'],
+        ))
+
+    with transaction.atomic():
+        UserCohort.objects.all().delete()
+        UserCohort.objects.bulk_create(cohorts, batch_size=1000)
+    return len(cohorts)
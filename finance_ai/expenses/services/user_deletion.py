@@ -0,0 +1,222 @@
+"""
+user_deletion.py — Background deletion and deactivation of users in bounded batches.
+
+`user.delete()` makes Django's collector load every related Expense,
+Income, Bill, Budget and SavingGoal, fire a signal per row and delete it
+all in one transaction that holds the SQLite write lock throughout.
+Here the request only marks the accounts (inactive, Profile.deletion_requested_at)
+and queues a BackgroundJob. The job worker then deletes each user's rows
+in batches of USER_DELETE_BATCH_SIZE, walking the (user, date) indexes.
+Every batch is its own short transaction. The rows are deleted with one
+DELETE, which skips the per-row signals, and the tables those signals
+maintain are adjusted in bulk inside the same transaction:
+
+- platform rollups (total, count and distinct users per day and key),
+- spend counters (MonthlyCategorySpend; removals never raise budget alerts),
+- the user's totals on Profile (count, total spent, last expense date),
+- the SQLite full-text index, through its own DELETE trigger.
+
+Once the children are gone, the User row itself is deleted with
+`user.delete()`, which fires its signals (retention cohorts) and cascades
+the counters, alerts and jobs. Daily active-user sketches are left as
+they are: the user's past activity still counts, and a HyperLogLog
+cannot remove an element anyway. A re-queued job picks up where the
+previous attempt stopped.
+
+Deactivation, of one user or many, goes through deactivate(); large
+selections are queued and run it in batches.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from expenses.services import exports, platform_rollups, spend_counters, user_totals
+
+REPORT_HEADER = ['User ID', 'Username', 'Status', 'Rows deleted']
+
+
+def _child_models():
+    """(model, rollup kind or None) in deletion order."""
+    from expenses.models import Bill, Budget, Expense, Income, SavingGoal
+
+    return [(Expense, 'expense'), (Income, 'income'), (Bill, None), (Budget, None), (SavingGoal, None)]
+
+
+def _eligible(requested_by, user_ids):
+    # Never superusers, and never the admin who asked
+    return list(
+        User.objects.filter(pk__in=user_ids, is_superuser=False).exclude(pk=requested_by.pk)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def _in_batches(ids):
+    size = settings.USER_DELETE_BATCH_SIZE
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def queue_deletion(requested_by, user_ids, filename):
+    """
+    Deactivate the users, mark them pending deletion and queue the job that
+    deletes them. Returns the BackgroundJob, or None when no user qualifies.
+    """
+    from expenses.models import Profile
+    from expenses.services import jobs
+
+    ids = _eligible(requested_by, user_ids)
+    if not ids:
+        return None
+    now = timezone.now()
+    with transaction.atomic():
+        for chunk in _in_batches(ids):
+            # is_active is not tracked by any User signal, so a plain UPDATE is safe
+            User.objects.filter(pk__in=chunk).update(is_active=False)
+            Profile.objects.filter(user_id__in=chunk).update(deletion_requested_at=now)
+        return jobs.enqueue(requested_by, 'user_delete', {'user_ids': ids}, filename)
+
+
+def deactivate(requested_by, user_ids):
+    """Deactivate the users that qualify (see _eligible) with one UPDATE; returns how many."""
+    ids = _eligible(requested_by, user_ids)
+    # is_active is not tracked by any User signal, so a plain UPDATE is safe
+    return User.objects.filter(pk__in=ids).update(is_active=False)
+
+
+def queue_deactivation(requested_by, user_ids, filename):
+    """Queue a batched deactivation of the users. Returns the BackgroundJob, or None when no user qualifies."""
+    from expenses.services import jobs
+
+    ids = _eligible(requested_by, user_ids)
+    if not ids:
+        return None
+    return jobs.enqueue(requested_by, 'user_deactivate', {'user_ids': ids}, filename)
+
+
+def remaining_rows(user_id):
+    """Rows still to delete for `user_id`, over all child tables."""
+    return sum(model.objects.filter(user_id=user_id).count() for model, _kind in _child_models())
+
+
+def _raw_delete(model, pks):
+    """DELETE the rows by primary key in one statement, without the collector and its per-row signals."""
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(pks))})", pks)
+
+
+def _delete_rows(model, kind, user_id, batch_size):
+    """Delete one batch of `model` rows for the user; returns how many went."""
+    if kind is None:
+        batch = list(model.objects.filter(user_id=user_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        rows = ()
+    else:
+        key_field = platform_rollups.KIND_FIELDS[kind]
+        # Deleted rows drop out of the index, so every batch starts where the last one ended
+        rows = list(
+            model.objects.filter(user_id=user_id).order_by('date', 'pk')
+            .values_list('pk', 'date', key_field, 'amount')[:batch_size]
+        )
+        batch = [row[0] for row in rows]
+    if not batch:
+        return 0
+
+    deltas, spend = {}, {}
+    for _pk, day, key, amount in rows:
+        total, count, users = deltas.get((day, key), (Decimal('0'), 0, 0))
+        deltas[(day, key)] = (total - amount, count - 1, users)
+        if kind == 'expense':
+            month = (user_id, spend_counters.month_of(day), key)
+            total, count = spend.get(month, (Decimal('0'), 0))
+            spend[month] = (total - amount, count - 1)
+
+    with transaction.atomic():
+        # The signals would cost several queries per row; every table they
+        # maintain is adjusted in bulk below instead
+        _raw_delete(model, batch)
+        if kind is not None:
+            # Earlier dates are finished; only the batch's last date may continue in the next one
+            last_day = rows[-1][1]
+            for (day, key), (total, count, _users) in deltas.items():
+                if day < last_day or not model.objects.filter(user_id=user_id, date=day, **{key_field: key}).exists():
+                    deltas[(day, key)] = (total, count, -1)
+            platform_rollups.apply_deltas(kind, deltas)
+        if kind == 'expense':
+            spend_counters.apply_deltas(spend)
+            user_totals.apply_deltas({user_id: (-sum(row[3] for row in rows), -len(rows))})
+    return len(batch)
+
+
+def delete_user(user_id, on_batch=None, batch_size=None):
+    """
+    Delete a user and all of their data batch by batch; returns the number
+    of child rows deleted. `on_batch(rows)` is called after each batch.
+    """
+    from expenses.models import BackgroundJob
+    from expenses.services import jobs
+
+    batch_size = batch_size or settings.USER_DELETE_BATCH_SIZE
+    deleted = 0
+    for model, kind in _child_models():
+        while True:
+            count = _delete_rows(model, kind, user_id, batch_size)
+            if not count:
+                break
+            deleted += count
+            if on_batch:
+                on_batch(count)
+
+    for job in BackgroundJob.objects.filter(user_id=user_id).iterator():
+        if job.result_file:
+            job.result_file.delete(save=False)
+        jobs.delete_upload(job)
+    with transaction.atomic():
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            # Only the profile, export jobs and auth rows are left for the collector
+            user.delete()
+    return deleted
+
+
+def _report_rows(user_ids, progress):
+    usernames = dict(User.objects.filter(pk__in=user_ids).values_list('pk', 'username'))
+    total = sum(remaining_rows(user_id) for user_id in usernames)
+    done = 0
+
+    def advance(rows):
+        nonlocal done
+        done += rows
+        progress(done, total)
+
+    for user_id in user_ids:
+        if user_id not in usernames:
+            yield [user_id, '', 'already deleted', 0]
+        else:
+            yield [user_id, usernames[user_id], 'deleted', delete_user(user_id, advance)]
+    progress(total, total)
+
+
+def write_deletion_report(output, user, params, progress):
+    """Job writer for kind 'user_delete': deletes params['user_ids'] and reports each user."""
+    for line in exports.stream_csv(REPORT_HEADER, _report_rows(params['user_ids'], progress)):
+        output.write(line.encode('utf-8'))
+
+
+def _deactivated_rows(requested_by, user_ids, progress):
+    done = 0
+    for chunk in _in_batches(user_ids):
+        deactivate(requested_by, chunk)
+        yield from ([user_id, username, 'deactivated']
+                    for user_id, username in User.objects.filter(pk__in=chunk).order_by('pk').values_list('pk', 'username'))
+        done += len(chunk)
+        progress(done, len(user_ids))
+
+
+def write_deactivation_report(output, user, params, progress):
+    """Job writer for kind 'user_deactivate': deactivates params['user_ids'] in batches."""
+    for line in exports.stream_csv(REPORT_HEADER[:3], _deactivated_rows(user, params['user_ids'], progress)):
+        output.write(line.encode('utf-8'))
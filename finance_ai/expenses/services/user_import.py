@@ -0,0 +1,259 @@
+"""
+user_import.py — Bulk user provisioning from a CSV file.
+
+Columns: username, email (required), password, first_name, last_name and
+currency (optional). Rows are handled in batches of USER_IMPORT_BATCH_SIZE.
+Each batch goes through three steps:
+
+  1. field checks, duplicate usernames in the file and one query for
+     usernames that already exist;
+  2. password validation and hashing in a process pool
+     (USER_IMPORT_WORKERS). PBKDF2 is deliberately slow, so this is where
+     the time goes;
+  3. one transaction that bulk_creates the users, then their profiles, and
+     moves the signup cohort counters.
+
+bulk_create sends no post_save, so the per-user receivers in signals.py
+(create_user_profile, save_user_profile, update_user_cohort) do not run.
+Step 3 applies their effects in bulk. An empty password leaves the account
+with an unusable password until it is reset. Invalid rows are reported
+and skipped; they never abort the batch.
+"""
+import csv
+import io
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from expenses.services import exports, user_cohorts
+
+REQUIRED_COLUMNS = ('username', 'email')
+OPTIONAL_COLUMNS = ('password', 'first_name', 'last_name', 'currency')
+REPORT_HEADER = ['Line', 'Username', 'Status', 'Detail']
+
+_username_validator = UnicodeUsernameValidator()
+
+
+class ImportFileError(ValueError):
+    """The file cannot be imported at all (e.g. required columns are missing)."""
+
+
+def missing_columns(header_line):
+    """Required columns absent from a CSV header line."""
+    header = next(csv.reader([header_line]), [])
+    return [name for name in REQUIRED_COLUMNS if name not in [column.strip() for column in header]]
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+    # Never reuse a connection inherited from the parent across a fork
+    connections.close_all()
+
+
+def _prepare_password(fields):
+    """(password hash, [errors]) for one row; runs in the hashing pool."""
+    password = fields['password']
+    if not password:
+        return make_password(None), []
+    candidate = User(username=fields['username'], email=fields['email'],
+                     first_name=fields['first_name'], last_name=fields['last_name'])
+    try:
+        validate_password(password, user=candidate)
+    except ValidationError as exc:
+        return None, list(exc.messages)
+    return make_password(password), []
+
+
+def _clean(row):
+    """Normalised fields and a list of field errors for one CSV row."""
+    fields = {name: (row.get(name) or '').strip() for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+    # Passwords are taken verbatim
+    fields['password'] = row.get('password') or ''
+    errors = []
+    if not fields['username']:
+        errors.append("Username is required.")
+    else:
+        if len(fields['username']) > 150:
+            errors.append("Username is longer than 150 characters.")
+        try:
+            _username_validator(fields['username'])
+        except ValidationError as exc:
+            errors.extend(exc.messages)
+    try:
+        validate_email(fields['email'])
+    except ValidationError:
+        errors.append("Enter a valid email address.")
+    if len(fields['first_name']) > 150 or len(fields['last_name']) > 150:
+        errors.append("Names are limited to 150 characters.")
+    if len(fields['currency']) > 10:
+        errors.append("Currency is longer than 10 characters.")
+    return fields, errors
+
+
+def _create_batch(entries, joined):
+    """Insert users and profiles for [(line, fields, password_hash)] in one transaction."""
+    from expenses.models import Profile
+
+    with transaction.atomic():
+        users = User.objects.bulk_create([
+            User(username=fields['username'], email=fields['email'], password=password_hash,
+                 first_name=fields['first_name'], last_name=fields['last_name'], date_joined=joined)
+            for _line, fields, password_hash in entries
+        ])
+        if any(user.pk is None for user in users):
+            # Backends without RETURNING on bulk inserts
+            ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id'))
+            for user in users:
+                user.pk = ids[user.username]
+        Profile.objects.bulk_create([
+            Profile(user=user, currency=fields['currency'] or 'INR')
+            for user, (_line, fields, _hash) in zip(users, entries)
+        ])
+        for key, count in Counter(user_cohorts.cohort_key(user) for user in users).items():
+            user_cohorts.adjust(key, count)
+
+
+def _insert(entries, joined, report):
+    """Insert a batch, falling back to row by row when another writer took a username meanwhile."""
+    try:
+        _create_batch(entries, joined)
+    except IntegrityError:
+        created = 0
+        for entry in entries:
+            try:
+                _create_batch([entry], joined)
+            except IntegrityError:
+                report(entry[0], entry[1]['username'], 'error', "A user with that username already exists.")
+            else:
+                report(entry[0], entry[1]['username'], 'created', '')
+                created += 1
+        return created
+    for line, fields, _hash in entries:
+        report(line, fields['username'], 'created', '')
+    return len(entries)
+
+
+def import_users(csv_file, report=None, progress=None, batch_size=None, workers=None):
+    """
+    Create users from an open text-mode CSV file.
+
+    `report(line, username, status, detail)` is called once per row, with
+    status 'created' or 'error'. `progress(done, total)` is called after
+    each batch. Returns {'rows', 'created', 'invalid'}.
+    """
+    report = report or (lambda *args: None)
+    batch_size = batch_size or settings.USER_IMPORT_BATCH_SIZE
+    workers = workers or settings.USER_IMPORT_WORKERS
+
+    reader = csv.DictReader(csv_file)
+    reader.fieldnames = [name.strip() for name in reader.fieldnames or []]
+    missing = [name for name in REQUIRED_COLUMNS if name not in reader.fieldnames]
+    if missing:
+        raise ImportFileError(f"Missing required column(s): {', '.join(missing)}.")
+    # Line numbers as shown in a spreadsheet (the header is line 1)
+    rows = list(enumerate(reader, start=2))
+    total = len(rows)
+
+    pool = None
+    if workers > 1:
+        # Children open their own connections; none may be shared across the fork
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+    def hash_all(items):
+        if pool is None:
+            return map(_prepare_password, items)
+        return pool.map(_prepare_password, items, chunksize=max(1, len(items) // (workers * 4)))
+
+    joined = timezone.now()
+    seen = set()
+    created = invalid = 0
+    try:
+        for start in range(0, total, batch_size):
+            # Reports are buffered so each batch is reported in file order
+            notes = []
+
+            def note(*args):
+                notes.append(args)
+
+            candidates = []
+            for line, row in rows[start:start + batch_size]:
+                fields, errors = _clean(row)
+                if fields['username'] in seen:
+                    errors.append("Duplicate username in this file.")
+                elif fields['username']:
+                    seen.add(fields['username'])
+                if errors:
+                    note(line, fields['username'], 'error', ' '.join(errors))
+                    invalid += 1
+                else:
+                    candidates.append((line, fields))
+
+            existing = set(User.objects.filter(
+                username__in=[fields['username'] for _line, fields in candidates]
+            ).values_list('username', flat=True))
+
+            pending = []
+            for line, fields in candidates:
+                if fields['username'] in existing:
+                    note(line, fields['username'], 'error', "A user with that username already exists.")
+                    invalid += 1
+                else:
+                    pending.append((line, fields))
+
+            entries = []
+            hashed = hash_all([fields for _line, fields in pending])
+            for (line, fields), (password_hash, errors) in zip(pending, hashed):
+                if errors:
+                    note(line, fields['username'], 'error', ' '.join(errors))
+                    invalid += 1
+                else:
+                    entries.append((line, fields, password_hash))
+
+            if entries:
+                inserted = _insert(entries, joined, note)
+                created += inserted
+                invalid += len(entries) - inserted
+            for args in sorted(notes, key=lambda args: args[0]):
+                report(*args)
+            if progress:
+                progress(min(start + batch_size, total), total)
+    finally:
+        if pool:
+            pool.shutdown()
+    return {'rows': total, 'created': created, 'invalid': invalid}
+
+
+def write_import_report(output, user, params, progress):
+    """
+    Job writer for kind 'user_import': imports the uploaded CSV stored at
+    params['source'] in private storage and writes a per-row
+    Line/Username/Status/Detail report. The upload holds plaintext
+    passwords, so it is deleted afterwards, whatever the outcome.
+    """
+    from expenses.models import private_storage
+
+    writer = csv.writer(exports.Echo())
+    output.write(writer.writerow(REPORT_HEADER).encode('utf-8'))
+
+    def report(line, username, status, detail):
+        output.write(writer.writerow([line, username, status, detail]).encode('utf-8'))
+
+    try:
+        with private_storage().open(params['source'], 'rb') as source:
+            text = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+            summary = import_users(text, report, progress)
+    finally:
+        private_storage().delete(params['source'])
+    progress(summary['rows'], summary['rows'])
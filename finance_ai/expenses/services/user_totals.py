@@ -0,0 +1,100 @@
+"""
+user_totals.py — Per-user expense count, total spend and last expense date.
+
+Stored on Profile so the admin user list can sort and page by them without
+aggregating the Expense table. Expense signals apply deltas on every write;
+rebuild() recomputes them from scratch for writes that bypass signals.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateField, F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def _refresh_last_date(user_id):
+    from expenses.models import Expense, Profile
+
+    # Served by the (user, date) index
+    last_date = Expense.objects.filter(user_id=user_id).aggregate(last=Max('date'))['last']
+    Profile.objects.filter(user_id=user_id).update(last_expense_date=last_date)
+
+
+def _apply(user_id, amount, count, added_date=None):
+    """Move the totals by (amount, count); `added_date` can only raise the last expense date."""
+    from expenses.models import Profile
+
+    changes = {'total_spent': F('total_spent') + amount, 'expense_count': F('expense_count') + count}
+    if added_date is not None:
+        added = Value(added_date, output_field=DateField())
+        changes['last_expense_date'] = Greatest(Coalesce('last_expense_date', added), added)
+    Profile.objects.filter(user_id=user_id).update(**changes)
+
+
+def record_change(old_state, instance):
+    """Apply a create (old_state=None) or update of an Expense, using platform_rollups snapshots."""
+    amount = Decimal(str(instance.amount))
+    with transaction.atomic():
+        if old_state is None:
+            _apply(instance.user_id, amount, 1, instance.date)
+            return
+        old_amount = Decimal(str(old_state['amount']))
+        if old_state['user_id'] != instance.user_id:
+            _apply(old_state['user_id'], -old_amount, -1)
+            _refresh_last_date(old_state['user_id'])
+            _apply(instance.user_id, amount, 1, instance.date)
+            return
+        if old_amount == amount and old_state['date'] == instance.date:
+            return
+        # One UPDATE; only moving an expense to an earlier date needs the last date recomputed
+        _apply(instance.user_id, amount - old_amount, 0, instance.date)
+        if instance.date < old_state['date']:
+            _refresh_last_date(instance.user_id)
+
+
+def record_delete(instance):
+    """Apply the removal of an already-deleted Expense."""
+    with transaction.atomic():
+        _apply(instance.user_id, -Decimal(str(instance.amount)), -1)
+        _refresh_last_date(instance.user_id)
+
+
+def apply_deltas(deltas):
+    """
+    Apply {user_id: (amount, count)} deltas, for bulk writes that bypass the
+    per-row signals, then recompute each user's last expense date. Call
+    inside the transaction that makes the matching change to the Expense table.
+    """
+    for user_id, (amount, count) in deltas.items():
+        _apply(user_id, amount, count)
+        _refresh_last_date(user_id)
+
+
+def rebuild(user_ids=None):
+    """Recompute the totals of the given users (all users when omitted) with one grouped query."""
+    from expenses.models import Expense, Profile
+
+    expenses = Expense.objects.all()
+    profiles = Profile.objects.all()
+    if user_ids is not None:
+        expenses = expenses.filter(user_id__in=user_ids)
+        profiles = profiles.filter(user_id__in=user_ids)
+
+    totals = {
+        row['user_id']: row
+        for row in expenses.values('user_id').annotate(
+            count=Count('id'), total=Sum('amount'), last=Max('date')
+        ).order_by()
+    }
+
+    updated = []
+    for profile in profiles.only('id', 'user_id').iterator(chunk_size=2000):
+        row = totals.get(profile.user_id, {})
+        profile.expense_count = row.get('count', 0)
+        profile.total_spent = row.get('total') or Decimal('0.00')
+        profile.last_expense_date = row.get('last')
+        updated.append(profile)
+
+    with transaction.atomic():
+        Profile.objects.bulk_update(updated, ['expense_count', 'total_spent', 'last_expense_date'], batch_size=1000)
+    return len(updated)
@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, post_delete, post_migrate
 from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
 from django.dispatch import receiver
-from .models import Profile
+from .models import Profile, Expense, Income, Budget
+from .services import user_cohorts, platform_rollups, user_totals, active_users, spend_counters, budget_alerts, expense_search
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -11,3 +13,131 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
+
+
+# ── Retention cohorts ────────────────────────────────────────────────────────
+_COHORT_FIELDS = {'date_joined', 'last_login'}
+
+@receiver(pre_save, sender=User)
+def remember_user_cohort(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Capture the cohort the user belongs to before this save."""
+    instance._cohort_before = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not _COHORT_FIELDS & set(update_fields):
+        instance._cohort_before = 'unchanged'
+        return
+    previous = User.objects.filter(pk=instance.pk).only('date_joined', 'last_login').first()
+    if previous is not None:
+        instance._cohort_before = user_cohorts.cohort_key(previous)
+
+@receiver(post_save, sender=User)
+def update_user_cohort(sender, instance, created, raw=False, **kwargs):
+    before = getattr(instance, '_cohort_before', None)
+    if raw or before == 'unchanged':
+        return
+    user_cohorts.move(None if created else before, user_cohorts.cohort_key(instance))
+
+@receiver(post_delete, sender=User)
+def remove_user_cohort(sender, instance, **kwargs):
+    user_cohorts.adjust(user_cohorts.cohort_key(instance), -1)
+
+
+# ── Platform daily rollups ───────────────────────────────────────────────────
+@receiver(pre_save, sender=Expense)
+@receiver(pre_save, sender=Income)
+def remember_rollup_state(sender, instance, raw=False, **kwargs):
+    """Capture the rollup-relevant fields of the stored row before this save."""
+    instance._rollup_before = None
+    if raw or instance.pk is None:
+        return
+    previous = sender.objects.filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._rollup_before = platform_rollups.snapshot(previous)
+
+def _stored_state(instance, created):
+    """
+    The row's snapshot from before this save: None for an insert, or
+    'unknown' for an update whose stored row could not be read. Applying
+    such an update as an insert would count the row twice.
+    """
+    if created:
+        return None
+    return getattr(instance, '_rollup_before', None) or 'unknown'
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+def update_platform_rollups(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = _stored_state(instance, created)
+    if before == 'unknown':
+        # The old date is unknown too; recompute the day the row is on now
+        platform_rollups.rebuild(instance.date, instance.date)
+        return
+    platform_rollups.record_change(before, instance)
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+def remove_from_platform_rollups(sender, instance, **kwargs):
+    platform_rollups.record_delete(instance)
+
+
+# ── Per-user expense totals (Profile) ────────────────────────────────────────
+@receiver(post_save, sender=Expense)
+def update_user_totals(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = _stored_state(instance, created)
+    if before == 'unknown':
+        user_totals.rebuild([instance.user_id])
+        return
+    user_totals.record_change(before, instance)
+
+@receiver(post_delete, sender=Expense)
+def remove_from_user_totals(sender, instance, **kwargs):
+    user_totals.record_delete(instance)
+
+
+# ── Per-user monthly category spend (budgets) ─────────────────────────────────
+@receiver(post_save, sender=Expense)
+def update_spend_counters(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = _stored_state(instance, created)
+    if before == 'unknown':
+        spend_counters.rebuild([instance.user_id])
+        return
+    spend_counters.record_change(before, instance)
+
+@receiver(post_delete, sender=Expense)
+def remove_from_spend_counters(sender, instance, **kwargs):
+    spend_counters.record_delete(instance)
+
+@receiver(post_save, sender=Budget)
+def check_budget_thresholds(sender, instance, raw=False, **kwargs):
+    # Expense writes raise alerts through spend_counters; a new or lowered limit can cross thresholds too
+    if raw:
+        return
+    budget_alerts.record_budget_change(instance)
+
+
+# ── Daily active-user sketches ───────────────────────────────────────────────
+@receiver(user_logged_in)
+def record_login_activity(sender, request, user, **kwargs):
+    active_users.record(user.pk)
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+def record_transaction_activity(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    active_users.record(instance.user_id)
+
+
+# ── Full-text search ─────────────────────────────────────────────────────────
+@receiver(post_migrate)
+def repair_expense_search(sender, using, **kwargs):
+    # SQLite table remakes of expenses_expense drop the full-text index triggers
+    if sender.name == 'expenses':
+        expense_search.repair(using)
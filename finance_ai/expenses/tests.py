@@ -1,3 +1,1427 @@
-from django.test import TestCase
+import io
+import json
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import groupby
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_migrate, pre_save
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from expenses import analytics_service, signals
+from expenses.ml import sequences
+from expenses.ml.shadow_evaluator import shadow_evaluator
+from expenses.models import (
+    ActiveUserSketch, Budget, BudgetAlert, Expense, BackgroundJob, Income, MonthlyCategorySpend, PlatformDailyRollup,
+    Profile, ShadowEvalCounter, UserCohort, private_storage,
+)
+from expenses.services import (
+    active_users, analytics_snapshot, budget_alerts, columnar, expense_search, hll, jobs, metrics, parallel_export,
+    platform_rollups, report_writers, spend_counters, stale_cache, statements, user_cohorts, user_deletion,
+    user_totals,
+)
+from expenses.utils import admin_insights
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table
+
+
+class RescoreBudgetAlertTests(TestCase):
+    """rescore_expenses moves spend between categories with spend_counters.apply_deltas."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('rescored', 'rescored@example.com', 'pw')
+        self.today = date.today()
+        Budget.objects.create(user=self.user, category='Food', monthly_budget=Decimal('100'))
+
+    def _recategorize(self, expense, category):
+        month = spend_counters.month_of(expense.date)
+        with transaction.atomic():
+            Expense.objects.filter(pk=expense.pk).update(category=category)
+            spend_counters.apply_deltas({
+                (self.user.pk, month, expense.category): (-expense.amount, -1),
+                (self.user.pk, month, category): (expense.amount, 1),
+            })
+
+    def test_recategorization_raises_budget_alerts(self):
+        expense = Expense.objects.create(user=self.user, category='Others', amount=Decimal('85'), date=self.today)
+        self.assertFalse(BudgetAlert.objects.filter(user=self.user).exists())
+
+        self._recategorize(expense, 'Food')
+
+        self.assertEqual(
+            sorted(BudgetAlert.objects.filter(user=self.user, category='Food').values_list('threshold', flat=True)),
+            [50, 80],
+        )
+
+    def test_recategorizing_past_months_does_not_alert(self):
+        last_month = self.today.replace(day=1) - timedelta(days=1)
+        expense = Expense.objects.create(user=self.user, category='Others', amount=Decimal('150'), date=last_month)
+
+        self._recategorize(expense, 'Food')
+
+        self.assertFalse(BudgetAlert.objects.filter(user=self.user).exists())
+
+
+class SpendCounterTests(TestCase):
+    """MonthlyCategorySpend follows Expense creates, updates and deletes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('spender', 'spender@example.com', 'pw')
+        self.today = date.today()
+        self.month = self.today.replace(day=1)
+        self.last_month = self.month - timedelta(days=1)
+
+    def _counters(self):
+        return {
+            (row.month, row.category): (row.total, row.count)
+            for row in MonthlyCategorySpend.objects.filter(user=self.user, count__gt=0)
+        }
+
+    def assertMatchesRebuild(self):
+        counters = self._counters()
+        spend_counters.rebuild([self.user.pk])
+        self.assertEqual(counters, self._counters())
+
+    def test_updates_and_deletes_move_the_counters(self):
+        expense = Expense.objects.create(user=self.user, category='Food', amount=Decimal('10'), date=self.today)
+        Expense.objects.create(user=self.user, category='Food', amount=Decimal('4'), date=self.today)
+        self.assertEqual(self._counters(), {(self.month, 'Food'): (Decimal('14'), 2)})
+
+        expense.amount = Decimal('30')
+        expense.save()
+        self.assertEqual(self._counters(), {(self.month, 'Food'): (Decimal('34'), 2)})
+
+        expense.category = 'Travel'
+        expense.date = self.last_month
+        expense.save()
+        self.assertEqual(self._counters(), {
+            (self.month, 'Food'): (Decimal('4'), 1),
+            (self.last_month.replace(day=1), 'Travel'): (Decimal('30'), 1),
+        })
+        self.assertMatchesRebuild()
+
+        expense.delete()
+        self.assertEqual(self._counters(), {(self.month, 'Food'): (Decimal('4'), 1)})
+        self.assertMatchesRebuild()
+
+    def test_increases_alert_once_per_threshold(self):
+        Budget.objects.create(user=self.user, category='Food', monthly_budget=Decimal('100'))
+        expense = Expense.objects.create(user=self.user, category='Food', amount=Decimal('60'), date=self.today)
+        expense.amount = Decimal('40')
+        expense.save()
+        expense.amount = Decimal('120')
+        expense.save()
+
+        self.assertEqual(
+            sorted(BudgetAlert.objects.filter(user=self.user).values_list('threshold', 'spent')),
+            [(50, Decimal('60')), (80, Decimal('120')), (100, Decimal('120'))],
+        )
+
+    def test_removals_after_user_delete_create_no_counters(self):
+        spend_counters.record_delete(Expense(user_id=self.user.pk, category='Food', amount=Decimal('5'), date=self.today))
+        self.assertFalse(MonthlyCategorySpend.objects.exists())
+
+    def test_uncounted_expenses_never_alert_from_a_zero_baseline(self):
+        Budget.objects.create(user=self.user, category='Food', monthly_budget=Decimal('100'))
+        old = Expense.objects.create(user=self.user, category='Food', amount=Decimal('70'), date=self.today)
+        other = Expense.objects.create(user=self.user, category='Travel', amount=Decimal('20'), date=self.today)
+        # As if both were written before the counters existed
+        MonthlyCategorySpend.objects.all().delete()
+        BudgetAlert.objects.all().delete()
+
+        old.amount = Decimal('75')
+        old.save()
+        other.category = 'Food'
+        other.save()
+
+        self.assertFalse(BudgetAlert.objects.exists())
+        self.assertEqual(self._counters(), {(self.month, 'Food'): (Decimal('95'), 2)})
+
+        Expense.objects.create(user=self.user, category='Food', amount=Decimal('10'), date=self.today)
+        self.assertEqual(list(BudgetAlert.objects.values_list('threshold', 'spent')), [(100, Decimal('105'))])
+
+
+class BudgetAlertTests(TestCase):
+    """Threshold detection and the claim / deliver / requeue cycle of the alert outbox."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alerted', 'alerted@example.com', 'pw')
+        self.month = date.today().replace(day=1)
+
+    def _alert(self, threshold=50, **fields):
+        return BudgetAlert.objects.create(user=self.user, category='Food', month=self.month, threshold=threshold,
+                                          spent=Decimal('60'), limit=Decimal('100'), **fields)
+
+    def test_crossed_reports_each_threshold_passed(self):
+        limit = Decimal('200')
+        self.assertEqual(budget_alerts.crossed(Decimal('0'), Decimal('99.99'), limit), [])
+        self.assertEqual(budget_alerts.crossed(Decimal('0'), Decimal('100'), limit), [50])
+        self.assertEqual(budget_alerts.crossed(Decimal('100'), Decimal('159.99'), limit), [])
+        self.assertEqual(budget_alerts.crossed(Decimal('99'), Decimal('250'), limit), [50, 80, 100])
+        # Already past a threshold, or moving down: nothing new
+        self.assertEqual(budget_alerts.crossed(Decimal('160'), Decimal('170'), limit), [])
+        self.assertEqual(budget_alerts.crossed(Decimal('250'), Decimal('10'), limit), [])
+        self.assertEqual(budget_alerts.crossed(Decimal('0'), Decimal('10'), Decimal('0')), [])
+
+    def test_claim_is_exclusive_and_retries_back_off(self):
+        alert = self._alert()
+        claimed = budget_alerts.claim_next()
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts), (alert.pk, 'sending', 1))
+        self.assertIsNone(budget_alerts.claim_next())
+
+        with mock.patch('expenses.services.budget_alerts.send_mail', side_effect=OSError('smtp down')), \
+                self.assertLogs('expenses.services.budget_alerts', 'ERROR'):
+            self.assertEqual(budget_alerts.deliver(claimed), 'pending')
+        alert.refresh_from_db()
+        self.assertGreater(alert.next_attempt_at, timezone.now())
+        self.assertEqual(alert.last_error, 'smtp down')
+        # Not due again until the backoff has passed
+        self.assertIsNone(budget_alerts.claim_next())
+
+        BudgetAlert.objects.filter(pk=alert.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        claimed = budget_alerts.claim_next()
+        self.assertEqual(claimed.attempts, 2)
+        with mock.patch('expenses.services.budget_alerts.send_mail') as send_mail:
+            self.assertEqual(budget_alerts.deliver(claimed), 'sent')
+        send_mail.assert_called_once()
+        self.assertEqual(BudgetAlert.objects.get(pk=alert.pk).status, 'sent')
+
+    @override_settings(BUDGET_ALERT_MAX_ATTEMPTS=3, BUDGET_ALERT_STALE_MINUTES=10)
+    def test_abandoned_claims_are_requeued_until_attempts_run_out(self):
+        long_ago = timezone.now() - timedelta(minutes=11)
+        abandoned = self._alert(50, status='sending', attempts=1, claimed_at=long_ago)
+        exhausted = self._alert(80, status='sending', attempts=3, claimed_at=long_ago)
+        in_flight = self._alert(100, status='sending', attempts=1, claimed_at=timezone.now())
+
+        budget_alerts.requeue_stale()
+
+        statuses = dict(BudgetAlert.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            (statuses[abandoned.pk], statuses[exhausted.pk], statuses[in_flight.pk]),
+            ('pending', 'failed', 'sending'),
+        )
+        self.assertEqual(budget_alerts.claim_next().pk, abandoned.pk)
+
+    def test_alerts_without_an_address_are_skipped(self):
+        self.user.email = ''
+        self.user.save()
+        self._alert()
+        with mock.patch('expenses.services.budget_alerts.send_mail') as send_mail:
+            self.assertEqual(budget_alerts.deliver(budget_alerts.claim_next()), 'skipped')
+        send_mail.assert_not_called()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'The full-text index is SQLite FTS5')
+class ExpenseSearchRepairTests(TestCase):
+    """post_migrate reinstalls the FTS triggers a table rebuild dropped and reindexes."""
+
+    def test_migrate_restores_dropped_triggers(self):
+        user = User.objects.create_user('searcher', 'searcher@example.com', 'pw')
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {expense_search.FTS_TABLE}_ai")
+        Expense.objects.create(user=user, category='Food', amount=Decimal('4'), date=date(2026, 3, 1),
+                               description='Morning espresso')
+        self.assertEqual(expense_search.missing_triggers(), [f'{expense_search.FTS_TABLE}_ai'])
+
+        post_migrate.send(sender=apps.get_app_config('expenses'), app_config=apps.get_app_config('expenses'),
+                          verbosity=0, interactive=False, using='default', apps=apps, plan=[])
+
+        self.assertEqual(expense_search.missing_triggers(), [])
+        self.assertTrue(Expense.objects.filter(id__in=expense_search.matching_ids('espress')).exists())
+
+
+class UserDeletionTests(TestCase):
+    """Batched deletion keeps every derived table equal to a rebuild after each batch."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+        start = date(2026, 1, 28)
+        for i in range(9):
+            day = start + timedelta(days=i // 2)
+            Expense.objects.create(user=self.alice, category=('Food', 'Travel')[i % 2], amount=Decimal(i + 1), date=day)
+        Expense.objects.create(user=self.bob, category='Food', amount=Decimal('50'), date=start)
+        Income.objects.create(user=self.alice, source='Salary', amount=Decimal('900'), date=start)
+        Income.objects.create(user=self.bob, source='Salary', amount=Decimal('800'), date=start)
+
+    def _derived(self):
+        return (
+            {(row.kind, row.date, row.key): (row.total, row.count, row.users)
+             for row in PlatformDailyRollup.objects.filter(count__gt=0)},
+            {(row.user_id, row.month, row.category): (row.total, row.count)
+             for row in MonthlyCategorySpend.objects.filter(count__gt=0)},
+            {profile.user_id: (profile.total_spent, profile.expense_count, profile.last_expense_date)
+             for profile in Profile.objects.all()},
+        )
+
+    def assertMatchesRebuild(self):
+        derived = self._derived()
+        platform_rollups.rebuild()
+        spend_counters.rebuild()
+        user_totals.rebuild()
+        self.assertEqual(derived, self._derived())
+
+    def test_every_batch_leaves_derived_tables_exact(self):
+        batches = []
+
+        def check(rows):
+            batches.append(rows)
+            self.assertMatchesRebuild()
+
+        deleted = user_deletion.delete_user(self.alice.pk, on_batch=check, batch_size=2)
+
+        self.assertEqual(deleted, 10)
+        self.assertEqual(batches, [2, 2, 2, 2, 1, 1])
+        self.assertFalse(User.objects.filter(pk=self.alice.pk).exists())
+        self.assertEqual(
+            set(PlatformDailyRollup.objects.filter(count__gt=0).values_list('kind', 'key', 'total', 'users')),
+            {('expense', 'Food', Decimal('50'), 1), ('income', 'Salary', Decimal('800'), 1)},
+        )
+        self.assertMatchesRebuild()
+
+    def test_deactivation_spares_superusers_and_the_requester(self):
+        staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        other_root = User.objects.create_superuser('root2', 'root2@example.com', 'pw')
+
+        count = user_deletion.deactivate(staff, [self.alice.pk, staff.pk, other_root.pk])
+
+        self.assertEqual(count, 1)
+        self.assertEqual(
+            dict(User.objects.filter(pk__in=[self.alice.pk, staff.pk, other_root.pk]).values_list('username', 'is_active')),
+            {'alice': False, 'staff': True, 'root2': True},
+        )
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class BackgroundJobTests(TestCase):
+    """Job results live in private storage and reach only their owner through the download view."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('exporter', 'exporter@example.com', 'pw')
+        Expense.objects.create(user=self.user, category='Food', amount=Decimal('12.50'), date=date(2026, 3, 2),
+                               description='Lunch')
+
+    def _run(self, kind='user_csv', params=None):
+        params = params or {'start_date': '2026-03-01', 'end_date': '2026-03-31', 'label': 'March'}
+        jobs.enqueue(self.user, kind, params, 'expenses_exporter.csv')
+        job = jobs.claim_next('test-worker')
+        jobs.run_job(job)
+        job.refresh_from_db()
+        self.addCleanup(job.result_file.delete, save=False)
+        return job
+
+    def test_results_get_random_names_outside_media_root(self):
+        job = self._run()
+
+        self.assertEqual(job.status, 'done')
+        self.assertTrue(job.result_file.name.startswith('exports/'))
+        self.assertNotIn('exporter', job.result_file.name)
+        self.assertNotEqual(self._run().result_file.name, job.result_file.name)
+        path = Path(job.result_file.path)
+        self.assertTrue(path.is_relative_to(private_storage().location))
+        self.assertFalse(path.is_relative_to(Path(settings.MEDIA_ROOT).resolve()))
+
+    def test_only_the_owner_can_download(self):
+        job = self._run()
+        url = reverse('export_job_download', args=[job.pk])
+
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment; filename="expenses_exporter.csv"', response['Content-Disposition'])
+        self.assertIn(b'Lunch', b''.join(response.streaming_content))
+
+        self.client.force_login(User.objects.create_user('other', 'other@example.com', 'pw'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+    def test_small_exports_download_without_a_job(self):
+        self.client.force_login(self.user)
+        url = reverse('download_csv') + '?range=custom&start_date=2026-03-01&end_date=2026-03-31'
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Lunch', b''.join(response.streaming_content))
+        self.assertFalse(BackgroundJob.objects.exists())
+
+        with self.settings(EXPORT_SYNC_MAX_ROWS=0):
+            response = self.client.get(url)
+        job = BackgroundJob.objects.get()
+        self.assertRedirects(response, reverse('export_job', args=[job.pk]))
+        self.assertEqual((job.kind, job.status), ('user_csv', 'pending'))
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class UserImportUploadTests(TestCase):
+    """Import uploads hold plaintext passwords: private storage only, and deleted on every outcome."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        self.client.force_login(self.admin)
+
+    def _upload(self):
+        csv_file = SimpleUploadedFile('users.csv', b'username,email,password\nnew,new@example.com,S3cret-pass-1\n')
+        self.client.post(reverse('admin_import_users'), {'csv_file': csv_file})
+        job = BackgroundJob.objects.get(kind='user_import')
+        self.assertTrue(private_storage().exists(job.params['source']))
+        self.assertFalse(default_storage.exists(job.params['source']))
+        return job
+
+    def _run(self):
+        job = jobs.claim_next('test-worker')
+        jobs.run_job(job)
+        job.refresh_from_db()
+        if job.result_file:
+            self.addCleanup(job.result_file.delete, save=False)
+        return job
+
+    def test_upload_is_private_and_deleted_after_the_import(self):
+        job = self._upload()
+
+        self.assertEqual(self._run().status, 'done')
+        self.assertTrue(User.objects.filter(username='new').exists())
+        self.assertFalse(private_storage().exists(job.params['source']))
+
+    def test_upload_is_deleted_when_the_job_fails(self):
+        job = self._upload()
+
+        # Fails before the writer could open (and delete) the upload
+        crashing_writer = mock.Mock(side_effect=RuntimeError('boom'))
+        with mock.patch.dict(jobs.JOB_WRITERS, {'user_import': crashing_writer}), \
+                self.assertLogs('expenses.services.jobs', 'ERROR'):
+            self.assertEqual(self._run().status, 'failed')
+        self.assertFalse(private_storage().exists(job.params['source']))
+
+    def test_leftover_uploads_are_deleted_when_the_job_expires(self):
+        job = self._upload()
+        BackgroundJob.objects.filter(pk=job.pk).update(status='done', expires_at=timezone.now())
+
+        self.assertEqual(jobs.expire_results(), 1)
+        self.assertFalse(private_storage().exists(job.params['source']))
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class UserStatementsTests(TestCase):
+    """Statements for every user are built by a job; a selection still streams."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+        Expense.objects.create(user=self.alice, category='Food', amount=Decimal('9'), date=date(2026, 3, 4),
+                               description='Groceries')
+        self.client.force_login(self.admin)
+
+    def _zip_names(self, data):
+        return sorted(zipfile.ZipFile(io.BytesIO(data)).namelist())
+
+    def test_all_users_are_queued_as_a_job(self):
+        response = self.client.post(reverse('admin_user_statements'), {'month': '2026-03', 'scope': 'all'})
+
+        job = BackgroundJob.objects.get()
+        self.assertRedirects(response, reverse('export_job', args=[job.pk]))
+        self.assertEqual((job.kind, job.filename), ('user_statements', 'statements_2026-03.zip'))
+
+        jobs.run_job(jobs.claim_next('test-worker'))
+        job.refresh_from_db()
+        self.addCleanup(job.result_file.delete, save=False)
+        self.assertEqual((job.status, job.progress, job.total), ('done', 2, 2))
+        with job.result_file.open('rb') as result:
+            self.assertEqual(self._zip_names(result.read()), ['alice_2026-03.csv', 'bob_2026-03.csv'])
+
+    def test_a_selection_streams_directly(self):
+        response = self.client.post(reverse('admin_user_statements'),
+                                    {'month': '2026-03', 'scope': 'selected', 'user_ids': [self.alice.pk]})
+
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(self._zip_names(b''.join(response.streaming_content)), ['alice_2026-03.csv'])
+        self.assertFalse(BackgroundJob.objects.exists())
+
+    def test_rows_are_joined_to_their_own_user(self):
+        carol = User.objects.create_user('carol', 'carol@example.com', 'pw')
+        Expense.objects.create(user=carol, category='Bills', amount=Decimal('30'), date=date(2026, 3, 9),
+                               description='Power')
+        # A user outside the selection with rows between the selected ones
+        Expense.objects.create(user=self.bob, category='Travel', amount=Decimal('5'), date=date(2026, 3, 5),
+                               description='Bus')
+        users = User.objects.filter(pk__in=[self.alice.pk, carol.pk, self.admin.pk])
+
+        joined = {
+            username: [row[2] for row in rows]
+            for _user_id, username, rows in statements.statements_by_user(users, date(2026, 3, 1), date(2026, 3, 31))
+        }
+
+        self.assertEqual(joined, {'root': [], 'alice': [Decimal('9')], 'carol': [Decimal('30')]})
+
+    def test_non_numeric_user_ids_are_rejected(self):
+        for url, data in ((reverse('admin_user_statements'), {'month': '2026-03', 'scope': 'selected'}),
+                          (reverse('admin_bulk_users'), {'action': 'delete'})):
+            with self.subTest(url=url):
+                response = self.client.post(url, {**data, 'user_ids': [self.alice.pk, 'abc']})
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(BackgroundJob.objects.exists())
+
+
+class BackgroundJobLeaseTests(TransactionTestCase):
+    """A running job keeps its claim through long steps and never finishes a claim it lost."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('leased', 'leased@example.com', 'pw')
+
+    def _claim(self, writer):
+        self.writer = writer
+        patcher = mock.patch.dict(jobs.JOB_WRITERS, {'user_csv': writer})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        jobs.enqueue(self.user, 'user_csv', {}, 'leased.csv')
+        return jobs.claim_next('worker-a')
+
+    def _results(self):
+        storage = private_storage()
+        return set(storage.listdir('exports')[1]) if storage.exists('exports') else set()
+
+    def test_heartbeat_runs_during_a_long_step(self):
+        def slow_writer(output, user, params, progress):
+            time.sleep(0.5)  # one long step with no progress report
+            output.write(b'done')
+
+        job = self._claim(slow_writer)
+        with mock.patch.object(jobs, 'heartbeat_interval', return_value=0.05):
+            jobs.run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.addCleanup(job.result_file.delete, save=False)
+        self.assertGreaterEqual(job.heartbeat_at - job.started_at, timedelta(seconds=0.4))
+
+    def test_a_requeued_job_is_not_finished_by_its_old_worker(self):
+        def requeued_writer(output, user, params, progress):
+            # Meanwhile the job was declared stale and claimed by another worker
+            BackgroundJob.objects.filter(pk=job.pk).update(status='pending', worker='')
+            jobs.claim_next('worker-b')
+            output.write(b'stale result')
+
+        job = self._claim(requeued_writer)
+        results_before = self._results()
+        with self.assertLogs('expenses.services.jobs', 'WARNING'):
+            jobs.run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.result_file.name), ('running', 'worker-b', ''))
+        self.assertEqual(self._results(), results_before)
+
+    def test_progress_after_losing_the_claim_stops_the_writer(self):
+        written = []
+
+        def writer(output, user, params, progress):
+            BackgroundJob.objects.filter(pk=job.pk).update(status='pending', worker='')
+            for row in range(3):
+                progress(row + 1, 3)
+                written.append(row)
+
+        job = self._claim(writer)
+        with self.assertLogs('expenses.services.jobs', 'WARNING'):
+            jobs.run_job(job)
+
+        self.assertEqual(written, [])
+        self.assertEqual(BackgroundJob.objects.get(pk=job.pk).status, 'pending')
+
+
+class RescoreCommandTests(TestCase):
+    """rescore_expenses keeps the rollups exact chunk by chunk, so an interrupted run leaves nothing stale."""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+        day = date(2026, 2, 3)
+        for user, amount, description in ((self.alice, '10', 'uber'), (self.alice, '4', 'uber'),
+                                          (self.alice, '6', 'cafe'), (self.bob, '8', 'uber')):
+            Expense.objects.create(user=user, category='Food', amount=Decimal(amount), date=day,
+                                   description=description, is_auto_categorized=True)
+        checkpoint = Path(tempfile.mkdtemp()) / 'checkpoint.json'
+        self.addCleanup(shutil.rmtree, checkpoint.parent)
+        self.checkpoint = str(checkpoint)
+
+    def _predict(self, descriptions):
+        return [{'category': 'Travel' if text == 'uber' else 'Food', 'model_version': 'v2',
+                 'confidence': 0.9, 'keyword_rule': ''} for text in descriptions]
+
+    def _rescore(self, *args):
+        with mock.patch('expenses.management.commands.rescore_expenses.predict_categories', self._predict):
+            call_command('rescore_expenses', '--skip-anomalies', '--chunk-size', '2',
+                         '--checkpoint', self.checkpoint, *args, stdout=io.StringIO())
+
+    def _rollups(self):
+        return {
+            (row.kind, row.date, row.key): (row.total, row.count, row.users)
+            for row in PlatformDailyRollup.objects.filter(count__gt=0)
+        }
+
+    def assertMatchesRebuild(self):
+        rollups = self._rollups()
+        platform_rollups.rebuild()
+        self.assertEqual(rollups, self._rollups())
+
+    def test_every_chunk_moves_the_rollups(self):
+        self._rescore()
+
+        day = date(2026, 2, 3)
+        self.assertEqual(self._rollups(), {
+            ('expense', day, 'Food'): (Decimal('6'), 1, 1),
+            ('expense', day, 'Travel'): (Decimal('22'), 3, 2),
+        })
+        self.assertMatchesRebuild()
+
+    def test_an_interrupted_run_leaves_exact_rollups_and_resumes(self):
+        chunks = []
+
+        def fail_on_second_chunk(descriptions):
+            chunks.append(descriptions)
+            if len(chunks) == 2:
+                raise KeyboardInterrupt
+            return self._predict(descriptions)
+
+        with mock.patch('expenses.management.commands.rescore_expenses.predict_categories', fail_on_second_chunk):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('rescore_expenses', '--skip-anomalies', '--chunk-size', '2',
+                             '--checkpoint', self.checkpoint, stdout=io.StringIO())
+        self.assertEqual(Expense.objects.filter(category='Travel').count(), 2)
+        self.assertMatchesRebuild()
+
+        self._rescore()
+        self.assertEqual(Expense.objects.filter(category='Travel').count(), 3)
+        self.assertMatchesRebuild()
+
+    def test_dry_run_ignores_a_saved_checkpoint(self):
+        last = Expense.objects.order_by('user_id', 'id').last()
+        with open(self.checkpoint, 'w') as fh:
+            json.dump({'user_id': last.user_id, 'id': last.id, 'scanned': 4, 'changed': 0}, fh)
+        out = io.StringIO()
+
+        with mock.patch('expenses.management.commands.rescore_expenses.predict_categories', self._predict):
+            call_command('rescore_expenses', '--skip-anomalies', '--dry-run', '--checkpoint', self.checkpoint,
+                         stdout=out)
+
+        self.assertIn('Done. 4 expenses scanned, 4 would change.', out.getvalue())
+        self.assertFalse(Expense.objects.filter(category='Travel').exists())
+
+
+class TrainingSequenceTests(TestCase):
+    """Chunk-wise LSTM windows match the per-user windows they replaced."""
+
+    def setUp(self):
+        histories = {
+            'steady': [(2024, 1, 100), (2024, 2, 200), (2024, 3, 300), (2024, 4, 400), (2024, 5, 500)],
+            'gappy': [(2023, 11, 50), (2024, 2, 80), (2024, 3, 20), (2024, 7, 90), (2024, 8, 10)],
+            'short': [(2024, 1, 10), (2024, 2, 20)],
+            'sparse': [(2022, 1, 40), (2023, 1, 60)],
+        }
+        for name, months in histories.items():
+            user = User.objects.create_user(name, f'{name}@example.com', 'pw')
+            for year, month, amount in months:
+                Expense.objects.create(user=user, category='Food', amount=Decimal(amount), date=date(year, month, 3))
+                Expense.objects.create(user=user, category='Rent', amount=Decimal('1.5'), date=date(year, month, 20))
+
+    @staticmethod
+    def _per_user_windows(window_size):
+        """The per-user groupby and gap-fill loop this module replaced."""
+        X_all, y_all = [], []
+        rows = (
+            Expense.objects.annotate(month=TruncMonth('date', tzinfo=None))
+            .values('user_id', 'month').annotate(total=Sum('amount'))
+            .order_by('user_id', 'month').values_list('user_id', 'month', 'total')
+        )
+        for _user_id, months in groupby(rows, key=lambda row: row[0]):
+            months = [(month.year * 12 + month.month - 1, total) for _user_id, month, total in months]
+            totals = np.zeros(months[-1][0] - months[0][0] + 1, dtype=np.float32)
+            for index, total in months:
+                totals[index - months[0][0]] = total
+            if len(totals) <= window_size:
+                continue
+            windows = np.lib.stride_tricks.sliding_window_view(totals, window_size + 1)
+            X, y = windows[:, :window_size], windows[:, window_size]
+            scale = X.mean(axis=1)
+            usable = scale > 0
+            X_all.append((X[usable] / scale[usable, None]).astype(np.float32))
+            y_all.append((y[usable] / scale[usable]).astype(np.float32))
+        return np.concatenate(X_all), np.concatenate(y_all)
+
+    def test_matches_per_user_windows_for_every_chunk_size(self):
+        expected_X, expected_y = self._per_user_windows(3)
+        self.assertGreater(len(expected_X), 0)
+
+        for chunk_size in (1, 2, 3, 7, 100):
+            with self.subTest(chunk_size=chunk_size):
+                batches = list(sequences.iter_windows(sequences.fetch_monthly_chunks(chunk_size), 3))
+                np.testing.assert_allclose(np.concatenate([X for X, _y in batches]), expected_X, rtol=1e-6)
+                np.testing.assert_allclose(np.concatenate([y for _X, y in batches]), expected_y, rtol=1e-6)
+
+    def test_windows_never_span_two_users(self):
+        user_ids = np.array([1, 1, 1, 2, 2, 2, 2])
+        months = np.array([0, 1, 2, 3, 4, 5, 6])
+        X, y = sequences.build_windows(user_ids, months, np.arange(1, 8, dtype=np.float32), 3)
+
+        np.testing.assert_allclose(X, [[4 / 5, 1, 6 / 5]])
+        np.testing.assert_allclose(y, [7 / 5])
+
+    def test_reservoir_keeps_everything_under_the_cap(self):
+        expected_X, expected_y = self._per_user_windows(3)
+        windows = sequences.iter_windows(sequences.fetch_monthly_chunks(2), 3)
+
+        X, y, seen = sequences.sample_sequences(windows, 3, 1000, np.random.default_rng(0))
+
+        self.assertEqual(seen, len(expected_X))
+        np.testing.assert_allclose(X, expected_X, rtol=1e-6)
+        np.testing.assert_allclose(y, expected_y, rtol=1e-6)
+
+    def test_reservoir_is_bounded_and_reproducible(self):
+        def sample():
+            windows = sequences.iter_windows(sequences.generate_synthetic_chunks(np.random.default_rng(1)), 3)
+            return sequences.sample_sequences(windows, 3, 100, np.random.default_rng(2))
+
+        X, y, seen = sample()
+
+        self.assertEqual(seen, 50 * 33)
+        self.assertEqual(X.shape, (100, 3))
+        np.testing.assert_array_equal(X, sample()[0])
+
+
+@skipUnless(columnar.available(), 'pyarrow is not installed')
+class ColumnarExportTests(TestCase):
+    """Parquet exports keep every row's values, including labels outside the model's choices."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('analyst', 'analyst@example.com', 'pw')
+        for day, category, amount in ((1, 'Food', '12.34'), (2, 'Groceries', '5.00'), (3, 'Bills', '0.01'),
+                                      (4, 'Food', '100.10'), (5, 'Crypto', '7.77')):
+            Expense.objects.create(user=self.user, category=category, amount=Decimal(amount),
+                                   date=date(2026, 2, day), description=f'row {day}')
+
+    def test_round_trip_across_row_groups(self):
+        output = io.BytesIO()
+        with mock.patch.object(columnar, 'PARQUET_ROW_GROUP_SIZE', 2):
+            written = columnar.write_parquet(output, Expense.objects.all(), 'expenses')
+
+        output.seek(0)
+        parquet = columnar.pq.ParquetFile(output)
+        rows = parquet.read().to_pylist()
+        self.assertEqual(written, 5)
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        self.assertEqual(
+            [(row['date'], row['username'], row['category'], row['amount_minor']) for row in rows],
+            [
+                (date(2026, 2, 5), 'analyst', 'Crypto', 777),
+                (date(2026, 2, 4), 'analyst', 'Food', 10010),
+                (date(2026, 2, 3), 'analyst', 'Bills', 1),
+                (date(2026, 2, 2), 'analyst', 'Groceries', 500),
+                (date(2026, 2, 1), 'analyst', 'Food', 1234),
+            ],
+        )
+
+    def test_parquet_view_names_the_missing_package(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(columnar, 'pa', None):
+            response = self.client.get(reverse('download_parquet'), follow=True)
+
+        self.assertIn(columnar.MISSING_PACKAGE, [str(message) for message in response.context['messages']])
+        self.assertFalse(BackgroundJob.objects.exists())
+
+
+@skipUnless(columnar.available() and analytics_snapshot.duckdb is not None, 'pyarrow and duckdb are not installed')
+class AnalyticsSnapshotTests(TestCase):
+    """Snapshot queries agree with the live-table fallback they replace."""
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings_override = self.settings(ANALYTICS_SNAPSHOT_DIR=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for name, amounts in (('big', ['300.50', '200']), ('small', ['10.25']), ('mid', ['99.99', '0.01'])):
+            user = User.objects.create_user(name, f'{name}@example.com', 'pw')
+            for amount in amounts:
+                Expense.objects.create(user=user, category='Food', amount=Decimal(amount), date=date(2026, 1, 15))
+
+    def test_snapshot_query_matches_live_fallback(self):
+        live = analytics_service.get_top_spenders(date(2026, 1, 1))
+
+        manifest = analytics_snapshot.refresh()
+
+        self.assertEqual(manifest['rows'], {'expenses': 5, 'incomes': 0})
+        self.assertTrue(analytics_snapshot.available())
+        self.assertEqual(analytics_service.get_top_spenders(date(2026, 1, 1)), live)
+        self.assertEqual(
+            analytics_snapshot.query('SELECT SUM(amount_minor) AS total FROM expenses WHERE user_id = ?',
+                                     [User.objects.get(username='mid').pk]),
+            [{'total': 10000}],
+        )
+
+    def test_missing_duckdb_is_reported(self):
+        with mock.patch.object(analytics_snapshot, 'duckdb', None):
+            with self.assertRaisesMessage(analytics_snapshot.SnapshotUnavailable, 'duckdb'):
+                analytics_snapshot.query('SELECT 1')
+            with self.assertRaises(CommandError):
+                call_command('refresh_analytics_snapshot', stdout=io.StringIO())
+
+
+class StreamedPdfTests(TestCase):
+    """PDF reports lay out every row across several page-sized tables."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('statement', 'statement@example.com', 'pw')
+        self.rows = report_writers.PDF_ROWS_PER_TABLE * 3 + 7
+        Expense.objects.bulk_create(
+            Expense(user=self.user, category='Food', amount=Decimal('1.25'),
+                    date=date(2026, 4, 1) + timedelta(days=i % 28), description=f'item {i}')
+            for i in range(self.rows)
+        )
+
+    @staticmethod
+    def _pages(pdf):
+        return len(re.findall(rb'/Type /Page\b', pdf))
+
+    def test_user_pdf_spans_several_tables(self):
+        output, progress = io.BytesIO(), mock.Mock()
+        params = {'start_date': '2026-04-01', 'end_date': '2026-04-30', 'label': 'April'}
+
+        with mock.patch.object(report_writers.StreamingDocTemplate, 'afterFlowable', autospec=True) as placed:
+            report_writers.write_user_pdf(output, self.user, params, progress)
+
+        progress.assert_called_with(self.rows, self.rows)
+        tables = [call.args[1] for call in placed.call_args_list if isinstance(call.args[1], Table)]
+        self.assertEqual(sum(len(table._cellvalues) - 1 for table in tables), self.rows + 1)  # + total row
+        self.assertGreater(self._pages(output.getvalue()), 1)
+
+    def test_streamed_build_matches_a_materialized_build(self):
+        def story():
+            styles = getSampleStyleSheet()
+            head = [Paragraph('Report', styles['Title']), Spacer(1, 12)]
+            rows = ([f'row {i}', f'{i}.00'] for i in range(self.rows))
+            return head, report_writers._chunked_tables(rows, ['Row', 'Amount'], [100, 100],
+                                                        report_writers.USER_PDF_TABLE_STYLE)
+
+        streamed, materialized = io.BytesIO(), io.BytesIO()
+        head, tables = story()
+        report_writers.StreamingDocTemplate(streamed, pagesize=letter).build_streamed(head, tables)
+        head, tables = story()
+        SimpleDocTemplate(materialized, pagesize=letter).build(head + list(tables))
+
+        self.assertEqual(self._pages(streamed.getvalue()), self._pages(materialized.getvalue()))
+        self.assertGreater(self._pages(streamed.getvalue()), 1)
+
+
+class HyperLogLogTests(TestCase):
+    """Sketch estimates stay within the documented error, merge losslessly and survive storage."""
+
+    # 1.04 / sqrt(4096) = 1.6% standard error; 4 sigma keeps these deterministic checks far from flaky
+    ERROR_BOUND = 4 * 1.04 / (hll.HLL_REGISTERS ** 0.5)
+
+    def _sketch(self, items):
+        sketch = hll.HyperLogLog()
+        for item in items:
+            sketch.add(item)
+        return sketch
+
+    def test_estimates_within_error_bound(self):
+        for size in (1, 10, 100, 1_000, 10_000, 100_000):
+            with self.subTest(size=size):
+                estimate = self._sketch(range(size)).count()
+                self.assertLessEqual(abs(estimate - size), max(1, self.ERROR_BOUND * size))
+
+    def test_repeated_items_count_once(self):
+        self.assertEqual(self._sketch([7] * 1000 + [8] * 1000).count(), 2)
+
+    def test_merge_equals_sketch_of_union(self):
+        first, second = self._sketch(range(0, 6000)), self._sketch(range(4000, 10_000))
+
+        merged = hll.HyperLogLog.union([first, second])
+
+        np.testing.assert_array_equal(merged.registers, self._sketch(range(10_000)).registers)
+        self.assertLessEqual(abs(merged.count() - 10_000), self.ERROR_BOUND * 10_000)
+        np.testing.assert_array_equal(hll.HyperLogLog.union([second, first]).registers, merged.registers)
+
+    def test_serialization_round_trip(self):
+        sketch = self._sketch(range(500))
+
+        restored = hll.HyperLogLog.from_bytes(memoryview(sketch.to_bytes()))
+
+        np.testing.assert_array_equal(restored.registers, sketch.registers)
+        self.assertEqual(restored.count(), sketch.count())
+        self.assertTrue(restored.registers.flags.writeable)
+        self.assertLess(len(self._sketch([1, 2, 3]).to_bytes()), 100)
+        self.assertEqual(hll.HyperLogLog.from_bytes(b'').count(), 0)
+
+
+class ActiveUserSketchTests(TestCase):
+    """record() writes one shard row per user bucket; reads merge a day's shards."""
+
+    def setUp(self):
+        cache.clear()
+        self.day = date(2026, 5, 4)
+
+    def test_users_land_in_their_own_shards(self):
+        for user_id in range(1, 41):
+            active_users.record(user_id, self.day)
+
+        shards = ActiveUserSketch.objects.filter(date=self.day).values_list('shard', flat=True)
+        self.assertEqual(sorted(shards), list(range(active_users.SKETCH_SHARDS)))
+        self.assertEqual(active_users.count(self.day, self.day), 40)
+        self.assertEqual(active_users.summary(self.day)['dau'], 40)
+
+    def test_record_locks_only_the_users_shard(self):
+        with CaptureQueriesContext(connection) as queries:
+            active_users.record(5, self.day)
+
+        self.assertEqual(ActiveUserSketch.objects.get().shard, 5 % active_users.SKETCH_SHARDS)
+        self.assertTrue(any('"shard" = 5' in query['sql'] for query in queries.captured_queries))
+
+    def test_rebuild_matches_recorded_sketches(self):
+        today = timezone.localdate()
+        for i in range(20):
+            user = User.objects.create_user(f'active{i}', f'active{i}@example.com', 'pw')
+            Expense.objects.create(user=user, category='Food', amount=Decimal('1'), date=today)
+        recorded = dict(ActiveUserSketch.objects.filter(date=today).values_list('shard', 'sketch'))
+
+        active_users.rebuild(today, today)
+
+        rebuilt = dict(ActiveUserSketch.objects.filter(date=today).values_list('shard', 'sketch'))
+        self.assertEqual(len(recorded), active_users.SKETCH_SHARDS)
+        self.assertEqual({k: bytes(v) for k, v in rebuilt.items()}, {k: bytes(v) for k, v in recorded.items()})
+        self.assertEqual(active_users.count(today, today), 20)
+
+
+class ShadowEvaluatorTests(TestCase):
+    """Shadow comparisons are counted in ShadowEvalCounter rows that every process adds to."""
+
+    def setUp(self):
+        candidate = mock.Mock(classes_=np.array(['Food', 'Travel']))
+        candidate.predict_proba.return_value = np.array([[0.9, 0.1]])
+        for name, value in (('enabled', True), ('candidate_model', candidate), ('candidate_vectorizer', mock.Mock()),
+                            ('candidate_version', 'cand1'), ('_pending', {}), ('_queue', queue.Queue(maxsize=1))):
+            patcher = mock.patch.object(shadow_evaluator, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.candidate = candidate
+
+    def test_counts_are_saved_and_accumulate_across_flushes(self):
+        shadow_evaluator.evaluate('lunch', 'Food', 3.0)
+        shadow_evaluator.evaluate('taxi', 'Travel', 40.0)
+        shadow_evaluator.flush()
+        # Another process (or a later batch) adds to the same rows
+        shadow_evaluator.evaluate('dinner', 'Food', 3.5)
+        shadow_evaluator.flush()
+
+        report = shadow_evaluator.snapshot()
+        self.assertEqual((report['compared'], report['agreement_rate']), (3, 66.67))
+        self.assertEqual(report['latency']['production']['buckets']['<=5ms'], 2)
+        self.assertEqual(report['latency']['production']['buckets']['<=50ms'], 1)
+        self.assertEqual(report['latency']['production']['avg_ms'], 15.5)
+        self.assertEqual(report['latency']['candidate']['samples'], 3)
+        self.assertEqual(ShadowEvalCounter.objects.get(candidate_version='cand1', name='compared').count, 3)
+
+    def test_failures_are_counted_and_logged(self):
+        self.candidate.predict_proba.side_effect = ValueError('bad features')
+
+        with self.assertLogs('expenses.ml.shadow_evaluator', 'WARNING'):
+            shadow_evaluator.evaluate('lunch', 'Food', 3.0)
+        shadow_evaluator.flush()
+
+        report = shadow_evaluator.snapshot()
+        self.assertEqual((report['errors'], report['compared']), (1, 0))
+
+    def test_full_queue_counts_drops(self):
+        with mock.patch.object(shadow_evaluator, '_ensure_worker'):
+            shadow_evaluator.submit('lunch', 'Food', 1.0)
+            shadow_evaluator.submit('taxi', 'Travel', 1.0)
+        shadow_evaluator.flush()
+
+        report = shadow_evaluator.snapshot()
+        self.assertEqual((report['dropped'], report['pending']), (1, 1))
+
+    def test_failed_flush_keeps_counts_for_the_next_one(self):
+        shadow_evaluator.evaluate('lunch', 'Food', 3.0)
+        with mock.patch('expenses.services.counter_rows.increment', side_effect=RuntimeError('db down')):
+            with self.assertLogs('expenses.ml.shadow_evaluator', 'ERROR'):
+                shadow_evaluator.flush()
+        self.assertFalse(ShadowEvalCounter.objects.exists())
+
+        shadow_evaluator.flush()
+
+        self.assertEqual(shadow_evaluator.snapshot()['compared'], 1)
+
+
+class StaleCacheTests(TestCase):
+    """get_or_refresh serves fresh and stale entries and computes each value once."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.calls = 0
+
+    def _compute(self, value='new'):
+        def compute():
+            self.calls += 1
+            return value
+        return compute
+
+    def _store(self, key, data, age):
+        cache.set(key, {'data': data, 'computed_at': time.time() - age, 'compute_ms': 1.0}, 3600)
+
+    def _wait_for_refresh(self, key):
+        deadline = time.monotonic() + 5
+        while cache.get(stale_cache._lock_key(key)) is not None:
+            self.assertLess(time.monotonic(), deadline, 'background refresh did not finish')
+            time.sleep(0.01)
+
+    def test_fresh_hit_does_not_compute(self):
+        self._store('report', 'cached', age=10)
+
+        data, meta = stale_cache.get_or_refresh('report', self._compute(), soft_ttl=300)
+
+        self.assertEqual((data, meta['cache'], self.calls), ('cached', 'fresh', 0))
+
+    def test_stale_hits_start_exactly_one_refresh(self):
+        self._store('report', 'old', age=600)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_compute():
+            self.calls += 1
+            started.set()
+            release.wait(5)
+            return 'new'
+
+        results = [stale_cache.get_or_refresh('report', slow_compute, soft_ttl=300) for _ in range(5)]
+        self.assertTrue(started.wait(5))
+        results.append(stale_cache.get_or_refresh('report', slow_compute, soft_ttl=300))
+        release.set()
+        self._wait_for_refresh('report')
+
+        self.assertEqual({(data, meta['cache']) for data, meta in results}, {('old', 'stale')})
+        self.assertEqual(self.calls, 1)
+        data, meta = stale_cache.get_or_refresh('report', slow_compute, soft_ttl=300)
+        self.assertEqual((data, meta['cache'], self.calls), ('new', 'fresh', 1))
+
+    def test_cold_miss_computes_and_stores(self):
+        data, meta = stale_cache.get_or_refresh('report', self._compute(), soft_ttl=300)
+
+        self.assertEqual((data, meta['cache'], self.calls), ('new', 'miss', 1))
+        self.assertIsNone(cache.get(stale_cache._lock_key('report')))
+        self.assertEqual(stale_cache.get_or_refresh('report', self._compute(), soft_ttl=300)[1]['cache'], 'fresh')
+
+    def test_cold_miss_waits_for_the_lock_holder(self):
+        cache.add(stale_cache._lock_key('report'), True, 60)
+        threading.Timer(0.1, self._store, args=('report', 'theirs', 0)).start()
+
+        data, meta = stale_cache.get_or_refresh('report', self._compute(), soft_ttl=300)
+
+        self.assertEqual((data, meta['cache'], self.calls), ('theirs', 'coalesced', 0))
+
+
+class PartitionPlanTests(TestCase):
+    """plan_partitions cuts the rollup day counts into balanced, contiguous date ranges."""
+
+    DAYS = {date(2026, 3, day): count for day, count in
+            ((1, 5), (2, 30), (3, 10), (5, 20), (8, 15), (9, 25), (12, 10), (14, 40), (15, 5), (20, 20))}
+
+    def setUp(self):
+        PlatformDailyRollup.objects.all().delete()
+        for day, count in self.DAYS.items():
+            PlatformDailyRollup.objects.create(kind='expense', date=day, key='Food', count=count)
+        # Other kinds and keys count only when the filter selects them
+        PlatformDailyRollup.objects.create(kind='expense', date=date(2026, 3, 3), key='Bills', count=100)
+        PlatformDailyRollup.objects.create(kind='income', date=date(2026, 3, 3), key='Salary', count=100)
+
+    def _rows_per_range(self, ranges, days):
+        return [
+            sum(count for day, count in days.items() if (start is None or day >= start) and (end is None or day <= end))
+            for start, end in ranges
+        ]
+
+    def _assert_contiguous(self, ranges, start_date, end_date):
+        self.assertEqual((ranges[0][1], ranges[-1][0]), (end_date, start_date))
+        for (newer_start, _end), (_start, older_end) in zip(ranges, ranges[1:]):
+            self.assertEqual(older_end, newer_start - timedelta(days=1))
+
+    def test_partitions_are_balanced(self):
+        filters = {'start_date': None, 'end_date': None, 'category': 'Food'}
+
+        ranges = parallel_export.plan_partitions(filters, 4)
+
+        rows = self._rows_per_range(ranges, self.DAYS)
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(sum(rows), sum(self.DAYS.values()))
+        # No part overshoots the even share by more than its last day
+        self.assertLessEqual(max(rows) - sum(rows) / 4, max(self.DAYS.values()))
+
+    def test_ranges_cover_the_filter_bounds_without_gaps(self):
+        filters = {'start_date': date(2026, 3, 2), 'end_date': date(2026, 3, 14), 'category': 'Food'}
+
+        ranges = parallel_export.plan_partitions(filters, 3)
+
+        inside = {day: count for day, count in self.DAYS.items() if date(2026, 3, 2) <= day <= date(2026, 3, 14)}
+        self._assert_contiguous(ranges, date(2026, 3, 2), date(2026, 3, 14))
+        self.assertEqual(sum(self._rows_per_range(ranges, inside)), sum(inside.values()))
+        for start, end in ranges:
+            self.assertLessEqual(start, end)
+
+    def test_open_ended_filters_leave_outer_bounds_open(self):
+        ranges = parallel_export.plan_partitions({'start_date': None, 'end_date': None, 'category': None}, 3)
+
+        self.assertEqual(len(ranges), 3)
+        self._assert_contiguous(ranges, None, None)
+        # Without a category filter the 100 Bills rows on 2026-03-03 are counted too
+        days = {**self.DAYS, date(2026, 3, 3): self.DAYS[date(2026, 3, 3)] + 100}
+        self.assertEqual(sum(self._rows_per_range(ranges, days)), sum(days.values()))
+
+    def test_no_rows_gives_one_open_range(self):
+        PlatformDailyRollup.objects.all().delete()
+
+        ranges = parallel_export.plan_partitions({'start_date': None, 'end_date': date(2026, 3, 31)}, 4)
+
+        self.assertEqual(ranges, [(None, date(2026, 3, 31))])
+
+
+@override_settings(EXPORT_PARALLEL_MIN_ROWS=1)
+class ParallelExportTests(TestCase):
+    """A 2-worker partitioned export writes the same file as the serial one."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('auditor', 'auditor@example.com', 'pw')
+        for index in range(40):
+            Expense.objects.create(user=self.user, category=('Food', 'Bills', 'Travel')[index % 3],
+                                   amount=Decimal(index) + Decimal('0.25'), date=date(2026, 1, 1) + timedelta(days=index % 17),
+                                   description=f'row {index}')
+        self.params = {'start_date': '2026-01-02', 'end_date': '', 'category': ''}
+        self.rows = Expense.objects.filter(date__gte=date(2026, 1, 2)).count()
+
+    def _export(self, writer, workers):
+        output, reported = io.BytesIO(), []
+
+        def progress(done, total, partitions=None):
+            if partitions:
+                reported.append(partitions)
+
+        with self.settings(EXPORT_PARALLEL_WORKERS=workers):
+            writer(output, self.user, self.params, progress)
+        return output.getvalue(), reported
+
+    def test_csv_matches_serial_export(self):
+        serial, serial_parts = self._export(report_writers.write_admin_csv, 1)
+        parallel, parallel_parts = self._export(report_writers.write_admin_csv, 2)
+
+        self.assertEqual(serial_parts, [])
+        self.assertEqual(len(parallel_parts[-1]), 2)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel.decode('utf-8').count('\n'), self.rows + 1)
+
+    @skipUnless(columnar.available(), 'pyarrow is not installed')
+    def test_parquet_matches_serial_export(self):
+        serial, _parts = self._export(report_writers.write_admin_parquet, 1)
+        parallel, parallel_parts = self._export(report_writers.write_admin_parquet, 2)
+
+        self.assertEqual(len(parallel_parts[-1]), 2)
+        self.assertTrue(all(part['done'] for part in parallel_parts[-1]))
+        read = lambda data: columnar.pq.read_table(io.BytesIO(data)).to_pylist()
+        self.assertEqual(read(parallel), read(serial))
+        self.assertEqual(len(read(parallel)), self.rows)
+
+
+def _at(year, month, day):
+    return timezone.make_aware(datetime(year, month, day, 12))
+
+
+class UserCohortTests(TestCase):
+    def _user(self, username, joined, last_login=None):
+        user = User.objects.create_user(username, f'{username}@example.com', 'pw', date_joined=joined)
+        if last_login:
+            user.last_login = last_login
+            user.save(update_fields=['last_login'])
+        return user
+
+    def _cohorts(self):
+        return {
+            (row.join_date, row.active_month): row.users
+            for row in UserCohort.objects.filter(users__gt=0)
+        }
+
+    def test_login_moves_the_user_between_cohorts(self):
+        user = self._user('mover', _at(2026, 1, 10))
+        self.assertEqual(self._cohorts(), {(date(2026, 1, 10), None): 1})
+
+        user.last_login = _at(2026, 3, 5)
+        user.save(update_fields=['last_login'])
+        self.assertEqual(self._cohorts(), {(date(2026, 1, 10), date(2026, 3, 1)): 1})
+
+        user.delete()
+        self.assertEqual(self._cohorts(), {})
+
+    def test_move_is_a_no_op_for_the_same_key(self):
+        key = (date(2026, 1, 10), None)
+        user_cohorts.adjust(key, 1)
+        user_cohorts.move(key, key)
+        self.assertEqual(self._cohorts(), {key: 1})
+
+    def test_incremental_counts_match_rebuild(self):
+        self._user('a', _at(2026, 1, 10), _at(2026, 3, 5))
+        self._user('b', _at(2026, 1, 10))
+        self._user('c', _at(2026, 2, 15), _at(2026, 2, 20))
+        incremental = self._cohorts()
+
+        user_cohorts.rebuild()
+        self.assertEqual(self._cohorts(), incremental)
+
+    def test_retention_rate(self):
+        self._user('a', _at(2026, 1, 10), _at(2026, 3, 5))
+        self._user('b', _at(2026, 1, 20))
+        self._user('c', _at(2026, 2, 15), _at(2026, 2, 20))
+
+        # Feb: a and b joined earlier, a is still active -> 50%.
+        # Mar: a, b and c joined earlier, only a logged in since -> 33.33%.
+        self.assertEqual(analytics_service.get_retention_rate(), [
+            {'month': 'Jan 2026', 'retention': 0},
+            {'month': 'Feb 2026', 'retention': 50.0},
+            {'month': 'Mar 2026', 'retention': 33.33},
+        ])
+
+    def test_adjust_survives_a_concurrent_insert(self):
+        key = (date(2026, 1, 10), None)
+        real_atomic = transaction.atomic
+        raced = []
+
+        def atomic_after_other_writer(*args, **kwargs):
+            if not raced:
+                # Another request creates the same row between our UPDATE and INSERT
+                raced.append(True)
+                UserCohort.objects.create(join_date=key[0], join_month=date(2026, 1, 1), users=1)
+            return real_atomic(*args, **kwargs)
+
+        with mock.patch('django.db.transaction.atomic', atomic_after_other_writer):
+            user_cohorts.adjust(key, 1)
+
+        self.assertTrue(raced)
+        self.assertEqual(UserCohort.objects.filter(join_date=key[0]).count(), 1)
+        self.assertEqual(self._cohorts(), {key: 2})
+
+
+class DerivedTotalsTests(TestCase):
+    """Rollups and user totals maintained on write agree with a rebuild from the source tables."""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+        self.day = date(2026, 3, 10)
+
+    def _rollups(self):
+        return {
+            (row.kind, row.date, row.key): (row.total, row.count, row.users)
+            for row in PlatformDailyRollup.objects.filter(count__gt=0)
+        }
+
+    def _totals(self):
+        return {
+            profile.user_id: (profile.total_spent, profile.expense_count, profile.last_expense_date)
+            for profile in Profile.objects.all()
+        }
+
+    def assertMatchesRebuild(self):
+        rollups, totals = self._rollups(), self._totals()
+        platform_rollups.rebuild()
+        user_totals.rebuild()
+        self.assertEqual(rollups, self._rollups())
+        self.assertEqual(totals, self._totals())
+
+    def test_writes_keep_derived_tables_exact(self):
+        first = Expense.objects.create(user=self.alice, category='Food', amount=Decimal('10'), date=self.day)
+        Expense.objects.create(user=self.alice, category='Food', amount=Decimal('5'), date=self.day)
+        later = Expense.objects.create(user=self.bob, category='Food', amount=Decimal('7'),
+                                       date=self.day + timedelta(days=3))
+        Income.objects.create(user=self.bob, source='Salary', amount=Decimal('100'), date=self.day)
+        self.assertEqual(self._rollups()[('expense', self.day, 'Food')], (Decimal('15'), 2, 1))
+        self.assertMatchesRebuild()
+
+        first.amount = Decimal('12')
+        first.save()
+        self.assertMatchesRebuild()
+
+        # Moving bob's latest expense earlier lowers his last expense date
+        later.date = self.day - timedelta(days=1)
+        later.category = 'Travel'
+        later.save()
+        self.assertEqual(Profile.objects.get(user=self.bob).last_expense_date, self.day - timedelta(days=1))
+        self.assertMatchesRebuild()
+
+        first.user = self.bob
+        first.save()
+        self.assertMatchesRebuild()
+
+        first.delete()
+        self.assertMatchesRebuild()
+
+    def test_an_update_without_a_stored_snapshot_is_recomputed(self):
+        expense = Expense.objects.create(user=self.alice, category='Food', amount=Decimal('10'), date=self.day)
+        expense = Expense.objects.get(pk=expense.pk)
+        expense.amount = Decimal('25')
+        pre_save.disconnect(signals.remember_rollup_state, sender=Expense)
+        try:
+            expense.save()
+        finally:
+            pre_save.connect(signals.remember_rollup_state, sender=Expense)
+
+        self.assertEqual(Profile.objects.get(user=self.alice).total_spent, Decimal('25'))
+        self.assertEqual(self._rollups()[('expense', self.day, 'Food')], (Decimal('25'), 1, 1))
+        self.assertMatchesRebuild()
+
+    def test_a_failed_write_leaves_no_derived_changes(self):
+        Expense.objects.create(user=self.alice, category='Food', amount=Decimal('10'), date=self.day)
+        before = self._rollups(), self._totals()
+
+        with mock.patch('expenses.services.spend_counters.record_change', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Expense.objects.create(user=self.alice, category='Food', amount=Decimal('3'), date=self.day)
+
+        self.assertEqual(Expense.objects.count(), 1)
+        self.assertEqual((self._rollups(), self._totals()), before)
+
+
+class MetricsSeriesTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+        for user, amount, day, category in [
+            (self.alice, '100', date(2026, 1, 5), 'Food'),
+            (self.alice, '50', date(2026, 1, 20), 'Travel'),
+            (self.alice, '300', date(2026, 3, 2), 'Food'),
+            (self.bob, '40', date(2026, 1, 6), 'Food'),
+            (self.bob, '60', date(2026, 3, 30), 'Food'),
+        ]:
+            Expense.objects.create(user=user, category=category, amount=Decimal(amount), date=day)
+
+    def _values(self, points, key='value'):
+        return [(p['label'], p[key]) for p in points]
+
+    def test_user_series_is_one_query_with_gaps_filled(self):
+        with self.assertNumQueries(1):
+            points = metrics.series('expense', user=self.alice, derived=('growth', 'moving_average'), window=2)
+
+        self.assertEqual(self._values(points), [('Jan 2026', 150.0), ('Feb 2026', 0.0), ('Mar 2026', 300.0)])
+        self.assertEqual(self._values(points, 'growth'), [('Jan 2026', 0), ('Feb 2026', -100.0), ('Mar 2026', 0)])
+        self.assertEqual(self._values(points, 'moving_average'),
+                         [('Jan 2026', 150.0), ('Feb 2026', 75.0), ('Mar 2026', 150.0)])
+
+    def test_platform_sum_and_count_read_the_rollups(self):
+        with CaptureQueriesContext(connection) as queries:
+            totals = metrics.series('expense', category='Food')
+            counts = metrics.series('expense', metric='count', category='Food')
+
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertIn('expenses_platformdailyrollup', query['sql'])
+            self.assertNotIn('expenses_expense', query['sql'])
+
+        self.assertEqual(self._values(totals), [('Jan 2026', 140.0), ('Feb 2026', 0.0), ('Mar 2026', 360.0)])
+        self.assertEqual(self._values(counts), [('Jan 2026', 2.0), ('Feb 2026', 0.0), ('Mar 2026', 2.0)])
+
+    def test_distinct_users_per_week_within_bounds(self):
+        points = metrics.series('expense', metric='distinct', granularity='week',
+                                start_date=date(2026, 1, 1), end_date=date(2026, 1, 14))
+
+        # 2026-01-01 is a Thursday; weeks start on Monday and are cut at the bounds
+        self.assertEqual(self._values(points), [
+            ('Week of 29 Dec 2025', 0.0), ('Week of 05 Jan 2026', 2.0), ('Week of 12 Jan 2026', 0.0),
+        ])
+
+    def test_combine_aligns_series_on_one_calendar(self):
+        Income.objects.create(user=self.bob, source='Salary', amount=Decimal('500'), date=date(2026, 4, 1))
+        rows = metrics.combine('month', {
+            'expense': metrics.series('expense', user=self.bob),
+            'income': metrics.series('income', user=self.bob),
+        })
+
+        self.assertEqual([(row['label'], row['expense'], row['income']) for row in rows], [
+            ('Jan 2026', 40.0, 0.0), ('Feb 2026', 0.0, 0.0), ('Mar 2026', 60.0, 0.0), ('Apr 2026', 0.0, 500.0),
+        ])
+
+    def test_unknown_arguments_are_rejected(self):
+        for kwargs in ({'source': 'bills'}, {'metric': 'median'}, {'granularity': 'year'},
+                       {'source': 'signups', 'metric': 'count'}, {'derived': ('trend',)}):
+            with self.subTest(**kwargs), self.assertRaises(ValueError):
+                metrics.series(**kwargs)
+
+
+class AdminInsightTests(TestCase):
+    def test_inactive_users_leave_out_disabled_accounts(self):
+        User.objects.create_user('active', 'active@example.com', 'pw')
+        User.objects.create_user('idle', 'idle@example.com', 'pw')
+        User.objects.create_user('disabled', 'disabled@example.com', 'pw', is_active=False)
+
+        with mock.patch('expenses.services.active_users.count', return_value=1):
+            self.assertEqual(admin_insights.InsightContext().inactive_users, 1)
+
+    def test_failing_rules_are_logged(self):
+        def broken(ctx):
+            raise ZeroDivisionError
+
+        with mock.patch.object(admin_insights, 'INSIGHT_RULES', [broken]), \
+                self.assertLogs('expenses.utils.admin_insights', level='ERROR') as logs:
+            rows = admin_insights.refresh_admin_insights()
+
+        self.assertEqual([row.message for row in rows], ["Error loading insights"])
+        self.assertIn('broken', logs.output[0])
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class ManageUsersListTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        for n in range(30):
+            user = User.objects.create_user(f'user{n:02d}', f'user{n:02d}@example.com', 'pw')
+            Profile.objects.filter(user=user).update(total_spent=Decimal(n % 4))
+        self.client.force_login(self.admin)
+
+    def test_page_count_is_exact_when_cohort_counters_drift(self):
+        UserCohort.objects.update(users=0)
+
+        response = self.client.get(reverse('admin_manage_users'), {'page': 2})
+
+        self.assertEqual(response.context['page_obj'].paginator.count, 31)
+        self.assertEqual(len(response.context['users']), 6)
+
+    def test_sorting_pages_through_every_user_once(self):
+        for sort in ('total_spent', '-total_spent', 'date_joined', '-last_login'):
+            seen = []
+            for page in (1, 2):
+                response = self.client.get(reverse('admin_manage_users'), {'sort': sort, 'page': page})
+                seen.extend(user.username for user in response.context['users'])
+            with self.subTest(sort=sort):
+                self.assertEqual(len(seen), 31)
+                self.assertEqual(len(set(seen)), 31)
+
+        response = self.client.get(reverse('admin_manage_users'), {'sort': '-total_spent'})
+        spent = [user.profile.total_spent for user in response.context['users']]
+        self.assertEqual(spent, sorted(spent, reverse=True))
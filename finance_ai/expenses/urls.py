@@ -11,6 +11,12 @@ urlpatterns = [
     path('expenses/<int:pk>/delete/', views.delete_expense, name='delete_expense'),
     path('expenses/download/csv/', views.download_expenses_csv, name='download_csv'),
     path('expenses/download/pdf/', views.download_expenses_pdf, name='download_pdf'),
+    path('expenses/download/parquet/', views.download_parquet, name='download_parquet'),
+
+    # Background exports
+    path('exports/<int:pk>/', views.export_job, name='export_job'),
+    path('exports/<int:pk>/status/', views.export_job_status, name='export_job_status'),
+    path('exports/<int:pk>/download/', views.export_job_download, name='export_job_download'),
 
     path('income/', views.income_list, name='income_list'),
     path('income/add/', views.add_income, name='add_income'),
@@ -33,6 +39,7 @@ urlpatterns = [
     path('budget/add/', views.add_budget, name='add_budget'),
     path('budget/<int:pk>/edit/', views.edit_budget, name='edit_budget'),
     path('budget/<int:pk>/delete/', views.delete_budget, name='delete_budget'),
+    path('budget/alerts/<str:category>/dismiss/', views.dismiss_budget_alert, name='dismiss_budget_alert'),
 
     # AI Budget Optimizer
     path('ai/budget-analysis/', views.ai_budget_analysis, name='ai_budget_analysis'),
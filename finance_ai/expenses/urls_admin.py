@@ -9,8 +9,12 @@ from . import views_admin
 urlpatterns = [
     path('', views_admin.admin_dashboard, name='admin_dashboard'),
     path('users/', views_admin.manage_users, name='admin_manage_users'),
+    path('users/statements/', views_admin.user_statements, name='admin_user_statements'),
+    path('users/bulk/', views_admin.bulk_user_action, name='admin_bulk_users'),
+    path('users/import/', views_admin.import_users, name='admin_import_users'),
     path('reports/', views_admin.reports, name='admin_reports'),
     path('analytics-data/', views_admin.admin_analytics_data, name='admin_analytics'),
+    path('ml-shadow/', views_admin.ml_shadow_report, name='admin_ml_shadow'),
     # Redirect removed "Manage Expenses" URL to admin dashboard
     path('expenses/', RedirectView.as_view(pattern_name='admin_dashboard', permanent=False)),
 ]
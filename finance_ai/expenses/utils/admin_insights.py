@@ -1,90 +1,179 @@
-from django.utils.timezone import now
+import logging
 from datetime import timedelta
-from django.db.models import Sum, Count
-from expenses.models import Expense
+from decimal import Decimal
+from functools import cached_property
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from expenses.models import AdminInsight, UserCohort
+from expenses.services import platform_rollups, active_users
+
+logger = logging.getLogger(__name__)
+
+# Registered insight rules, in display order. Each takes an InsightContext and
+# returns {'type', 'icon', 'message'} or None to show nothing.
+INSIGHT_RULES = []
+
+
+def insight_rule(func):
+    """Register an admin insight rule; the function name is its stored id."""
+    INSIGHT_RULES.append(func)
+    return func
+
+
+class InsightContext:
+    """
+    Shared, memoized inputs for insight rules, read from the platform rollups.
+    Rules should add a property here rather than query the raw tables, so a
+    new rule costs at most one more small query.
+    """
+
+    def __init__(self, today=None):
+        self.today = today or timezone.localdate()
+        self.current_month_start = self.today.replace(day=1)
+        self.previous_month_end = self.current_month_start - timedelta(days=1)
+        self.previous_month_start = self.previous_month_end.replace(day=1)
+        self._expense_totals = {}
+
+    def expense_total(self, start_date, end_date):
+        """Platform expense total for [start_date, end_date] from the daily rollups."""
+        key = (start_date, end_date)
+        if key not in self._expense_totals:
+            self._expense_totals[key] = (
+                platform_rollups.rollups('expense', start_date)
+                .filter(date__lte=end_date)
+                .aggregate(total=Sum('total'))['total'] or Decimal('0')
+            )
+        return self._expense_totals[key]
+
+    @cached_property
+    def current_month_expense(self):
+        return self.expense_total(self.current_month_start, self.today)
+
+    @cached_property
+    def previous_month_expense(self):
+        return self.expense_total(self.previous_month_start, self.previous_month_end)
+
+    @cached_property
+    def category_totals(self):
+        return platform_rollups.totals_by_key('expense')
+
+    @cached_property
+    def inactive_users(self):
+        # Enabled accounts minus the users active (login or transaction) in the
+        # last 7 days, merged from the daily sketches. Deactivated accounts are
+        # not expected to log in and are left out: the account total comes from
+        # the cohort table and the few disabled ones from a partial index
+        accounts = UserCohort.objects.aggregate(total=Sum('users'))['total'] or 0
+        accounts -= User.objects.filter(is_active=False).count()
+        return max(0, accounts - active_users.count(self.today - timedelta(days=6), self.today))
+
+
+# -----------------------------
+# 1. High Spending Category
+# -----------------------------
+@insight_rule
+def high_spending_category(ctx):
+    if ctx.category_totals:
+        return {
+            'type': 'warning',
+            'icon': '⚠',
+            'message': f"High spending in {ctx.category_totals[0]['key']}"
+        }
+    return {
+        'type': 'info',
+        'icon': 'ℹ',
+        'message': "No expense data available"
+    }
+
+
+# -----------------------------
+# 2. Expense Growth
+# -----------------------------
+@insight_rule
+def expense_growth(ctx):
+    current_month = ctx.current_month_expense
+    last_month = ctx.previous_month_expense
+
+    if last_month > 0:
+        change = ((current_month - last_month) / last_month) * 100
+        if change > 20:
+            return {
+                'type': 'danger',
+                'icon': '🔥',
+                'message': f"Expenses increased by {round(change,1)}%"
+            }
+        return {
+            'type': 'success',
+            'icon': '✅',
+            'message': f"Expenses stable ({round(change,1)}%)"
+        }
+    return {
+        'type': 'info',
+        'icon': 'ℹ',
+        'message': "Not enough data for growth analysis"
+    }
+
+
+# -----------------------------
+# 3. Inactive Users
+# -----------------------------
+@insight_rule
+def inactive_users(ctx):
+    if ctx.inactive_users > 0:
+        return {
+            'type': 'warning',
+            'icon': '👤',
+            'message': f"{ctx.inactive_users} inactive users detected"
+        }
+    return {
+        'type': 'success',
+        'icon': '✅',
+        'message': "All users are active"
+    }
+
+
+def refresh_admin_insights(today=None):
+    """Evaluate every registered rule and store the results with a timestamp."""
+    ctx = InsightContext(today)
+    computed_at = timezone.now()
+    rows = []
+
+    for position, rule in enumerate(INSIGHT_RULES):
+        try:
+            insight = rule(ctx)
+        except Exception:
+            logger.exception('Admin insight rule %s failed', rule.__name__)
+            insight = {
+                'type': 'danger',
+                'icon': '❌',
+                'message': "Error loading insights"
+            }
+        if insight:
+            rows.append(AdminInsight(rule=rule.__name__, position=position, computed_at=computed_at, **insight))
+
+    with transaction.atomic():
+        AdminInsight.objects.all().delete()
+        AdminInsight.objects.bulk_create(rows)
+    return rows
+
 
 def get_admin_insights():
-    today = now()
-    insights = []
-
-    try:
-        # -----------------------------
-        # 1. High Spending Category
-        # -----------------------------
-        top_category = (
-            Expense.objects
-            .values('category')
-            .annotate(total=Sum('amount'))
-            .order_by('-total')
-            .first()
-        )
-
-        if top_category:
-            insights.append({
-                'type': 'warning',
-                'icon': '⚠',
-                'message': f"High spending in {top_category['category']}"
-            })
-        else:
-            insights.append({
-                'type': 'info',
-                'icon': 'ℹ',
-                'message': "No expense data available"
-            })
-
-        # -----------------------------
-        # 2. Expense Growth
-        # -----------------------------
-        target_last_month = 12 if today.month == 1 else today.month - 1
-        
-        current_month = Expense.objects.filter(date__month=today.month).aggregate(total=Sum('amount'))['total'] or 0
-        last_month = Expense.objects.filter(date__month=target_last_month).aggregate(total=Sum('amount'))['total'] or 0
-
-        if last_month > 0:
-            change = ((current_month - last_month) / last_month) * 100
-            if change > 20:
-                insights.append({
-                    'type': 'danger',
-                    'icon': '🔥',
-                    'message': f"Expenses increased by {round(change,1)}%"
-                })
-            else:
-                insights.append({
-                    'type': 'success',
-                    'icon': '✅',
-                    'message': f"Expenses stable ({round(change,1)}%)"
-                })
-        else:
-            insights.append({
-                'type': 'info',
-                'icon': 'ℹ',
-                'message': "Not enough data for growth analysis"
-            })
-
-        # -----------------------------
-        # 3. Inactive Users
-        # -----------------------------
-        inactive_users = User.objects.filter(last_login__lt=today - timedelta(days=7)).count()
-
-        if inactive_users > 0:
-            insights.append({
-                'type': 'warning',
-                'icon': '👤',
-                'message': f"{inactive_users} inactive users detected"
-            })
-        else:
-            insights.append({
-                'type': 'success',
-                'icon': '✅',
-                'message': "All users are active"
-            })
-
-    except Exception as e:
-        insights.append({
-            'type': 'danger',
-            'icon': '❌',
-            'message': f"Error loading insights"
-        })
-
-    return insights
+    """
+    Stored insights for the admin dashboard, refreshed first when missing or
+    older than settings.ADMIN_INSIGHTS_MAX_AGE seconds.
+    """
+    stored = list(AdminInsight.objects.all())
+    oldest = min((row.computed_at for row in stored), default=None)
+    max_age = timedelta(seconds=settings.ADMIN_INSIGHTS_MAX_AGE)
+    if oldest is None or timezone.now() - oldest > max_age:
+        stored = refresh_admin_insights()
+
+    return [
+        {'type': row.type, 'icon': row.icon, 'message': row.message, 'computed_at': row.computed_at}
+        for row in stored
+    ]
@@ -1,4 +1,3 @@
-import csv
 from datetime import date, timedelta, datetime
 from calendar import month_name
 from decimal import Decimal
@@ -16,14 +15,9 @@ def _invalidate_ai_cache(user) -> None:
     cache.delete(f'ai_budget_{user.pk}')
 from django.contrib.auth.views import LoginView
 from django.db.models import Sum, F
-from django.db.models.functions import TruncMonth
 from django.shortcuts import get_object_or_404, redirect, render
-from django.http import HttpResponse, HttpResponseForbidden
-
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, FileResponse, Http404
+from django.urls import reverse
 
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
@@ -32,12 +26,14 @@ from .forms import (
     SavingGoalForm, DepositForm, BillForm, BudgetForm,
     UserUpdateForm, ProfileUpdateForm
 )
-from .models import Expense, Income, SavingGoal, Bill, Budget, Profile
+from .models import Expense, Income, SavingGoal, Bill, Budget, Profile, BackgroundJob
 from .utils.smart_features import categorize_expense, detect_anomaly as rule_based_anomaly, generate_suggestions
 from expenses.ml.predictors.lstm_predictor import predict_next_month
-from expenses.ml.predictors.category_predictor import predict_category
+from expenses.ml.predictors.category_predictor import predict_category_details
 from expenses.ml.predictors.anomaly_predictor import detect_anomaly as ml_anomaly
 from expenses.services.insight_engine import generate_insights, generate_financial_summary
+from expenses.services import metrics, jobs, columnar, spend_counters
+from expenses.services import budget_alerts as budget_alerts_service
 
 
 def get_date_range(range_type, start_str=None, end_str=None):
@@ -101,6 +97,12 @@ def get_comparison_stats(user_expenses, start_date, end_date, current_total):
 		if current_total > 0: return "100% higher than previous period", "danger", "up"
 		return "No data in previous period", "secondary", "dash"
 
+def _set_prediction_provenance(expense, detected):
+	"""Record (or clear) the model version, confidence and keyword rule behind a category."""
+	expense.model_version = detected['model_version'] if detected else ''
+	expense.prediction_confidence = detected['confidence'] if detected else None
+	expense.keyword_rule = detected['keyword_rule'] if detected else ''
+
 def is_regular_user(user):
 	"""Check if user is a regular user (not admin/staff)."""
 	return not (user.is_staff or user.is_superuser)
@@ -307,35 +309,13 @@ def dashboard(request):
 	category_labels = [row['category'] for row in category_summary_qs]
 	category_values = [float(row['total']) for row in category_summary_qs]
 
-	trend_qs = (
-		month_expenses.annotate(m=TruncMonth('date', tzinfo=None))
-		.values('m')
-		.annotate(total=Sum('amount'))
-		.order_by('m')
-	)
-	income_trend_qs = (
-		month_incomes.annotate(m=TruncMonth('date', tzinfo=None))
-		.values('m')
-		.annotate(total=Sum('amount'))
-		.order_by('m')
-	)
-
-	trend_dict = {}
-	for row in trend_qs:
-		month_key = f"{month_name[row['m'].month]} {row['m'].year}"
-		trend_dict[month_key] = {'expense': float(row['total']), 'income': 0.0, 'm': row['m']}
-
-	for row in income_trend_qs:
-		month_key = f"{month_name[row['m'].month]} {row['m'].year}"
-		if month_key not in trend_dict:
-			trend_dict[month_key] = {'expense': 0.0, 'income': float(row['total']), 'm': row['m']}
-		else:
-			trend_dict[month_key]['income'] = float(row['total'])
-
-	sorted_months = sorted(trend_dict.values(), key=lambda x: x['m'])
-	trend_labels = [f"{month_name[row['m'].month]}" for row in sorted_months]
-	trend_values = [row['expense'] for row in sorted_months]
-	income_trend_values = [row['income'] for row in sorted_months]
+	trend_rows = metrics.combine('month', {
+		'expense': metrics.series('expense', user=request.user, start_date=start_date, end_date=end_date),
+		'income': metrics.series('income', user=request.user, start_date=start_date, end_date=end_date),
+	})
+	trend_labels = [f"{month_name[row['period'].month]}" for row in trend_rows]
+	trend_values = [row['expense'] for row in trend_rows]
+	income_trend_values = [row['income'] for row in trend_rows]
 
 	# Current month display via string identifier 
 	current_month = current_month_label
@@ -358,11 +338,22 @@ def dashboard(request):
 		due_date__lte=today + timedelta(days=30)
 	).order_by('due_date')[:5]
 
-	# Budget teaser: enrich all budgets, surface warning/danger for dashboard
+	# Budget teaser: thresholds crossed this month were recorded when the expenses
+	# were written (services/budget_alerts.py); only those categories are shown
 	budgets_qs = Budget.objects.filter(user=request.user)
-	budget_enriched = _enrich_budgets(budgets_qs, request.user, today)
-	budget_alerts = [e for e in budget_enriched if e['status'] in ('warning', 'danger')][:3]
-	budget_set = len(budget_enriched) > 0
+	active_alerts = {alert.category: alert for alert in budget_alerts_service.active(request.user, today)}
+	budget_alerts = []
+	if active_alerts:
+		enriched_by_cat = {
+			item['obj'].category: item
+			for item in _enrich_budgets(budgets_qs.filter(category__in=active_alerts), request.user, today)
+		}
+		# Skip categories whose spend has since dropped back (e.g. an expense was deleted)
+		budget_alerts = [
+			dict(enriched_by_cat[cat], alert=alert) for cat, alert in active_alerts.items()
+			if cat in enriched_by_cat and enriched_by_cat[cat]['status'] != 'safe'
+		][:3]
+	budget_set = budgets_qs.exists()
 
 	context = {
 		'total_month': total_month,
@@ -476,13 +467,14 @@ def add_expense(request):
 			
 			# Phase 3: ML Auto Categorization with Phase 2 Fallback
 			if not expense.category:
-				detected = predict_category(expense.description)
+				detected = predict_category_details(expense.description)
 				
 				# ML Predicted
 				if detected:
-					expense.category = detected
+					expense.category = detected['category']
 					expense.is_auto_categorized = True
 					expense.is_ml_predicted = True
+					_set_prediction_provenance(expense, detected)
 				else:
 					# Fallback to Phase 2 rule-based keyword mapping
 					detected_rule = categorize_expense(expense.description)
@@ -494,9 +486,11 @@ def add_expense(request):
 						expense.category = 'Others'  # Default fallback
 						expense.is_auto_categorized = False
 						expense.is_ml_predicted = False
+					_set_prediction_provenance(expense, None)
 			else:
 				expense.is_auto_categorized = False
 				expense.is_ml_predicted = False
+				_set_prediction_provenance(expense, None)
 				
 			# Phase 3: ML Anomaly Detection Filter
 			expense.is_anomaly = ml_anomaly(expense.amount)
@@ -525,12 +519,13 @@ def edit_expense(request, pk: int):
 			
 			# Phase 3: ML Auto Categorization (evaluate if category set to empty "Auto Detect" by user)
 			if not expense.category:
-				detected = predict_category(expense.description)
+				detected = predict_category_details(expense.description)
 				
 				if detected:
-					expense.category = detected
+					expense.category = detected['category']
 					expense.is_auto_categorized = True
 					expense.is_ml_predicted = True
+					_set_prediction_provenance(expense, detected)
 				else:
 					detected_rule = categorize_expense(expense.description)
 					if detected_rule:
@@ -541,10 +536,12 @@ def edit_expense(request, pk: int):
 						expense.category = 'Others'
 						expense.is_auto_categorized = False
 						expense.is_ml_predicted = False
+					_set_prediction_provenance(expense, None)
 			else:
 				# If user explicitly left a category, or changed it from Auto Detected to manual
 				expense.is_auto_categorized = False
 				expense.is_ml_predicted = False
+				_set_prediction_provenance(expense, None)
 				
 			# Phase 3: ML Anomaly Detection (Re-evaluate anomaly on edit)
 			expense.is_anomaly = ml_anomaly(expense.amount)
@@ -671,113 +668,83 @@ def delete_income(request, pk: int):
 	# Actually, I'll update confirm_delete.html to be generic if needed, but let's just pass 'income' and fix the template context.
 	return render(request, 'confirm_delete_income.html', {'income': income})
 
-@login_required
-@user_passes_test(is_regular_user, redirect_field_name=None)
-def download_expenses_csv(request):
-	"""Generates and downloads a CSV of the user's expenses securely."""
-	if request.user.is_staff or request.user.is_superuser:
-		return redirect('admin_dashboard')
-		
-	# Filtering
+def _enqueue_user_export(request, kind, extension, dataset='expenses'):
+	"""Export the user's expenses (or incomes) for the selected period, queued when large."""
 	range_type = request.GET.get('range', 'current')
 	start_str = request.GET.get('start_date')
 	end_str = request.GET.get('end_date')
-	start_date, end_date, _ = get_date_range(range_type, start_str, end_str)
+	start_date, end_date, label = get_date_range(range_type, start_str, end_str)
 
-	# Single-user isolation securely constrained	
-	expenses = Expense.objects.filter(user=request.user, date__gte=start_date, date__lte=end_date).order_by('-date', '-id')
-	
 	current_date = date.today().strftime('%Y-%m-%d')
-	filename = f"expenses_{request.user.username}_{current_date}.csv"
-	
-	response = HttpResponse(content_type='text/csv')
-	response['Content-Disposition'] = f'attachment; filename="{filename}"'
-	
-	writer = csv.writer(response)
-	writer.writerow(['Date', 'Category', 'Amount', 'Description'])
-	
-	for expense in expenses:
-		writer.writerow([
-			expense.date.strftime('%Y-%m-%d'),
-			expense.category,
-			f"{expense.amount:.2f}",
-			expense.description
-		])
-		
-	return response
+	params = {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(), 'label': label, 'dataset': dataset}
+	filename = f"{dataset}_{request.user.username}_{current_date}.{extension}"
+	# Small exports download straight away; only large ones wait for the worker
+	output = jobs.run_inline(request.user, kind, params)
+	if output is not None:
+		return FileResponse(output, as_attachment=True, filename=filename)
+	job = jobs.enqueue(request.user, kind, params, filename)
+	return redirect('export_job', pk=job.pk)
+
+@login_required
+@user_passes_test(is_regular_user, redirect_field_name=None)
+def download_expenses_csv(request):
+	"""CSV of the user's expenses; large ones are queued and the job page offers the download."""
+	if request.user.is_staff or request.user.is_superuser:
+		return redirect('admin_dashboard')
+	return _enqueue_user_export(request, 'user_csv', 'csv')
 
 @login_required
 @user_passes_test(is_regular_user, redirect_field_name=None)
 def download_expenses_pdf(request):
-	"""Generates and downloads a formatted PDF report securely."""
+	"""Formatted PDF report; large ones are queued and the job page offers the download."""
 	if request.user.is_staff or request.user.is_superuser:
 		return redirect('admin_dashboard')
-		
-	# Filtering
-	range_type = request.GET.get('range', 'current')
-	start_str = request.GET.get('start_date')
-	end_str = request.GET.get('end_date')
-	start_date, end_date, label = get_date_range(range_type, start_str, end_str)
+	return _enqueue_user_export(request, 'user_pdf', 'pdf')
 
-	# Single-user isolation securely constrained
-	expenses = Expense.objects.filter(user=request.user, date__gte=start_date, date__lte=end_date).order_by('-date', '-id')
-	
-	current_date = date.today().strftime('%Y-%m-%d')
-	filename = f"expenses_{request.user.username}_{current_date}.pdf"
-	
-	response = HttpResponse(content_type='application/pdf')
-	response['Content-Disposition'] = f'attachment; filename="{filename}"'
-	
-	# Instantiate reportlab engine
-	doc = SimpleDocTemplate(response, pagesize=letter)
-	elements = []
-	styles = getSampleStyleSheet()
-	
-	title = Paragraph(f"Expense Report - {request.user.username}", styles['Title'])
-	elements.append(title)
-	
-	filter_context = Paragraph(f"Period: {label}", styles['Normal'])
-	elements.append(filter_context)
-	
-	date_p = Paragraph(f"Report Generated: {current_date}", styles['Normal'])
-	elements.append(date_p)
-	elements.append(Spacer(1, 12))
-	
-	data = [['Date', 'Category', 'Amount (Rs)', 'Description']]
-	total_amount = Decimal('0.00')
-	
-	for expense in expenses:
-		data.append([
-			expense.date.strftime('%Y-%m-%d'),
-			expense.category,
-			f"{expense.amount:.2f}",
-			expense.description[:50] + ('...' if len(expense.description) > 50 else '')
-		])
-		total_amount += expense.amount
-		
-	# Total Row 
-	data.append(['', 'Total:', f"{total_amount:.2f}", ''])
-	
-	table = Table(data, colWidths=[80, 100, 80, 240])
-	
-	style = TableStyle([
-		('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-		('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-		('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-		('ALIGN', (2, 0), (2, -1), 'RIGHT'), # Format amounts matching dashboard layout constraints
-		('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-		('FONTSIZE', (0, 0), (-1, 0), 12),
-		('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-		('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-		('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-		('GRID', (0, 0), (-1, -1), 1, colors.black)
-	])
-	table.setStyle(style)
-	
-	elements.append(table)
-	doc.build(elements)
-	
-	return response
+@login_required
+@user_passes_test(is_regular_user, redirect_field_name=None)
+def download_parquet(request):
+	"""Typed Parquet file of the user's expenses, or incomes with ?dataset=incomes; queued when large."""
+	if request.user.is_staff or request.user.is_superuser:
+		return redirect('admin_dashboard')
+	if not columnar.available():
+		messages.error(request, columnar.MISSING_PACKAGE)
+		return redirect('dashboard')
+	dataset = request.GET.get('dataset', 'expenses')
+	if dataset not in columnar.DATASETS:
+		dataset = 'expenses'
+	return _enqueue_user_export(request, 'user_parquet', 'parquet', dataset)
+
+@login_required
+def export_job(request, pk: int):
+	"""Status page for a queued export; polls export_job_status until the file is ready."""
+	job = get_object_or_404(BackgroundJob, pk=pk, user=request.user)
+	return render(request, 'export_job.html', {'job': job})
+
+@login_required
+def export_job_status(request, pk: int):
+	"""JSON status/progress of one of the user's export jobs."""
+	job = get_object_or_404(BackgroundJob, pk=pk, user=request.user)
+	return JsonResponse({
+		'id': job.pk,
+		'kind': job.kind,
+		'status': job.status,
+		'progress': job.progress,
+		'total': job.total,
+		'percent': job.percent,
+		'partitions': job.partitions,
+		'error': job.error,
+		'download_url': reverse('export_job_download', args=[job.pk]) if job.status == 'done' else None,
+		'expires_at': job.expires_at.isoformat() if job.expires_at else None,
+	})
+
+@login_required
+def export_job_download(request, pk: int):
+	"""Serves a finished export file to the user who requested it."""
+	job = get_object_or_404(BackgroundJob, pk=pk, user=request.user)
+	if job.status != 'done' or not job.result_file:
+		raise Http404("Export is not available.")
+	return FileResponse(job.result_file.open('rb'), as_attachment=True, filename=job.filename)
 
 @login_required
 @user_passes_test(is_regular_user, redirect_field_name=None)
@@ -1140,14 +1107,11 @@ _CATEGORY_COLORS = {
 
 def _enrich_budgets(budgets, user, today):
 	"""Attach spent_amount, usage_pct and status to each budget object."""
+	# One indexed read of this month's per-category counters covers every budget
+	spent_by_category = spend_counters.month_totals(user, today)
 	enriched = []
 	for b in budgets:
-		spent = Expense.objects.filter(
-			user=user,
-			category=b.category,
-			date__year=today.year,
-			date__month=today.month,
-		).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+		spent = spent_by_category.get(b.category, Decimal('0.00'))
 
 		if b.monthly_budget > 0:
 			usage_pct = float(spent / b.monthly_budget) * 100
@@ -1169,7 +1133,7 @@ def _enrich_budgets(budgets, user, today):
 			status = 'safe'
 			
 		# Clean formatting (15.0 -> 15, 15.3 -> 15.3). Capped at 100 display
-		capped_usage = min(usage_pct, 100)
+		capped_usage = min(usage_pct, 100.0)
 		usage_pct_display = int(capped_usage) if capped_usage.is_integer() else round(capped_usage, 1)
 
 		enriched.append({
@@ -1285,6 +1249,15 @@ def delete_budget(request, pk):
 	return render(request, 'confirm_delete_budget.html', {'budget': budget})
 
 
+@login_required
+@user_passes_test(is_regular_user, redirect_field_name=None)
+def dismiss_budget_alert(request, category):
+	"""Hide this month's threshold alerts for a category from the dashboard."""
+	if request.method == 'POST':
+		budget_alerts_service.dismiss(request.user, category, date.today())
+	return redirect('dashboard')
+
+
 # ─────────────────────────────────────────────────────────────
 # AI BUDGET OPTIMIZER VIEW
 # ─────────────────────────────────────────────────────────────
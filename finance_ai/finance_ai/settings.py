@@ -123,6 +123,20 @@ STATIC_ROOT = BASE_DIR / '.static_root'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Job results and uploaded import files hold users' data (import files even hold
+# plaintext passwords): they are kept outside MEDIA_ROOT, which is served publicly,
+# and only reach users through the authenticated job download view
+PRIVATE_MEDIA_ROOT = os.path.join(BASE_DIR, 'private_media')
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'private': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': PRIVATE_MEDIA_ROOT},
+    },
+}
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
@@ -137,3 +151,57 @@ SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SECURE = True
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# ML shadow evaluation: fraction of live category predictions also scored by
+# the candidate model in expenses/ml/saved_models/candidate/ (0 disables it)
+ML_SHADOW_SAMPLE_RATE = 0.1
+
+# Admin dashboard summaries and analytics JSON: served fresh for the soft TTL, then stale while one
+# request refreshes it in the background; dropped entirely after the hard TTL
+ADMIN_ANALYTICS_SOFT_TTL = 300
+ADMIN_ANALYTICS_HARD_TTL = 3600
+
+# Stored admin insights older than this (seconds) are recomputed on the next read
+ADMIN_INSIGHTS_MAX_AGE = 900
+
+# Background export jobs (manage.py run_export_worker): finished files are kept in
+# private storage (PRIVATE_MEDIA_ROOT/exports/) for this many hours, and running jobs
+# whose worker has been silent longer than the stale timeout are re-queued (a live
+# worker sends a heartbeat several times per timeout, however long a step takes)
+EXPORT_RESULT_TTL_HOURS = 24
+EXPORT_JOB_STALE_MINUTES = 30
+
+# Exports of at most this many rows are built within the request and downloaded
+# directly; only larger ones are queued for the worker
+EXPORT_SYNC_MAX_ROWS = 5000
+
+# Columnar snapshot for heavy admin analytics (manage.py refresh_analytics_snapshot,
+# needs duckdb + pyarrow); flagged as stale in the admin UI past the max age (seconds)
+ANALYTICS_SNAPSHOT_DIR = os.path.join(BASE_DIR, 'analytics_snapshot')
+ANALYTICS_SNAPSHOT_MAX_AGE = 3600
+
+# Admin CSV/Parquet exports of at least EXPORT_PARALLEL_MIN_ROWS rows are split
+# into date partitions built by this many worker processes (1 disables it)
+EXPORT_PARALLEL_WORKERS = min(4, os.cpu_count() or 1)
+EXPORT_PARALLEL_MIN_ROWS = 50000
+
+# Django admin expense changelist: filtered result counts stop at this many rows,
+# and description search uses the SQLite FTS5 index (manage.py rebuild_expense_search)
+EXPENSE_ADMIN_COUNT_LIMIT = 10000
+EXPENSE_ADMIN_FTS = True
+
+# Bulk user CSV imports (admin "Import users" and manage.py import_users):
+# users are inserted in batches of this size, passwords hashed by this many processes
+USER_IMPORT_BATCH_SIZE = 500
+USER_IMPORT_WORKERS = os.cpu_count() or 1
+
+# Queued user deletion/deactivation (services/user_deletion.py): rows removed per
+# short transaction, so the SQLite write lock is never held for a whole account
+USER_DELETE_BATCH_SIZE = 1000
+
+# Budget threshold alerts (services/budget_alerts.py, manage.py deliver_budget_alerts):
+# failed e-mails are retried (after attempts x retry minutes) up to the max attempts,
+# and claims older than the stale timeout are re-queued
+BUDGET_ALERT_MAX_ATTEMPTS = 5
+BUDGET_ALERT_STALE_MINUTES = 10
+BUDGET_ALERT_RETRY_MINUTES = 5